@@ -1,4 +1,5 @@
 import os
+import concurrent.futures as futures
 
 from eot.aggregation.aggregation_path_manager import AggregationPathManager
 from eot.tools.tools_api import run_aggregate
@@ -21,7 +22,16 @@ def aggregate_dataset_tile_predictions_per_raster(
     categories,
     grid_json_fn,
     lazy,
+    workers=1,
+    memory_budget_mb=None,
+    timings=False,
 ):
+    """Aggregate the tile predictions of each raster.
+
+    With multiple workers, independent rasters are aggregated concurrently
+    (each in a separate process). The CPUs and the memory budget are
+    distributed evenly among the workers.
+    """
     # Create for each raster image a json file reflecting the information
     # of the corresponding image-tiles
     original_ifps = get_regex_fps_in_dp(
@@ -31,6 +41,10 @@ def aggregate_dataset_tile_predictions_per_raster(
         original_ifps, test_data_normalized_dp, mercator_tiling_flag
     )
 
+    tile_workers, raster_memory_budget_mb = _distribute_resources(
+        workers, memory_budget_mb
+    )
+    aggregation_kwargs_list = []
     for original_ifp, normalized_fp in zip(original_ifps, normalized_fps):
         _create_normalization_odp(
             aggregate_save_normalized_raster,
@@ -46,33 +60,70 @@ def aggregate_dataset_tile_predictions_per_raster(
         else:
             masks_raster_name = apm.aggregation_dn
 
-        if aggregate_as_images:
-            run_aggregate(
-                masks_idp=test_masks_dp,
-                categories=categories,
-                masks_raster_name=masks_raster_name,
-                geojson_grid_ofn=grid_json_fn,
-                mask_gray_png_ofp=apm.mask_png_fp,
-                mask_color_png_ofp=apm.mask_color_png_fp,
-                mask_overlay_png_ofp=apm.mask_overlay_png_fp,
-                overlay_grid_png_ofp=apm.grid_overlay_png_fp,
-                use_pixel_projection=use_pixel_projection,
-                original_raster_ifp=original_ifp,
-                normalized_raster_fp=normalized_fp,
-                save_normalized_raster=aggregate_save_normalized_raster,
-                lazy=lazy,
-            )
-        if aggregate_as_json:
-            run_aggregate(
-                masks_idp=test_masks_dp,
-                categories=categories,
-                masks_raster_name=masks_raster_name,
-                geojson_odp=apm.test_aggregated_masks_json_dp,
-                geojson_grid_ofn=grid_json_fn,
-                original_raster_ifp=original_ifp,
-                lazy=lazy,
+        # A single aggregation computes the images and the json files with
+        #  one pass over the tiles
+        if aggregate_as_images or aggregate_as_json:
+            aggregation_kwargs_list.append(
+                dict(
+                    masks_idp=test_masks_dp,
+                    categories=categories,
+                    masks_raster_name=masks_raster_name,
+                    geojson_odp=_get_json_odp(apm, aggregate_as_json),
+                    geojson_grid_ofn=grid_json_fn,
+                    **_get_image_ofps(apm, aggregate_as_images),
+                    use_pixel_projection=use_pixel_projection,
+                    original_raster_ifp=original_ifp,
+                    normalized_raster_fp=normalized_fp,
+                    save_normalized_raster=aggregate_save_normalized_raster,
+                    workers=tile_workers,
+                    memory_budget_mb=raster_memory_budget_mb,
+                    timings=timings,
+                    lazy=lazy,
+                )
             )
 
+    if workers > 1 and len(aggregation_kwargs_list) > 1:
+        with futures.ProcessPoolExecutor(workers) as executor:
+            for _ in executor.map(
+                _run_aggregate_with_kwargs, aggregation_kwargs_list
+            ):
+                pass
+    else:
+        for aggregation_kwargs in aggregation_kwargs_list:
+            _run_aggregate_with_kwargs(aggregation_kwargs)
+
+
+def _run_aggregate_with_kwargs(aggregation_kwargs):
+    run_aggregate(**aggregation_kwargs)
+
+
+def _distribute_resources(workers, memory_budget_mb):
+    assert workers >= 1
+    if workers == 1:
+        # Use the defaults of the aggregation tool
+        return None, memory_budget_mb
+    tile_workers = max(1, os.cpu_count() // workers)
+    if memory_budget_mb is not None:
+        memory_budget_mb = max(1, memory_budget_mb // workers)
+    return tile_workers, memory_budget_mb
+
+
+def _get_json_odp(apm, aggregate_as_json):
+    if aggregate_as_json:
+        return apm.test_aggregated_masks_json_dp
+    return None
+
+
+def _get_image_ofps(apm, aggregate_as_images):
+    if aggregate_as_images:
+        return {
+            "mask_gray_png_ofp": apm.mask_png_fp,
+            "mask_color_png_ofp": apm.mask_color_png_fp,
+            "mask_overlay_png_ofp": apm.mask_overlay_png_fp,
+            "overlay_grid_png_ofp": apm.grid_overlay_png_fp,
+        }
+    return {}
+
 
 def _create_normalization_odp(
     aggregate_save_normalized_raster, normalized_fp, test_data_normalized_dp
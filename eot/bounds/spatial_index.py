@@ -0,0 +1,144 @@
+import hashlib
+import os
+import numpy as np
+from rtree import index as rtree_index
+
+# Files of an rtree written to disk (i.e. <index_fp_stem>.<extension>)
+SPATIAL_INDEX_EXTENSIONS = ["idx", "dat"]
+# The key of the indexed bounds is stored next to the index
+SPATIAL_INDEX_KEY_EXTENSION = "key"
+
+
+def _convert_to_bounds_array(bounds_list):
+    return np.ascontiguousarray(
+        np.asarray(bounds_list, dtype=np.float64).reshape(-1, 4)
+    )
+
+
+def _convert_to_ids(ids, num_bounds):
+    if ids is None:
+        return np.arange(num_bounds, dtype=np.int64)
+    return np.ascontiguousarray(ids, dtype=np.int64)
+
+
+def compute_bounds_key(bounds_list, ids=None):
+    """Return a hash of the bounds and ids, which identifies the content of
+    a spatial index."""
+    bounds_array = _convert_to_bounds_array(bounds_list)
+    ids = _convert_to_ids(ids, len(bounds_array))
+    key_hash = hashlib.sha256()
+    key_hash.update(ids.tobytes())
+    key_hash.update(bounds_array.tobytes())
+    return key_hash.hexdigest()
+
+
+class BoundsSpatialIndex:
+    """Spatial index of axis aligned bounds (min_x, min_y, max_x, max_y).
+
+    The index is bulk loaded from numpy arrays (see
+    https://rtree.readthedocs.io/en/latest/performance.html), which is
+    considerably faster than inserting the bounds one by one. The index
+    may be written to disk (see from_bounds() and read_from_file()), e.g.
+    to reuse the index of a label set across several runs. A key of the
+    indexed content is stored next to the index, i.e. outdated indices are
+    detected (see get_from_file_or_bounds()).
+    """
+
+    def __init__(self, rtree):
+        self._rtree = rtree
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @classmethod
+    def from_bounds(cls, bounds_list, ids=None, index_fp_stem=None, key=None):
+        """Bulk load the bounds (a numpy array or a list of bounds).
+
+        ids defaults to the positions of the bounds. If index_fp_stem is
+        given, the index is written to disk (an existing index is
+        overwritten) together with its key (defaults to
+        compute_bounds_key()).
+        """
+        bounds_array = _convert_to_bounds_array(bounds_list)
+        ids = _convert_to_ids(ids, len(bounds_array))
+        assert len(ids) == len(bounds_array)
+        args = []
+        kwargs = {"interleaved": True}
+        if index_fp_stem is not None:
+            args.append(index_fp_stem)
+            kwargs["overwrite"] = True
+        # NB: Bulk loading requires at least one entry
+        if len(bounds_array) > 0:
+            args.append(
+                (
+                    ids,
+                    np.ascontiguousarray(bounds_array[:, :2]),
+                    np.ascontiguousarray(bounds_array[:, 2:]),
+                )
+            )
+        rtree = rtree_index.Index(*args, **kwargs)
+        if index_fp_stem is None:
+            return cls(rtree)
+
+        # NB: The key is written once the index is flushed, i.e. indices of
+        #  interrupted runs have no (or an outdated) key
+        rtree.close()
+        if key is None:
+            key = compute_bounds_key(bounds_array, ids)
+        with open(cls._get_key_fp(index_fp_stem), "w") as key_file:
+            key_file.write(key)
+        return cls.read_from_file(index_fp_stem)
+
+    @staticmethod
+    def _get_key_fp(index_fp_stem):
+        return f"{index_fp_stem}.{SPATIAL_INDEX_KEY_EXTENSION}"
+
+    @classmethod
+    def read_key(cls, index_fp_stem):
+        """Return the key of the index on disk (None, if not available)."""
+        key_fp = cls._get_key_fp(index_fp_stem)
+        if not os.path.isfile(key_fp):
+            return None
+        with open(key_fp, "r") as key_file:
+            return key_file.read().strip()
+
+    @staticmethod
+    def exists(index_fp_stem):
+        return all(
+            os.path.isfile(f"{index_fp_stem}.{extension}")
+            for extension in SPATIAL_INDEX_EXTENSIONS
+        )
+
+    @classmethod
+    def read_from_file(cls, index_fp_stem):
+        msg = f"No spatial index found at {index_fp_stem}"
+        assert cls.exists(index_fp_stem), msg
+        return cls(rtree_index.Index(index_fp_stem, interleaved=True))
+
+    @classmethod
+    def get_from_file_or_bounds(
+        cls, index_fp_stem, bounds_list, ids=None, key=None
+    ):
+        """Read the index from disk, if it matches the key (defaults to
+        compute_bounds_key()). Otherwise, bulk load the bounds and write the
+        index to disk."""
+        if key is None:
+            key = compute_bounds_key(bounds_list, ids)
+        if cls.exists(index_fp_stem) and cls.read_key(index_fp_stem) == key:
+            return cls.read_from_file(index_fp_stem)
+        return cls.from_bounds(
+            bounds_list, ids, index_fp_stem=index_fp_stem, key=key
+        )
+
+    def intersection(self, bounds):
+        """Return the ids of the bounds intersecting the given bounds."""
+        return self._rtree.intersection(tuple(bounds))
+
+    def get_num_entries(self):
+        return self._rtree.get_size()
+
+    def close(self):
+        self._rtree.close()
@@ -0,0 +1,162 @@
+import numpy as np
+
+# A PIL "P" image supports at most 256 palette entries (i.e. 768 bytes)
+NUM_PALETTE_ENTRIES = 256
+
+
+def _convert_color_to_rgb_tuple(color):
+    assert len(color) == 3, f"Invalid palette color {color}"
+    return tuple(int(value) for value in color)
+
+
+def _pack_rgb(rgb_mat):
+    """Pack the last axis of a (..., 3) array into 24 bit integer values."""
+    rgb_mat = rgb_mat.astype(np.uint32)
+    return (rgb_mat[..., 0] << 16) | (rgb_mat[..., 1] << 8) | rgb_mat[..., 2]
+
+
+class CompiledDatasetCategories:
+    """Precomputed lookup tables of a set of dataset categories.
+
+    Compiling the categories once (see DatasetCategories.compile()) allows to
+    replace per tile palette creation and linear category look ups with
+    simple array indexing.
+    """
+
+    def __init__(
+        self,
+        categories=None,
+        palette_colors=None,
+        default_palette_color=(0, 0, 0),
+    ):
+        """Use either the categories or a dictionary mimicking Pillows
+        image.palette.colors, i.e.
+         {color_tuple_1: index_1, color_tuple_2: index_2, ...}
+        """
+        assert (categories is None) != (palette_colors is None)
+        if categories is None:
+            categories = []
+        else:
+            palette_colors = {
+                category.palette_color: category.palette_index
+                for category in categories
+            }
+        self.categories = list(categories)
+        self.default_palette_color = _convert_color_to_rgb_tuple(
+            default_palette_color
+        )
+
+        self.name_to_category = {
+            category.name: category for category in self.categories
+        }
+        self.name_to_index = {
+            category.name: category.palette_index
+            for category in self.categories
+        }
+        self.index_to_category = {
+            category.palette_index: category for category in self.categories
+        }
+
+        self.index_to_color = np.empty(
+            (NUM_PALETTE_ENTRIES, 3), dtype=np.uint8
+        )
+        self.index_to_color[:] = self.default_palette_color
+        self.is_defined_mask = np.zeros(NUM_PALETTE_ENTRIES, dtype=bool)
+        self.color_to_index = {}
+        for color, index in palette_colors.items():
+            assert 0 <= index < NUM_PALETTE_ENTRIES, f"Invalid index {index}"
+            color = _convert_color_to_rgb_tuple(color)
+            self.index_to_color[index] = color
+            self.is_defined_mask[index] = True
+            self.color_to_index[color] = index
+
+        self.active_mask = np.zeros(NUM_PALETTE_ENTRIES, dtype=bool)
+        self.ignore_mask = np.zeros(NUM_PALETTE_ENTRIES, dtype=bool)
+        for category in self.categories:
+            self.active_mask[category.palette_index] = category.is_active
+            self.ignore_mask[category.palette_index] = (
+                category.is_ignore_category
+            )
+        self.valid_mask = np.logical_and(
+            self.active_mask, np.logical_not(self.ignore_mask)
+        )
+
+        # Sorted 24 bit color codes allow to map color images to palette
+        #  indices using np.searchsorted()
+        packed_colors = _pack_rgb(
+            np.array(list(self.color_to_index.keys()), dtype=np.uint8).reshape(
+                -1, 3
+            )
+        )
+        order = np.argsort(packed_colors)
+        self._sorted_packed_colors = packed_colors[order]
+        self._sorted_color_indices = np.array(
+            list(self.color_to_index.values()), dtype=np.uint8
+        )[order]
+
+        # The palette only contains the entries up to the largest used index.
+        #  Thus, PIL is able to reduce the bit depth of the written images.
+        self.palette = self.index_to_color.tobytes()
+        if len(palette_colors) > 0:
+            self.num_used_palette_entries = max(palette_colors.values()) + 1
+        else:
+            self.num_used_palette_entries = 1
+        self.used_palette = self.palette[: 3 * self.num_used_palette_entries]
+
+    def __len__(self):
+        return len(self.color_to_index)
+
+    @classmethod
+    def from_palette_colors(cls, palette_colors, default_palette_color=None):
+        if default_palette_color is None:
+            default_palette_color = (0, 0, 0)
+        return cls(
+            palette_colors=palette_colors,
+            default_palette_color=default_palette_color,
+        )
+
+    @property
+    def palette_colors(self):
+        """Mimics Pillows image.palette.colors"""
+        return dict(self.color_to_index)
+
+    def get_category(self, category_name):
+        return self.name_to_category.get(category_name)
+
+    def get_palette_index(self, category_name):
+        return self.name_to_index[category_name]
+
+    def get_palette_color(self, palette_index):
+        if not self.is_defined_mask[palette_index]:
+            return None
+        return tuple(
+            int(value) for value in self.index_to_color[palette_index]
+        )
+
+    def convert_indices_to_colors(self, index_mat):
+        return self.index_to_color[index_mat]
+
+    def convert_colors_to_indices(self, color_mat, default_index=0):
+        """Map a (H, W, 3) color image to the corresponding palette indices.
+
+        Colors without a corresponding category are set to default_index.
+        """
+        assert color_mat.shape[-1] == 3
+        packed = _pack_rgb(color_mat)
+        index_mat = np.full(packed.shape, default_index, dtype=np.uint8)
+        if len(self._sorted_packed_colors) == 0:
+            return index_mat
+        positions = np.searchsorted(self._sorted_packed_colors, packed)
+        positions = np.minimum(positions, len(self._sorted_packed_colors) - 1)
+        is_known = self._sorted_packed_colors[positions] == packed
+        index_mat[is_known] = self._sorted_color_indices[positions[is_known]]
+        return index_mat
+
+    def get_category_mask(self, index_mat, category_name):
+        return index_mat == self.name_to_index[category_name]
+
+    def get_active_mask(self, index_mat):
+        return self.active_mask[index_mat]
+
+    def get_valid_mask(self, index_mat):
+        return self.valid_mask[index_mat]
@@ -3,6 +3,9 @@ import re
 import webcolors
 
 from eot.categories.dataset_category import DatasetCategory
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
 
 
 class DatasetCategories:
@@ -189,6 +192,22 @@ class DatasetCategories:
             ] = category.palette_index
         return category_palette_colors
 
+    def compile(self, only_active=False, include_ignore=True):
+        """Create lookup tables (e.g. palette, color and name to index maps)
+
+        Compile the categories once and reuse the result for all tiles.
+        """
+        compiled_categories = CompiledDatasetCategories(
+            categories=[
+                category
+                for category in self.categories
+                if (category.is_active or not only_active)
+                and (include_ignore or not category.is_ignore_category)
+            ],
+            default_palette_color=self.default_palette_color,
+        )
+        return compiled_categories
+
     def get_num_categories(self):
         return len(self)
 
@@ -1,5 +1,8 @@
 import numpy as np
 
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
 from eot.categories.dataset_categories import DatasetCategories
 from eot.categories.dataset_category import DatasetCategory
 
@@ -20,12 +23,14 @@ class CategoryComparison:
     ):
         if comparison_categories is None:
             comparison_categories = self._get_default_comparison_categories()
-        self.comparison_categories = comparison_categories
-        self.palette_colors = (
-            comparison_categories.get_category_palette_colors(
+        if not isinstance(comparison_categories, CompiledDatasetCategories):
+            comparison_categories = comparison_categories.compile(
                 only_active=False, include_ignore=True
             )
-        )
+        self.comparison_categories = comparison_categories
+        # NB: The compiled categories can be directly passed to
+        #  write_label_tile_to_file()
+        self.palette_colors = comparison_categories
 
         self.category_name = category_name
 
@@ -35,36 +40,36 @@ class CategoryComparison:
         # https://en.wikipedia.org/wiki/Sensitivity_and_specificity
         # True positive
         true_positive_mask = np.logical_and(prediction_mask, ground_truth_mask)
-        true_positive_index = self.comparison_categories.get_category(
+        true_positive_index = self.comparison_categories.get_palette_index(
             self.__class__.true_positive_name
-        ).palette_index
+        )
         self.comparison_mat[true_positive_mask] = true_positive_index
 
         # False positive
         false_positive_mask = np.logical_and(
             prediction_mask, np.logical_not(ground_truth_mask)
         )
-        false_positive_index = self.comparison_categories.get_category(
+        false_positive_index = self.comparison_categories.get_palette_index(
             self.__class__.false_positive_name
-        ).palette_index
+        )
         self.comparison_mat[false_positive_mask] = false_positive_index
 
         # False negative
         false_negative_mask = np.logical_and(
             np.logical_not(prediction_mask), ground_truth_mask
         )
-        false_negative_index = self.comparison_categories.get_category(
+        false_negative_index = self.comparison_categories.get_palette_index(
             self.__class__.false_negative_name
-        ).palette_index
+        )
         self.comparison_mat[false_negative_mask] = false_negative_index
 
         # # True negative
         true_negative_mask = np.logical_and(
             np.logical_not(prediction_mask), np.logical_not(ground_truth_mask)
         )
-        true_negative_index = self.comparison_categories.get_category(
+        true_negative_index = self.comparison_categories.get_palette_index(
             self.__class__.true_negative_name
-        ).palette_index
+        )
         self.comparison_mat[true_negative_mask] = true_negative_index
 
     @classmethod
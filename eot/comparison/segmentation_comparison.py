@@ -1,3 +1,6 @@
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
 from eot.comparison.category_comparison import CategoryComparison
 
 
@@ -12,6 +15,11 @@ class SegmentationComparison:
         self.categories = categories
 
         assert len(prediction_mat.shape) == 2
+        # NB: Compile the comparison categories only once for all categories
+        if not isinstance(comparison_categories, CompiledDatasetCategories):
+            comparison_categories = comparison_categories.compile(
+                only_active=False, include_ignore=True
+            )
         self._comparison_dict = {}
         for category in categories.get_active_categories():
             category_index = category.palette_index
@@ -1,4 +1,6 @@
+from functools import lru_cache
 import mercantile
+from pyproj import Transformer
 
 from rasterio.crs import CRS as _CRS
 from rasterio.warp import transform as _transform
@@ -28,3 +30,19 @@ transform_geom = _transform_geom
 
 CRS = _CRS
 IDENTITY = _IDENTITY
+
+
+@lru_cache(maxsize=64)
+def _get_transformer(source_crs_wkt, destination_crs_wkt):
+    return Transformer.from_crs(
+        source_crs_wkt, destination_crs_wkt, always_xy=True
+    )
+
+
+def get_transformer(source_crs, destination_crs):
+    """Return a (cached) transformer using the x/y (i.e. lng/lat) axis order
+    (like transform_coords and transform_geom)."""
+    return _get_transformer(
+        CRS.from_user_input(source_crs).to_wkt(),
+        CRS.from_user_input(destination_crs).to_wkt(),
+    )
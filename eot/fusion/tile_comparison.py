@@ -61,8 +61,13 @@ def compare_fusion_results_with_reference(
         active_category_names = segmentation_categories.get_category_names(
             only_active=True, include_ignore=False
         )
+        assert label_comparison_categories.get_num_categories() > 2
+        compiled_comparison_categories = label_comparison_categories.compile(
+            only_active=False, include_ignore=True
+        )
     else:
         active_category_names = None
+        compiled_comparison_categories = None
 
     for index, fused_tile in enumerate(fused_tiles):
         original_tile = fn_to_original_tile[str(fused_tile)]
@@ -85,12 +90,11 @@ def compare_fusion_results_with_reference(
         fused_tile.set_disk_size(fused_mat.shape[1], fused_mat.shape[0])
 
         if idp_uses_palette:
-            assert label_comparison_categories.get_num_categories() > 2
             segmentation_comparison = SegmentationComparison(
                 original_mat,
                 fused_mat,
                 segmentation_categories,
-                label_comparison_categories,
+                compiled_comparison_categories,
             )
             for category_name in active_category_names:
                 (
@@ -1,9 +1,12 @@
 import math
-from rtree import index as rtree_index
 import copy
 import os
 import shutil
 
+from eot.bounds.spatial_index import BoundsSpatialIndex
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
 from eot.tiles.tile_manager import TileManager
 from eot.tiles.tile_path_manager import TilePathManager
 from eot.tiles.tile_reading import (
@@ -127,10 +130,9 @@ def fuse_tile_predictions_of_raster(
         source_y_stride,
     )
 
-    # https://rtree.readthedocs.io/en/latest/tutorial.html
-    tile_aux_rtree = rtree_index.Index(interleaved=True)
-    for index, tile_aux in enumerate(tiles_aux):
-        tile_aux_rtree.insert(index, tile_aux.get_source_rectangle())
+    tile_aux_rtree = BoundsSpatialIndex.from_bounds(
+        [tile_aux.get_source_rectangle() for tile_aux in tiles_aux]
+    )
 
     fused_predictions = []
     # Complexity: O(nu_x nu_y)
@@ -236,10 +238,16 @@ def fuse_tiles(
     predictions = []
     batch_indices = []
     tiles = []
+    compiled_palette = None
     for batch_index, predicted_tile in enumerate(predicted_tiles):
         prediction_ifp = predicted_tile.get_absolute_tile_fp()
         if idp_uses_palette:
             prediction_mat, palette = read_label_tile_from_file(prediction_ifp)
+            if compiled_palette is None:
+                # NB: All tiles of a dataset share the same palette
+                compiled_palette = CompiledDatasetCategories(
+                    palette_colors=palette.colors
+                )
         else:
             prediction_mat = read_image_tile_from_file(prediction_ifp)
             palette = None
@@ -294,7 +302,7 @@ def fuse_tiles(
                 odp=fuse_tile_dp,
                 geo_tile=prediction_tile,
                 label_data=prediction,
-                palette_colors=palette.colors,
+                palette_colors=compiled_palette,
                 create_aux_file=create_aux_files,
             )
         else:
@@ -1,17 +1,23 @@
 import collections
 import copy
-from rtree import index as rtree_index
 import numpy as np
 import geojson
+import rasterio
+from rasterio.windows import transform as window_transform
 from shapely.geometry import mapping, shape
 from rasterio.features import is_valid_geom
 from tqdm import tqdm
 from eot.geojson_ext.geojson_reading import read_geojson_polygon_list
 from eot.geojson_ext import rasterize_features
 from eot.geojson_ext import geojson_precision
-from eot.crs.crs import transform_geom
+from eot.crs.crs import CRS, get_transformer
 from eot.crs.crs import EPSG_4326, EPSG_3857
-from eot.geojson_ext.geojson_writing import write_geojson_object
+from eot.geojson_ext.geojson_writing import write_geojson_features
+from eot.geojson_ext.polygon_clipping import (
+    TilePolygonClipper,
+    compute_tile_clip_bounds,
+)
+from eot.rasters.cog_writing import iterate_block_windows
 from eot.rasters.raster_writing import write_raster
 from eot.geojson_ext import get_feature_shapes
 from eot.tiles.image_pixel_tile import ImagePixelTile
@@ -19,6 +25,12 @@ from eot.tiles.tile_reading import read_label_tile_from_file
 from eot.tiles.mercator_tile import MercatorTile
 from eot.tiles.tile_writing import write_label_tile_to_file
 from eot.bounds import transform_from_bounds
+from eot.bounds.spatial_index import BoundsSpatialIndex
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
+
+DEFAULT_LABEL_RASTER_BLOCK_SIZE = 512
 
 
 class GeoSegmentation:
@@ -34,6 +46,8 @@ class GeoSegmentation:
         else:
             polygon_list = self._initialize_polygons(polygon_list)
         self._polygon_list = polygon_list
+        # {(source_crs_str, destination_crs_str): polygon_list}
+        self._crs_to_polygon_list = {}
         self.crs = crs
         self.mask_color = mask_color
         self.category_name = category_name
@@ -46,46 +60,74 @@ class GeoSegmentation:
         return polygon_list
 
     @staticmethod
-    def _transform_polygon(source_crs, destination_crs, polygon):
-        polygon_dict_transformed = transform_geom(
-            source_crs, destination_crs, polygon
-        )
-        polygon_transformed = geojson.Polygon(
-            coordinates=polygon_dict_transformed["coordinates"],
-            precision=geojson_precision,
-        )
-        return polygon_transformed
+    def _create_polygon(coordinates):
+        polygon = geojson.Polygon(coordinates=[], precision=geojson_precision)
+        # NB: Assigning the coordinates skips the (slow) coordinate validation
+        polygon["coordinates"] = coordinates
+        return polygon
 
     @classmethod
     def _transform_polygons(cls, source_crs, destination_crs, polygon_list):
+        """Transform the coordinates of all polygons (i.e. of all rings) as a
+        single flat array with a (cached) transformer."""
+        if len(polygon_list) == 0:
+            return []
+        rings = [
+            ring for polygon in polygon_list for ring in polygon["coordinates"]
+        ]
+        coords = np.array(
+            [point[:2] for ring in rings for point in ring], dtype=float
+        ).reshape(-1, 2)
+        x_values, y_values = get_transformer(
+            source_crs, destination_crs
+        ).transform(coords[:, 0], coords[:, 1])
+        coord_list = np.column_stack([x_values, y_values]).tolist()
+
         polygon_list_transformed = []
-        if len(polygon_list) > 0:
-            assert isinstance(polygon_list[0], geojson.Polygon)
-            for polygon in polygon_list:
-                polygon_transformed = cls._transform_polygon(
-                    source_crs, destination_crs, polygon
+        coord_index = 0
+        for polygon in polygon_list:
+            rings_transformed = []
+            for ring in polygon["coordinates"]:
+                rings_transformed.append(
+                    coord_list[coord_index : coord_index + len(ring)]
                 )
-                polygon_list_transformed.append(polygon_transformed)
+                coord_index += len(ring)
+            polygon_list_transformed.append(
+                cls._create_polygon(rings_transformed)
+            )
         return polygon_list_transformed
 
+    @staticmethod
+    def _get_crs_str(crs):
+        return CRS.from_user_input(crs).to_string()
+
     def get_polygons(self, destination_crs):
-        if destination_crs != self.crs:
-            polygon_list = self._transform_polygons(
+        """Return the polygons in destination_crs.
+
+        The reprojected polygons are cached per crs, i.e. repeated calls
+        (e.g. while rasterizing many tiles) reproject the polygons only
+        once.
+        """
+        if destination_crs == self.crs:
+            return self._polygon_list
+        key = (self._get_crs_str(self.crs), self._get_crs_str(destination_crs))
+        if key not in self._crs_to_polygon_list:
+            self._crs_to_polygon_list[key] = self._transform_polygons(
                 self.crs, destination_crs, self._polygon_list
             )
-        else:
-            polygon_list = self._polygon_list
-        return polygon_list
+        return self._crs_to_polygon_list[key]
 
     def get_number_polygons(self):
         return len(self._polygon_list)
 
     def add_polygon(self, polygon):
         self._polygon_list.append(polygon)
+        self._crs_to_polygon_list.clear()
 
     def add_polygons(self, polygon_list):
         polygon_list = self._initialize_polygons(polygon_list)
         self._polygon_list.extend(polygon_list)
+        self._crs_to_polygon_list.clear()
 
     def add_geo_segmentation(self, geo_segmentation):
         if self.crs is None:
@@ -104,34 +146,46 @@ class GeoSegmentation:
         #  specified in the same (undefined) units as the geometry coordinates.
         #  Also note that the .buffer distance can be negative, in which case
         #  the buffer is “internal” rather than “external”.
-        polygon_crs_with_buffer_list = []
+        polygon_epsg_3857_with_buffer_list = []
         polygon_epsg_3857_list = self.get_polygons(EPSG_3857)
         for polygon_epsg_3857 in polygon_epsg_3857_list:
             # Make sure to execute the following operation in EPSG_3857
             polygon_epsg_3857_with_buffer = mapping(
                 shape(polygon_epsg_3857).buffer(polygon_buffer)
             )
-            polygon_crs_with_buffer = self._transform_polygon(
-                EPSG_3857, self.crs, polygon_epsg_3857_with_buffer
+            polygon_epsg_3857_with_buffer_list.append(
+                polygon_epsg_3857_with_buffer
             )
-            polygon_crs_with_buffer_list.append(polygon_crs_with_buffer)
-        self._polygon_list = polygon_crs_with_buffer_list
+        self._polygon_list = self._transform_polygons(
+            EPSG_3857, self.crs, polygon_epsg_3857_with_buffer_list
+        )
+        self._crs_to_polygon_list.clear()
 
     ###########################################################################
     #                           Geojson
     ###########################################################################
 
     @classmethod
-    def from_geojson_file(cls, geojson_ifp, **kwargs):
-        polygon_list, src_crs = read_geojson_polygon_list(geojson_ifp)
+    def from_geojson_file(
+        cls, geojson_ifp, bbox=None, bbox_crs=None, workers=1, **kwargs
+    ):
+        """Read the polygons of the file (optionally only the polygons
+        intersecting bbox, see read_geojson_polygon_list())."""
+        polygon_list, src_crs = read_geojson_polygon_list(
+            geojson_ifp, bbox=bbox, bbox_crs=bbox_crs, workers=workers
+        )
         return cls(polygon_list=polygon_list, crs=src_crs, **kwargs)
 
     @classmethod
-    def from_geojson_files(cls, geojson_ifp_list, **kwargs):
+    def from_geojson_files(
+        cls, geojson_ifp_list, bbox=None, bbox_crs=None, workers=1, **kwargs
+    ):
         aggregated_polygon_list = []
         aggregated_src_crs_list = []
         for geojson_ifp in geojson_ifp_list:
-            polygon_list, src_crs = read_geojson_polygon_list(geojson_ifp)
+            polygon_list, src_crs = read_geojson_polygon_list(
+                geojson_ifp, bbox=bbox, bbox_crs=bbox_crs, workers=workers
+            )
             aggregated_polygon_list.extend(polygon_list)
             aggregated_src_crs_list.append(src_crs)
         msg = f"Detected inconsistent CRS in {geojson_ifp_list}"
@@ -169,25 +223,34 @@ class GeoSegmentation:
             assert isinstance(geojson_polygon, geojson.Polygon), msg
         return geojson_polygon_espg_4326_list
 
-    def _to_geojson_feature_list(self):
-        # NB: Geojson polygons must be defined in EPSG_4326
-        geojson_polygon_espg_4326_list = self._to_geojson_polygon_list()
-        geojson_feature_list = [
-            geojson.Feature(geometry=geojson_polygon)
-            for geojson_polygon in geojson_polygon_espg_4326_list
-        ]
-
-        if self.mask_color is None:
-            return geojson_feature_list
+    def _iterate_geojson_polygons(self, batch_size=4096):
+        """Yield the polygons in EPSG_4326 (transformed batch-wise, i.e.
+        without transforming all polygons at once)."""
+        for start in range(0, len(self._polygon_list), batch_size):
+            polygon_batch = self._polygon_list[start : start + batch_size]
+            if self.crs != EPSG_4326:
+                polygon_batch = self._transform_polygons(
+                    self.crs, EPSG_4326, polygon_batch
+                )
+            for polygon in polygon_batch:
+                msg = f"{type(polygon)}"
+                assert isinstance(polygon, geojson.Polygon), msg
+                yield polygon
 
-        for tile_geojson_feature in geojson_feature_list:
+    def _iterate_geojson_features(self):
+        # NB: Geojson polygons must be defined in EPSG_4326
+        properties = {}
+        if self.mask_color is not None:
             # https://github.com/mapbox/simplestyle-spec/tree/master/1.1.0
-            tile_geojson_feature.properties["fill"] = self._rgb_to_hex(
-                self.mask_color
+            properties["fill"] = self._rgb_to_hex(self.mask_color)
+            properties["fill-opacity"] = 0.5
+        for geojson_polygon in self._iterate_geojson_polygons():
+            yield geojson.Feature(
+                geometry=geojson_polygon, properties=dict(properties)
             )
-            tile_geojson_feature.properties["fill-opacity"] = 0.5
 
-        return geojson_feature_list
+    def _to_geojson_feature_list(self):
+        return list(self._iterate_geojson_features())
 
     def _to_geojson_feature_collection(self):
         # NB: Geojson polygons must be defined in EPSG_4326
@@ -197,10 +260,17 @@ class GeoSegmentation:
         )
         return geojson_feature_collection_espg_4326
 
-    def write_as_geojson_feature_collection(self, geojson_ofp):
-        # NB: Geojson polygons must be defined in EPSG_4326
-        feature_collection_epsg_4326 = self._to_geojson_feature_collection()
-        write_geojson_object(geojson_ofp, feature_collection_epsg_4326)
+    def write_as_geojson_feature_collection(
+        self, geojson_ofp, ndjson=False, precision=None
+    ):
+        """Stream the polygons (in EPSG_4326) as compact feature collection
+        or (if ndjson is set) as newline-delimited GeoJSON."""
+        write_geojson_features(
+            geojson_ofp,
+            self._iterate_geojson_features(),
+            ndjson=ndjson,
+            precision=precision,
+        )
 
     ###########################################################################
     #                           Tiles
@@ -236,48 +306,126 @@ class GeoSegmentation:
         background_color=0,
         show_progress=True,
     ):
-        # https://rtree.readthedocs.io/en/latest/tutorial.html
-        polygon_bounds_rtree = rtree_index.Index(interleaved=True)
         tile_crs = tiles[0].get_crs()
         polygons_tile_crs = self.get_polygons(tile_crs)
-        for index, polygon_tile_crs in enumerate(polygons_tile_crs):
-            polygon_bounds_rtree.insert(
-                index, self._find_polygon_bounds(polygon_tile_crs)
-            )
-
-        for tile in tiles:
-            overlapping_polygon_indices = polygon_bounds_rtree.intersection(
-                tile.compute_bounds_in_crs()
-            )
-            polygons_geo_crs = self.get_polygons(self.crs)
-            polygon_list_filtered = [
-                polygons_geo_crs[i] for i in overlapping_polygon_indices
-            ]
-            geo_segmentation_tile_truncated = self.__class__(
-                polygon_list=polygon_list_filtered,
-                crs=self.crs,
-                mask_color=self.mask_color,
-                category_name=self.category_name,
-            )
-
-            if geo_segmentation_tile_truncated.get_number_polygons():
+        polygon_bounds_list = [
+            self._find_polygon_bounds(polygon_tile_crs)
+            for polygon_tile_crs in polygons_tile_crs
+        ]
+        self.write_polygons_to_tiles(
+            odp,
+            tile_size,
+            tiles,
+            append_labels,
+            palette_colors,
+            polygons_tile_crs,
+            polygon_bounds_list,
+            burn_color=burn_color,
+            background_color=background_color,
+        )
 
-                height, width = tile_size
-                transform = tile.get_tile_transform()
-                crs = tile.get_crs()
+    @classmethod
+    def write_polygons_to_tiles(
+        cls,
+        odp,
+        tile_size,
+        tiles,
+        append_labels,
+        palette_colors,
+        polygons_tile_crs,
+        polygon_bounds_list,
+        burn_color=255,
+        background_color=0,
+    ):
+        """Rasterize the polygons (given in the crs of the tiles) to the
+        tiles. See write_category_polygons_to_tiles()."""
+        cls.write_category_polygons_to_tiles(
+            odp,
+            tile_size,
+            tiles,
+            append_labels,
+            palette_colors,
+            [(burn_color, polygons_tile_crs, polygon_bounds_list)],
+            background_color=background_color,
+        )
 
-                label_data = geo_segmentation_tile_truncated.to_raster_data(
-                    width,
-                    height,
-                    transform,
-                    crs,
-                    burn_color=burn_color,
-                    background_color=background_color,
-                    image_axis_order=True,
-                )
-            else:
-                label_data = np.zeros(shape=tile_size, dtype=np.uint8)
+    @staticmethod
+    def _create_tile_polygon_index(
+        polygons_tile_crs,
+        polygon_bounds_list,
+        tile_bounds_array,
+        polygon_bounds_index=None,
+    ):
+        """Return an rtree (containing only the polygons intersecting the
+        bounds of the tiles, if no index of all polygons is given) and a
+        clipper of the polygons."""
+        polygon_bounds_array = np.asarray(
+            polygon_bounds_list, dtype=np.float64
+        ).reshape(-1, 4)
+        polygon_clipper = TilePolygonClipper(
+            polygons_tile_crs, polygon_bounds_array
+        )
+        if polygon_bounds_index is not None:
+            return polygon_bounds_index, polygon_clipper
+        candidate_polygon_indices = np.flatnonzero(
+            (polygon_bounds_array[:, 0] <= tile_bounds_array[:, 2].max())
+            & (polygon_bounds_array[:, 1] <= tile_bounds_array[:, 3].max())
+            & (polygon_bounds_array[:, 2] >= tile_bounds_array[:, 0].min())
+            & (polygon_bounds_array[:, 3] >= tile_bounds_array[:, 1].min())
+        )
+        polygon_bounds_rtree = BoundsSpatialIndex.from_bounds(
+            polygon_bounds_array[candidate_polygon_indices],
+            ids=candidate_polygon_indices,
+        )
+        return polygon_bounds_rtree, polygon_clipper
 
+    @classmethod
+    def write_category_polygons_to_tiles(
+        cls,
+        odp,
+        tile_size,
+        tiles,
+        append_labels,
+        palette_colors,
+        category_polygons_list,
+        background_color=0,
+    ):
+        """Rasterize the polygons of several categories to the tiles.
+
+        category_polygons_list contains tuples (burn_color,
+        polygons_tile_crs, polygon_bounds_list) in priority order, i.e. the
+        polygons of later categories overwrite the ones of earlier
+        categories. The polygons are given in the crs of the tiles and may
+        be any indexable sequence (e.g. memory-mapped PolygonArrays). A
+        fourth element may provide a (persistent) BoundsSpatialIndex of all
+        polygons, which is used instead of building an index.
+
+        All categories of a tile are burned into a single label array,
+        i.e. each tile is written exactly once. Only polygons intersecting
+        the bounds of the given tiles are added to the spatial indices, i.e.
+        different partitions of the tiles can be processed independently
+        (e.g. by different processes).
+        """
+        if not isinstance(palette_colors, CompiledDatasetCategories):
+            palette_colors = CompiledDatasetCategories.from_palette_colors(
+                palette_colors
+            )
+        tile_bounds_array = np.array(
+            [tile.compute_bounds_in_crs() for tile in tiles], dtype=np.float64
+        )
+        burn_color_with_index_list = cls._create_category_polygon_indices(
+            category_polygons_list, tile_bounds_array
+        )
+        height, width = tile_size
+        for tile, tile_bounds in zip(tiles, tile_bounds_array):
+            label_data = cls._burn_category_polygons(
+                burn_color_with_index_list,
+                tile_bounds,
+                tile.get_tile_transform(),
+                width,
+                height,
+                background_color,
+            )
             write_label_tile_to_file(
                 odp,
                 tile,
@@ -286,6 +434,132 @@ class GeoSegmentation:
                 append=append_labels,
             )
 
+    @classmethod
+    def write_category_polygons_to_raster_block_wise(
+        cls,
+        label_raster_ofp,
+        raster,
+        category_polygons_list,
+        block_size=DEFAULT_LABEL_RASTER_BLOCK_SIZE,
+        background_color=0,
+    ):
+        """Burn the polygons of several categories (given in the crs of the
+        raster, see write_category_polygons_to_tiles()) into a tiled label
+        raster with the pixel grid of the given raster.
+
+        The label raster is burned block by block, i.e. only a single block
+        is kept in memory.
+        """
+        transform, crs = raster.get_geo_transform_with_crs()
+        windows = list(
+            iterate_block_windows(raster.width, raster.height, block_size)
+        )
+        block_transforms = [
+            window_transform(window, transform) for window in windows
+        ]
+        block_bounds_array = np.array(
+            [
+                compute_tile_clip_bounds(
+                    block_transform, window.width, window.height, margin=0
+                )
+                for window, block_transform in zip(windows, block_transforms)
+            ],
+            dtype=np.float64,
+        )
+        burn_color_with_index_list = cls._create_category_polygon_indices(
+            category_polygons_list, block_bounds_array
+        )
+        profile = {
+            "driver": "GTiff",
+            "width": raster.width,
+            "height": raster.height,
+            "count": 1,
+            "dtype": "uint8",
+            "crs": crs,
+            "transform": transform,
+            "tiled": True,
+            "blockxsize": block_size,
+            "blockysize": block_size,
+            "BIGTIFF": "IF_SAFER",
+        }
+        with rasterio.open(label_raster_ofp, "w", **profile) as label_raster:
+            for window, block_transform, block_bounds in zip(
+                windows, block_transforms, block_bounds_array
+            ):
+                label_data = cls._burn_category_polygons(
+                    burn_color_with_index_list,
+                    block_bounds,
+                    block_transform,
+                    window.width,
+                    window.height,
+                    background_color,
+                )
+                label_raster.write(label_data, 1, window=window)
+
+    @classmethod
+    def _create_category_polygon_indices(
+        cls, category_polygons_list, area_bounds_array
+    ):
+        burn_color_with_index_list = []
+        for (
+            burn_color,
+            polygons_tile_crs,
+            polygon_bounds_list,
+            *polygon_bounds_index,
+        ) in category_polygons_list:
+            assert isinstance(burn_color, int), type(burn_color)
+            polygon_bounds_rtree, polygon_clipper = (
+                cls._create_tile_polygon_index(
+                    polygons_tile_crs,
+                    polygon_bounds_list,
+                    area_bounds_array,
+                    *polygon_bounds_index,
+                )
+            )
+            burn_color_with_index_list.append(
+                (burn_color, polygon_bounds_rtree, polygon_clipper)
+            )
+        return burn_color_with_index_list
+
+    @staticmethod
+    def _burn_category_polygons(
+        burn_color_with_index_list,
+        area_bounds,
+        transform,
+        width,
+        height,
+        background_color,
+    ):
+        """Burn the polygons of all categories intersecting the area (i.e. a
+        tile or a raster block) into a single label array."""
+        clip_bounds = compute_tile_clip_bounds(transform, width, height)
+        label_data = np.full((height, width), background_color, dtype=np.uint8)
+        for (
+            burn_color,
+            polygon_bounds_rtree,
+            polygon_clipper,
+        ) in burn_color_with_index_list:
+            overlapping_polygon_indices = polygon_bounds_rtree.intersection(
+                tuple(area_bounds)
+            )
+            # NB: The polygons are already reprojected to the crs of the area
+            polygon_list_clipped = polygon_clipper.clip_polygons(
+                overlapping_polygon_indices, clip_bounds
+            )
+            if len(polygon_list_clipped) == 0:
+                continue
+            assert is_valid_geom(polygon_list_clipped[0])
+            burned_shapes_array = rasterize_features(
+                shapes=polygon_list_clipped,
+                out_shape=(height, width),
+                fill=0,
+                transform=transform,
+                default_value=1,
+                all_touched=False,
+            )
+            label_data[burned_shapes_array > 0] = burn_color
+        return label_data
+
     ###########################################################################
     #                           Raster
     ###########################################################################
@@ -310,22 +584,91 @@ class GeoSegmentation:
                 tile.get_absolute_tile_fp()
             )
             tile_mask, mask_color = get_mask_callback(tile_label_mat, palette)
+            geo_segmentation_tile = cls.from_tile_mask(
+                tile,
+                tile_label_mat,
+                tile_mask,
+                mask_color=mask_color,
+                raster_transform=raster_transform,
+                raster_crs=raster_crs,
+            )
+            geo_segmentation.add_geo_segmentation(geo_segmentation_tile)
 
-            tile.set_disk_size(*tile_label_mat.shape[-2:])
-            if isinstance(tile, ImagePixelTile):
-                tile.set_crs(raster_crs)
-                tile.set_raster_transform(raster_transform)
-                tile.compute_and_set_tile_transform()
+        return geo_segmentation
 
-            tile_transform = tile.get_tile_transform()
-            tile_crs = tile.get_crs()
+    @classmethod
+    def from_tiles_per_label_value(
+        cls,
+        tiles,
+        label_value_to_mask_color,
+        raster_transform=None,
+        raster_crs=None,
+    ):
+        """Create one segmentation per label value (i.e. palette index),
+        while reading and polygonising each tile only once (see
+        from_tile_label_values())."""
+        if isinstance(tiles[0], ImagePixelTile):
+            msg = "ImagePixelTiles requires a valid raster_transform"
+            assert raster_transform is not None, msg
+            msg = "ImagePixelTiles requires a valid raster_crs"
+            assert raster_crs is not None, msg
 
-            geo_segmentation_tile = cls.from_raster_data(
-                tile_mask, tile_transform, tile_crs, mask_color=mask_color
+        label_value_to_geo_segmentation = {
+            label_value: cls(mask_color=mask_color)
+            for label_value, mask_color in label_value_to_mask_color.items()
+        }
+        for tile in tqdm(tiles, ascii=True, unit="mask"):
+            tile_label_mat, palette = read_label_tile_from_file(
+                tile.get_absolute_tile_fp()
             )
-            geo_segmentation.add_geo_segmentation(geo_segmentation_tile)
+            tile_geo_segmentations = cls.from_tile_label_values(
+                tile,
+                tile_label_mat,
+                label_value_to_mask_color,
+                raster_transform=raster_transform,
+                raster_crs=raster_crs,
+            )
+            for (
+                label_value,
+                geo_segmentation,
+            ) in tile_geo_segmentations.items():
+                label_value_to_geo_segmentation[
+                    label_value
+                ].add_geo_segmentation(geo_segmentation)
+        return label_value_to_geo_segmentation
 
-        return geo_segmentation
+    @staticmethod
+    def _get_tile_transform_with_crs(
+        tile, tile_label_mat, raster_transform=None, raster_crs=None
+    ):
+        tile.set_disk_size(*tile_label_mat.shape[-2:])
+        if isinstance(tile, ImagePixelTile):
+            msg = "ImagePixelTiles requires a valid raster_transform"
+            assert raster_transform is not None, msg
+            msg = "ImagePixelTiles requires a valid raster_crs"
+            assert raster_crs is not None, msg
+            tile.set_crs(raster_crs)
+            tile.set_raster_transform(raster_transform)
+            tile.compute_and_set_tile_transform()
+        return tile.get_tile_transform(), tile.get_crs()
+
+    @classmethod
+    def from_tile_mask(
+        cls,
+        tile,
+        tile_label_mat,
+        tile_mask,
+        mask_color=None,
+        raster_transform=None,
+        raster_crs=None,
+    ):
+        """Create the segmentation of a single (already decoded) tile."""
+        tile_transform, tile_crs = cls._get_tile_transform_with_crs(
+            tile, tile_label_mat, raster_transform, raster_crs
+        )
+        return cls.from_raster_data(
+            tile_mask, tile_transform, tile_crs, mask_color=mask_color
+        )
 
     @classmethod
     def from_raster_data(cls, raster_data, transform, crs, mask_color=None):
@@ -347,6 +690,60 @@ class GeoSegmentation:
         )
         return geo_segmentation
 
+    @classmethod
+    def from_tile_label_values(
+        cls,
+        tile,
+        tile_label_mat,
+        label_value_to_mask_color,
+        raster_transform=None,
+        raster_crs=None,
+    ):
+        """Create the segmentations of all label values of a single (already
+        decoded) tile. See from_raster_data_per_value()."""
+        tile_transform, tile_crs = cls._get_tile_transform_with_crs(
+            tile, tile_label_mat, raster_transform, raster_crs
+        )
+        return cls.from_raster_data_per_value(
+            tile_label_mat,
+            tile_transform,
+            tile_crs,
+            label_value_to_mask_color,
+        )
+
+    @classmethod
+    def from_raster_data_per_value(
+        cls, raster_data, transform, crs, value_to_mask_color
+    ):
+        """Polygonise all values of value_to_mask_color in a single call of
+        get_feature_shapes() and route the polygons by their value.
+
+        The shapes are connected regions of equal value, i.e. the polygons
+        of each value are the same as the polygons of the corresponding
+        binary mask (see from_raster_data()).
+        """
+        value_to_polygon_list = {value: [] for value in value_to_mask_color}
+        mask = np.isin(raster_data, list(value_to_mask_color))
+        if mask.any():
+            for polygon_dict, value in get_feature_shapes(
+                raster_data,
+                transform=transform,
+                mask=mask,
+            ):
+                geojson_polygon = geojson.Polygon(
+                    coordinates=polygon_dict["coordinates"],
+                    precision=geojson_precision,
+                )
+                value_to_polygon_list[int(value)].append(geojson_polygon)
+        return {
+            value: cls(
+                polygon_list=value_to_polygon_list[value],
+                crs=crs,
+                mask_color=mask_color,
+            )
+            for value, mask_color in value_to_mask_color.items()
+        }
+
     def to_raster_data(
         self,
         width,
@@ -387,9 +784,9 @@ class GeoSegmentation:
             )
             for idx, burn_color_value in enumerate(burn_color):
                 burned_colors = burn_color_value * burned_shapes_array
-                raster_data[:, :, idx][
-                    burned_shapes_array > 0
-                ] = burned_colors[burned_shapes_array > 0]
+                raster_data[:, :, idx][burned_shapes_array > 0] = (
+                    burned_colors[burned_shapes_array > 0]
+                )
 
         if not image_axis_order:
             # (height, width, channel) -> (channel, height, width)
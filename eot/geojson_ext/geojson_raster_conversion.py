@@ -20,7 +20,16 @@ def convert_geojson_to_raster(
     burn_color and background_color may be also RGB(A) tuples.
     """
     raster = Raster.get_from_file(raster_ifp)
-    geo_segmentation = GeoSegmentation.from_geojson_file(label_geojson_ifp)
+    if raster.has_valid_matrix_geo_transform():
+        # Only the polygons intersecting the raster are relevant
+        bbox = raster.compute_bounds_in_crs()
+        bbox_crs = raster.get_crs()
+    else:
+        bbox = None
+        bbox_crs = None
+    geo_segmentation = GeoSegmentation.from_geojson_file(
+        label_geojson_ifp, bbox=bbox, bbox_crs=bbox_crs
+    )
     if use_color_map:
         geojson_burn_color = burn_value_color_map
         geojson_background_color = background_value_color_map
@@ -1,162 +1,301 @@
+import concurrent.futures as futures
+import json
 import os
+import re
+from functools import partial
 import geojson
-from eot.crs.crs import CRS
+import numpy as np
+from eot.crs.crs import CRS, transform_bounds
 from eot.geojson_ext import geojson_precision
 
 # https://python-geojson.readthedocs.io/en/latest/#geojson-objects
 
 
-def _reformat_geojson_polygon(polygon):
-    # https://python-geojson.readthedocs.io/en/latest/#polygon
-    # https://stevage.github.io/geojson-spec/#appendix-A.3
-    #  No holes:
-    #     {
-    #         "type": "Polygon",
-    #         "coordinates": [
-    #             [
-    #                 [100.0, 0.0],
-    #                 ...
-    #                 [100.0, 0.0]
-    #             ]
-    #         ]
-    #     }
-    # With holes:
-    #     {
-    #         "type": "Polygon",
-    #         "coordinates": [
-    #             [
-    #                 [100.0, 0.0],
-    #                 ...
-    #                 [100.0, 0.0]
-    #             ],
-    #             [
-    #                 [100.8, 0.8],
-    #                 ...
-    #                 [100.8, 0.8]
-    #             ]
-    #         ]
-    #     }
-    if isinstance(polygon.coordinates, list):
-        # https://github.com/Toblerity/Shapely/issues/245
-        for i, ring in enumerate(polygon.coordinates):
-            # GeoJSON coordinates could be N dimensional
-            polygon.coordinates[i] = [
-                [x, y]
-                for point in ring
-                for x, y in zip([point[0]], [point[1]])
-            ]
-    return polygon
+# Files with these extensions are read as newline-delimited GeoJSON
+NDJSON_EXTENSIONS = [".ndjson", ".geojsonl", ".geojsons", ".jsonl"]
+GEOJSON_READ_CHUNK_SIZE = 1024**2
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
 
 
-def _extract_polygon_list_from_geojson_geometry(geometry):
-    # https://stevage.github.io/geojson-spec/#appendix-A.3
-    # {
-    #     "type": "Polygon",
-    #     "coordinates": [
-    #         [
-    #             [100.0, 0.0],
-    #             ...
-    #             [100.0, 0.0]
-    #         ]
-    #     ]
-    # }
-    # https://stevage.github.io/geojson-spec/#appendix-A.6
-    # {
-    #     "type": "MultiPolygon",
-    #     "coordinates": [
-    #         [
-    #             [
-    #                 [102.0, 2.0],
-    #                 ...
-    #                 [102.0, 2.0]
-    #             ]
-    #         ],
-    #         [
-    #             [
-    #                 [100.0, 0.0],
-    #                 ...
-    #                 [100.0, 0.0]
-    #             ],
-    #             [
-    #                 [100.2, 0.2],
-    #                 ...
-    #                 [100.2, 0.2]
-    #             ]
-    #         ]
-    #     ]
-    # }
-    polygon_list = []
-    if isinstance(geometry, geojson.Polygon):
-        polygon_list.append(_reformat_geojson_polygon(geometry))
-    elif isinstance(geometry, geojson.MultiPolygon):
-        for coordinate_list in geometry.coordinates:
-            polygon_list.append(
-                _reformat_geojson_polygon(
-                    geojson.Polygon(
-                        coordinates=coordinate_list,
-                        precision=geojson_precision,
-                    ),
-                )
-            )
-    return polygon_list
-
-
-def _extract_polygon_list_from_geojson_feature(feature):
-    # https://stevage.github.io/geojson-spec/#section-1.5
-    # {
-    #     "type": "Feature",
-    #     "geometry": {
-    #        "type": "Polygon",
-    #        "coordinates": [
-    #            [
-    #                [100.0, 0.0],
-    #                ...
-    #                [100.0, 0.0]
-    #            ]
-    #        ]
-    # }
-    # https://stevage.github.io/geojson-spec/#appendix-A.7
-    # {
-    #     "type": "Feature",
-    #     "geometry": {
-    #     "type": "GeometryCollection",
-    #     "geometries": [
-    #         {
-    #             "type": "Polygon",
-    #             "coordinates": [
-    #                [
-    #                    [100.0, 0.0],
-    #                    ...
-    #                    [100.0, 0.0]
-    #                ]
-    #            ]
-    #         }, {
-    #             "type": "Polygon",
-    #             "coordinates": [
-    #                [
-    #                    [100.0, 0.0],
-    #                    ...
-    #                    [100.0, 0.0]
-    #                ]
-    #            ]
-    #         }
-    #     ]
-    # }
-    polygon_list = []
-    if not feature or not feature.geometry:
-        return []
-
-    feature_geometry = feature.geometry
-    if isinstance(feature_geometry, geojson.GeometryCollection):
-        for geometry in feature_geometry.geometries:
-            polygon_list.extend(
-                _extract_polygon_list_from_geojson_geometry(geometry)
-            )
+def _convert_ring_to_numpy(ring):
+    # GeoJSON coordinates could be N dimensional
+    if len(ring) == 0:
+        return np.empty((0, 2), dtype=float)
+    try:
+        return np.asarray(ring, dtype=float)[:, :2]
+    except ValueError:
+        # Positions with different dimensions
+        return np.array([point[:2] for point in ring], dtype=float)
+
+
+def _iterate_geometry_polygons(geometry):
+    """Yield the polygons of the geometry as lists of rings (numpy arrays
+    with shape (num_points, 2)), i.e. the outer ring followed by the holes.
+
+    Supports Polygon, MultiPolygon and GeometryCollection geometries (see
+    https://stevage.github.io/geojson-spec/#appendix-A), other geometries
+    are skipped.
+    """
+    if not geometry:
+        return
+    geometry_type = geometry.get("type")
+    if geometry_type == "Polygon":
+        polygon_list = [geometry["coordinates"]]
+    elif geometry_type == "MultiPolygon":
+        polygon_list = geometry["coordinates"]
+    elif geometry_type == "GeometryCollection":
+        for sub_geometry in geometry["geometries"]:
+            yield from _iterate_geometry_polygons(sub_geometry)
+        return
     else:
-        polygon_list.extend(
-            _extract_polygon_list_from_geojson_geometry(feature_geometry)
+        return
+    for polygon in polygon_list:
+        yield [_convert_ring_to_numpy(ring) for ring in polygon]
+
+
+def _intersects_bbox(rings, bbox):
+    if len(rings) == 0 or len(rings[0]) == 0:
+        return False
+    outer_ring = rings[0]
+    min_x, min_y = outer_ring.min(axis=0)
+    max_x, max_y = outer_ring.max(axis=0)
+    bbox_min_x, bbox_min_y, bbox_max_x, bbox_max_y = bbox
+    return (
+        min_x <= bbox_max_x
+        and max_x >= bbox_min_x
+        and min_y <= bbox_max_y
+        and max_y >= bbox_min_y
+    )
+
+
+class _JSONStreamScanner:
+    """Decode consecutive JSON values of a text file, while buffering only
+    (roughly) chunk_size characters (or the size of the current value)."""
+
+    def __init__(self, text_file, chunk_size=GEOJSON_READ_CHUNK_SIZE):
+        self.text_file = text_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        if self.eof:
+            return False
+        # NB: Growing the chunks avoids decoding large values repeatedly
+        chunk = self.text_file.read(
+            max(self.chunk_size, len(self.buffer) - self.pos)
         )
-    return polygon_list
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek_char(self):
+        """Return the next non-whitespace character (None at the end)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return None
+
+    def next_char(self):
+        char = self.peek_char()
+        assert char is not None, "Unexpected end of the GeoJSON file"
+        self.pos += 1
+        return char
+
+    def expect_char(self, expected_char):
+        char = self.next_char()
+        assert char == expected_char, f"Expected {expected_char}, got {char}"
+
+    def decode_value(self):
+        self.peek_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may exceed the buffer
+                if not self._read_more():
+                    raise
+                continue
+            # NB: A number at the end of the buffer may be truncated
+            if end == len(self.buffer) and self._read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def _iterate_json_object_features(scanner, members):
+    """Yield the features of a FeatureCollection one by one and store the
+    other members (e.g. the crs) in members."""
+    scanner.expect_char("{")
+    if scanner.peek_char() == "}":
+        scanner.next_char()
+        return
+    while True:
+        key = scanner.decode_value()
+        scanner.expect_char(":")
+        if key == "features":
+            scanner.expect_char("[")
+            if scanner.peek_char() == "]":
+                scanner.next_char()
+            else:
+                while True:
+                    yield scanner.decode_value()
+                    if scanner.next_char() == "]":
+                        break
+        else:
+            members[key] = scanner.decode_value()
+        if scanner.next_char() == "}":
+            break
+    if members.get("type") == "Feature":
+        yield dict(members)
+    else:
+        msg = f"Unexpected GeoJSON type: {members.get('type')}"
+        assert members.get("type") == "FeatureCollection", msg
+
+
+def compute_ndjson_byte_ranges(geojson_ifp, num_ranges):
+    """Split the newline-delimited GeoJSON file into (roughly) equally
+    sized byte ranges, which can be read independently (e.g. in parallel).
+    """
+    file_size = os.path.getsize(os.path.expanduser(geojson_ifp))
+    offsets = np.linspace(0, file_size, num_ranges + 1).astype(int)
+    return [
+        (int(start), int(end))
+        for start, end in zip(offsets[:-1], offsets[1:])
+        if end > start
+    ]
+
+
+def _iterate_ndjson_features(geojson_ifp, byte_range=None):
+    with open(os.path.expanduser(geojson_ifp), "rb") as geojson_file:
+        if byte_range is None:
+            start, end = 0, None
+        else:
+            start, end = byte_range
+        if start > 0:
+            # Lines starting before the range belong to the previous range
+            geojson_file.seek(start - 1)
+            geojson_file.readline()
+        while end is None or geojson_file.tell() < end:
+            line = geojson_file.readline()
+            if not line:
+                break
+            line = line.strip()
+            # NB: Some writers separate the features with "\x1e" (RFC 8142)
+            line = line.lstrip(b"\x1e")
+            if line:
+                yield json.loads(line)
+
+
+def is_ndjson_file(geojson_ifp):
+    return os.path.splitext(geojson_ifp)[1].lower() in NDJSON_EXTENSIONS
+
+
+class GeoJSONPolygonReader:
+    """Read the polygons of a GeoJSON file incrementally.
+
+    The features are parsed one by one (i.e. without loading the whole
+    file) and the polygon coordinates are returned as numpy arrays (see
+    _iterate_geometry_polygons()). If bbox (min_x, min_y, max_x, max_y) is
+    given, polygons whose outer ring does not intersect the bbox are
+    skipped while parsing. Newline-delimited GeoJSON files (see
+    NDJSON_EXTENSIONS) may be restricted to a byte range (see
+    compute_ndjson_byte_ranges()).
+
+    The crs of the file is available (as self.crs) once the iteration has
+    finished. If the crs member follows the features, the polygons are
+    filtered with the default crs (EPSG:4326) first and the skipped
+    polygons are re-filtered (in a second pass) once the crs is known.
+    """
+
+    def __init__(
+        self,
+        geojson_ifp,
+        bbox=None,
+        bbox_crs=None,
+        ndjson=None,
+        byte_range=None,
+        chunk_size=GEOJSON_READ_CHUNK_SIZE,
+    ):
+        self.geojson_ifp = os.path.expanduser(geojson_ifp)
+        self.bbox = bbox
+        self.bbox_crs = bbox_crs
+        if ndjson is None:
+            ndjson = is_ndjson_file(self.geojson_ifp)
+        self.ndjson = ndjson
+        assert byte_range is None or self.ndjson
+        self.byte_range = byte_range
+        self.chunk_size = chunk_size
+        self.crs = None
+
+    def _get_file_bbox(self):
+        if self.bbox is None or self.bbox_crs is None:
+            return self.bbox
+        if CRS.from_user_input(self.bbox_crs) == self.crs:
+            return self.bbox
+        return transform_bounds(self.bbox_crs, self.crs, *self.bbox)
+
+    def _iterate_features(self, members):
+        if self.ndjson:
+            yield from _iterate_ndjson_features(
+                self.geojson_ifp, self.byte_range
+            )
+        else:
+            with open(self.geojson_ifp, encoding="utf-8") as geojson_file:
+                scanner = _JSONStreamScanner(geojson_file, self.chunk_size)
+                yield from _iterate_json_object_features(scanner, members)
+                msg = (
+                    f"Unexpected content after the GeoJSON object in"
+                    f" {self.geojson_ifp} (newline-delimited GeoJSON files"
+                    f" require one of the extensions {NDJSON_EXTENSIONS})"
+                )
+                assert scanner.peek_char() is None, msg
+
+    def _iterate_polygons(self, members):
+        for feature in self._iterate_features(members):
+            yield from _iterate_geometry_polygons(feature.get("geometry"))
+
+    def __iter__(self):
+        members = {}
+        # NB: The crs member precedes the features in common files, until it
+        #  is found the polygons are filtered with the default crs
+        self.crs = _get_geojson_epsg(members)
+        default_crs = self.crs
+        file_bbox = self._get_file_bbox()
+        default_file_bbox = file_bbox
+        crs_found = False
+        for rings in self._iterate_polygons(members):
+            if not crs_found and "crs" in members:
+                crs_found = True
+                self.crs = _get_geojson_epsg(members)
+                file_bbox = self._get_file_bbox()
+            if file_bbox is not None and not _intersects_bbox(
+                rings, file_bbox
+            ):
+                continue
+            yield rings
+        if crs_found or "crs" not in members:
+            return
+
+        # The crs member follows the features
+        self.crs = _get_geojson_epsg(members)
+        if default_file_bbox is None or self.crs == default_crs:
+            return
+        file_bbox = self._get_file_bbox()
+        # NB: The polygons yielded above are kept, i.e. the result may
+        #  contain a few additional polygons outside of the bbox
+        for rings in self._iterate_polygons({}):
+            if _intersects_bbox(rings, file_bbox) and not _intersects_bbox(
+                rings, default_file_bbox
+            ):
+                yield rings
 
 
 def _get_geojson_epsg(feature_collection):
@@ -179,29 +318,49 @@ def _get_geojson_epsg(feature_collection):
     return crs
 
 
-def _read_geojson_feature_list(geojson_ifp):
-    with open(os.path.expanduser(geojson_ifp)) as fp:
-        assert fp, "Unable to open {}".format(geojson_ifp)
-        feature_or_feature_collection = geojson.load(fp)
-        crs = _get_geojson_epsg(feature_or_feature_collection)
-        if isinstance(
-            feature_or_feature_collection, geojson.FeatureCollection
-        ):
-            feature_list = feature_or_feature_collection.features
-        elif isinstance(feature_or_feature_collection, geojson.Feature):
-            feature_list = [feature_or_feature_collection]
-        else:
-            assert False
-    return feature_list, crs
+def _convert_rings_to_geojson_polygon(rings):
+    polygon = geojson.Polygon(coordinates=[], precision=geojson_precision)
+    # NB: Assigning the coordinates skips the (slow) coordinate validation
+    #  and rounding of geojson, the parsed values are already floats
+    polygon["coordinates"] = [ring.tolist() for ring in rings]
+    return polygon
+
+
+def _read_geojson_polygon_list_part(
+    geojson_ifp, bbox=None, bbox_crs=None, byte_range=None
+):
+    reader = GeoJSONPolygonReader(
+        geojson_ifp, bbox=bbox, bbox_crs=bbox_crs, byte_range=byte_range
+    )
+    polygon_list = [
+        _convert_rings_to_geojson_polygon(rings)
+        for rings in reader
+        # Skip empty polygons
+        if len(rings) > 0
+    ]
+    return polygon_list, reader.crs
 
 
-def read_geojson_polygon_list(geojson_ifp):
-    feature_list, crs = _read_geojson_feature_list(geojson_ifp)
+def read_geojson_polygon_list(
+    geojson_ifp, bbox=None, bbox_crs=None, workers=1
+):
+    """Read the polygons (optionally restricted to bbox) as geojson
+    polygons. Newline-delimited GeoJSON files are read in parallel, if
+    workers is larger than 1."""
+    if workers <= 1 or not is_ndjson_file(geojson_ifp):
+        return _read_geojson_polygon_list_part(geojson_ifp, bbox, bbox_crs)
+
+    byte_ranges = compute_ndjson_byte_ranges(geojson_ifp, workers)
     polygon_list = []
-    for feature in feature_list:
-        for polygon in _extract_polygon_list_from_geojson_feature(feature):
-            # Skip empty polygons
-            if len(polygon.coordinates) == 0:
-                continue
-            polygon_list.append(polygon)
+    crs = CRS.from_epsg(4326)
+    with futures.ProcessPoolExecutor(workers) as executor:
+        for part_polygon_list, part_crs in executor.map(
+            partial(
+                _read_geojson_polygon_list_part, geojson_ifp, bbox, bbox_crs
+            ),
+            byte_ranges,
+        ):
+            polygon_list.extend(part_polygon_list)
+            if part_crs is not None:
+                crs = part_crs
     return polygon_list, crs
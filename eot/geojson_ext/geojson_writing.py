@@ -1,5 +1,13 @@
+import json
 import geojson
 from eot.geojson_ext import geojson_precision
+from eot.geojson_ext.geojson_reading import NDJSON_EXTENSIONS, is_ndjson_file
+
+
+def get_geojson_ext(ndjson=False):
+    """Return the file extension of (newline-delimited) GeoJSON files, i.e.
+    the extension the GeoJSON readers use to detect the format."""
+    return NDJSON_EXTENSIONS[0] if ndjson else ".json"
 
 
 def write_geojson_str(geojson_ofp, geojson_str):
@@ -15,6 +23,104 @@ def write_geojson_object(geojson_ofp, geojson_object):
     write_geojson_str(geojson_ofp, geojson_str)
 
 
+def _round_coordinates(coordinates, precision):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates]
+    return [
+        _round_coordinates(sub_coordinates, precision)
+        for sub_coordinates in coordinates
+    ]
+
+
+def _round_geometry(geometry, precision):
+    if geometry["type"] == "GeometryCollection":
+        geometries = [
+            _round_geometry(sub_geometry, precision)
+            for sub_geometry in geometry["geometries"]
+        ]
+        return {**geometry, "geometries": geometries}
+    coordinates = geometry["coordinates"]
+    if len(coordinates) == 0:
+        return geometry
+    return {
+        **geometry,
+        "coordinates": _round_coordinates(coordinates, precision),
+    }
+
+
+def convert_feature_to_str(feature, precision=None):
+    """Serialize the feature compactly (optionally rounding the coordinates
+    to precision decimal places)."""
+    if precision is not None and feature.get("geometry") is not None:
+        feature = {
+            **feature,
+            "geometry": _round_geometry(feature["geometry"], precision),
+        }
+    return json.dumps(feature, separators=(",", ":"), ensure_ascii=False)
+
+
+class GeoJSONFeatureWriter:
+    """Stream features to a compact FeatureCollection or (if ndjson is set)
+    to newline-delimited GeoJSON (i.e. one feature per line).
+
+    Each feature is serialized and written immediately, i.e. the memory
+    consumption does not depend on the number of features.
+    """
+
+    def __init__(self, geojson_ofp, ndjson=False, precision=None):
+        msg = (
+            f"The extension of {geojson_ofp} does not match the format"
+            f" (ndjson={ndjson}), use {get_geojson_ext(ndjson)} instead"
+        )
+        assert is_ndjson_file(geojson_ofp) == ndjson, msg
+        self.ndjson = ndjson
+        self.precision = precision
+        self.num_features = 0
+        self.geojson_file = open(geojson_ofp, "w", encoding="utf-8")
+        if not self.ndjson:
+            self.geojson_file.write('{"type":"FeatureCollection","features":[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_feature_str(self, feature_str):
+        if self.ndjson:
+            self.geojson_file.write(feature_str)
+            self.geojson_file.write("\n")
+        else:
+            if self.num_features > 0:
+                self.geojson_file.write(",")
+            self.geojson_file.write(feature_str)
+        self.num_features += 1
+
+    def write_feature(self, feature):
+        self.write_feature_str(convert_feature_to_str(feature, self.precision))
+
+    def write_features(self, features):
+        for feature in features:
+            self.write_feature(feature)
+
+    def close(self):
+        if self.geojson_file.closed:
+            return
+        if not self.ndjson:
+            self.geojson_file.write("]}")
+        self.geojson_file.close()
+
+
+def write_geojson_features(
+    geojson_ofp, features, ndjson=False, precision=None
+):
+    """Stream the (iterable of) features to a single file."""
+    with GeoJSONFeatureWriter(
+        geojson_ofp, ndjson=ndjson, precision=precision
+    ) as writer:
+        writer.write_features(features)
+
+
 def write_polygon_as_geojson_polygon(geojson_ofp, polygon):
     # A polygon is filled by default in QGIS. The style can be changed in the
     # raster layer properties
@@ -0,0 +1,171 @@
+import os
+import geojson
+import numpy as np
+from eot.geojson_ext import geojson_precision
+
+COORDINATES_FN = "coordinates.npy"
+RING_OFFSETS_FN = "ring_offsets.npy"
+POLYGON_OFFSETS_FN = "polygon_offsets.npy"
+BOUNDS_FN = "bounds.npy"
+# Optional (persistent) spatial index of the bounds (see BoundsSpatialIndex)
+BOUNDS_INDEX_STEM = "bounds_index"
+
+
+def _compute_polygon_arrays(polygon_list):
+    ring_sizes = []
+    polygon_sizes = []
+    for polygon in polygon_list:
+        rings = polygon["coordinates"]
+        polygon_sizes.append(len(rings))
+        ring_sizes.extend(len(ring) for ring in rings)
+    coordinates = np.array(
+        [
+            point[:2]
+            for polygon in polygon_list
+            for ring in polygon["coordinates"]
+            for point in ring
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    ring_offsets = np.zeros(len(ring_sizes) + 1, dtype=np.int64)
+    np.cumsum(ring_sizes, out=ring_offsets[1:])
+    polygon_offsets = np.zeros(len(polygon_sizes) + 1, dtype=np.int64)
+    np.cumsum(polygon_sizes, out=polygon_offsets[1:])
+    return coordinates, ring_offsets, polygon_offsets
+
+
+def _compute_polygon_bounds(coordinates, ring_offsets, polygon_offsets):
+    """Return the bounds (min_x, min_y, max_x, max_y) of the outer rings."""
+    num_polygons = len(polygon_offsets) - 1
+    bounds = np.empty((num_polygons, 4), dtype=np.float64)
+    if num_polygons == 0:
+        return bounds
+    # NB: reduceat() reduces the slices between consecutive indices, i.e.
+    #  every second slice corresponds to an outer ring
+    outer_ring_slice_indices = np.column_stack(
+        [
+            ring_offsets[polygon_offsets[:-1]],
+            ring_offsets[polygon_offsets[:-1] + 1],
+        ]
+    ).ravel()
+    if outer_ring_slice_indices[-1] == len(coordinates):
+        outer_ring_slice_indices = outer_ring_slice_indices[:-1]
+    min_values = np.minimum.reduceat(coordinates, outer_ring_slice_indices)
+    max_values = np.maximum.reduceat(coordinates, outer_ring_slice_indices)
+    bounds[:, :2] = min_values[::2]
+    bounds[:, 2:] = max_values[::2]
+    return bounds
+
+
+def write_polygon_arrays(polygon_list, odp):
+    """Write the polygons as flat numpy arrays (coordinates, ring offsets,
+    polygon offsets and bounds), which can be memory-mapped by other
+    processes (see PolygonArrays).
+
+    Polygons without coordinates are skipped.
+    """
+    polygon_list = [
+        polygon
+        for polygon in polygon_list
+        if len(polygon["coordinates"]) > 0
+        and len(polygon["coordinates"][0]) > 0
+    ]
+    coordinates, ring_offsets, polygon_offsets = _compute_polygon_arrays(
+        polygon_list
+    )
+    bounds = _compute_polygon_bounds(
+        coordinates, ring_offsets, polygon_offsets
+    )
+    os.makedirs(odp, exist_ok=True)
+    np.save(os.path.join(odp, COORDINATES_FN), coordinates)
+    np.save(os.path.join(odp, RING_OFFSETS_FN), ring_offsets)
+    np.save(os.path.join(odp, POLYGON_OFFSETS_FN), polygon_offsets)
+    np.save(os.path.join(odp, BOUNDS_FN), bounds)
+
+
+def merge_polygon_arrays(idp_list, odp):
+    """Concatenate the polygon arrays of several directories (without
+    loading the arrays into memory)."""
+    polygon_arrays_list = [PolygonArrays(idp) for idp in idp_list]
+    os.makedirs(odp, exist_ok=True)
+
+    def _open_output(fn, dtype, shape):
+        return np.lib.format.open_memmap(
+            os.path.join(odp, fn), mode="w+", dtype=dtype, shape=shape
+        )
+
+    num_coordinates = sum(
+        len(arrays.coordinates) for arrays in polygon_arrays_list
+    )
+    num_rings = sum(
+        len(arrays.ring_offsets) - 1 for arrays in polygon_arrays_list
+    )
+    num_polygons = sum(len(arrays) for arrays in polygon_arrays_list)
+    coordinates = _open_output(
+        COORDINATES_FN, np.float64, (num_coordinates, 2)
+    )
+    ring_offsets = _open_output(RING_OFFSETS_FN, np.int64, (num_rings + 1,))
+    polygon_offsets = _open_output(
+        POLYGON_OFFSETS_FN, np.int64, (num_polygons + 1,)
+    )
+    bounds = _open_output(BOUNDS_FN, np.float64, (num_polygons, 4))
+    ring_offsets[0] = 0
+    polygon_offsets[0] = 0
+    coordinate_index, ring_index, polygon_index = 0, 0, 0
+    for arrays in polygon_arrays_list:
+        current_num_coordinates = len(arrays.coordinates)
+        current_num_rings = len(arrays.ring_offsets) - 1
+        current_num_polygons = len(arrays)
+        coordinates[
+            coordinate_index : coordinate_index + current_num_coordinates
+        ] = arrays.coordinates
+        ring_offsets[ring_index + 1 : ring_index + current_num_rings + 1] = (
+            arrays.ring_offsets[1:] + coordinate_index
+        )
+        polygon_offsets[
+            polygon_index + 1 : polygon_index + current_num_polygons + 1
+        ] = (arrays.polygon_offsets[1:] + ring_index)
+        bounds[polygon_index : polygon_index + current_num_polygons] = (
+            arrays.bounds
+        )
+        coordinate_index += current_num_coordinates
+        ring_index += current_num_rings
+        polygon_index += current_num_polygons
+    for array in [coordinates, ring_offsets, polygon_offsets, bounds]:
+        array.flush()
+
+
+class PolygonArrays:
+    """Memory-mapped polygons written with write_polygon_arrays().
+
+    Indexing returns the corresponding geojson polygon, i.e. only the
+    requested polygons are read (and converted).
+    """
+
+    def __init__(self, idp):
+        self.bounds_index_fp_stem = os.path.join(idp, BOUNDS_INDEX_STEM)
+
+        def _load(fn):
+            return np.load(os.path.join(idp, fn), mmap_mode="r")
+
+        self.coordinates = _load(COORDINATES_FN)
+        self.ring_offsets = _load(RING_OFFSETS_FN)
+        self.polygon_offsets = _load(POLYGON_OFFSETS_FN)
+        self.bounds = _load(BOUNDS_FN)
+
+    def __len__(self):
+        return len(self.polygon_offsets) - 1
+
+    def __getitem__(self, index):
+        ring_start, ring_end = self.polygon_offsets[index : index + 2]
+        ring_offsets = self.ring_offsets[ring_start : ring_end + 1]
+        coordinates = self.coordinates[ring_offsets[0] : ring_offsets[-1]]
+        rings = [
+            coordinates[
+                start - ring_offsets[0] : end - ring_offsets[0]
+            ].tolist()
+            for start, end in zip(ring_offsets[:-1], ring_offsets[1:])
+        ]
+        polygon = geojson.Polygon(coordinates=[], precision=geojson_precision)
+        polygon["coordinates"] = rings
+        return polygon
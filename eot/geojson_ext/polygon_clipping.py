@@ -0,0 +1,139 @@
+import collections
+import math
+import geojson
+import shapely
+from shapely.geometry import mapping, shape
+from eot.geojson_ext import geojson_precision
+
+# Margin (in pixels) of the clip rectangles, i.e. clipping does not alter the
+#  pixels at the tile borders
+TILE_CLIP_MARGIN_PIXEL = 1
+# Size (in tiles) of the blocks caching the clipped parts of large polygons
+CLIP_BLOCK_SIZE_TILES = 8
+MAX_CACHED_CLIP_BLOCKS = 4096
+
+
+def compute_tile_clip_bounds(
+    tile_transform, tile_width, tile_height, margin=TILE_CLIP_MARGIN_PIXEL
+):
+    """Return the bounds of the tile (plus a margin in pixels) in the crs of
+    the tile transform."""
+    x_values, y_values = zip(
+        tile_transform * (-margin, -margin),
+        tile_transform * (tile_width + margin, tile_height + margin),
+    )
+    return min(x_values), min(y_values), max(x_values), max(y_values)
+
+
+def _contains_bounds(outer_bounds, inner_bounds):
+    return (
+        outer_bounds[0] <= inner_bounds[0]
+        and outer_bounds[1] <= inner_bounds[1]
+        and inner_bounds[2] <= outer_bounds[2]
+        and inner_bounds[3] <= outer_bounds[3]
+    )
+
+
+def _convert_to_geojson_polygons(geometry):
+    geojson_polygons = []
+    for part in getattr(geometry, "geoms", [geometry]):
+        # NB: Clipping may create degenerated parts (i.e. lines or points)
+        if part.geom_type != "Polygon" or part.is_empty:
+            continue
+        polygon = geojson.Polygon(coordinates=[], precision=geojson_precision)
+        polygon["coordinates"] = mapping(part)["coordinates"]
+        geojson_polygons.append(polygon)
+    return geojson_polygons
+
+
+class TilePolygonClipper:
+    """Clip polygons to tile rectangles before rasterizing them.
+
+    Polygons within the clip rectangle are returned unchanged. Larger
+    polygons (e.g. landuse or water areas) are clipped, i.e. the
+    rasterization time depends on the tile area instead of the polygon size.
+
+    To avoid clipping a large polygon as a whole for each tile, the polygon
+    is first clipped to a block of CLIP_BLOCK_SIZE_TILES x
+    CLIP_BLOCK_SIZE_TILES tiles (plus a margin of half a block). These block
+    parts are cached and shared by all (adjacent or overlapping) tiles of
+    the block.
+    """
+
+    def __init__(
+        self,
+        polygon_list,
+        polygon_bounds_list,
+        block_size_tiles=CLIP_BLOCK_SIZE_TILES,
+        max_cached_blocks=MAX_CACHED_CLIP_BLOCKS,
+    ):
+        assert len(polygon_list) == len(polygon_bounds_list)
+        self.polygon_list = polygon_list
+        self.polygon_bounds_list = polygon_bounds_list
+        self.block_size_tiles = block_size_tiles
+        self.max_cached_blocks = max_cached_blocks
+        self.block_width = None
+        self.block_height = None
+        self._index_to_geometry = {}
+        # {(polygon_index, block_x, block_y): geometry}
+        self._block_parts = collections.OrderedDict()
+
+    def _get_geometry(self, index):
+        if index not in self._index_to_geometry:
+            self._index_to_geometry[index] = shape(self.polygon_list[index])
+        return self._index_to_geometry[index]
+
+    def _get_block(self, clip_bounds):
+        min_x, min_y, max_x, max_y = clip_bounds
+        if self.block_width is None:
+            # NB: The block size is determined by the first tile
+            self.block_width = (max_x - min_x) * self.block_size_tiles
+            self.block_height = (max_y - min_y) * self.block_size_tiles
+        block_x = math.floor(min_x / self.block_width)
+        block_y = math.floor(min_y / self.block_height)
+        x_margin = self.block_width / 2
+        y_margin = self.block_height / 2
+        block_bounds = (
+            block_x * self.block_width - x_margin,
+            block_y * self.block_height - y_margin,
+            (block_x + 1) * self.block_width + x_margin,
+            (block_y + 1) * self.block_height + y_margin,
+        )
+        return (block_x, block_y), block_bounds
+
+    def _get_block_part(self, index, block_key, block_bounds):
+        key = (index, *block_key)
+        if key in self._block_parts:
+            self._block_parts.move_to_end(key)
+        else:
+            self._block_parts[key] = shapely.clip_by_rect(
+                self._get_geometry(index), *block_bounds
+            )
+            if len(self._block_parts) > self.max_cached_blocks:
+                self._block_parts.popitem(last=False)
+        return self._block_parts[key]
+
+    def clip_polygons(self, indices, clip_bounds):
+        """Return the polygons with the given indices clipped to clip_bounds
+        (see compute_tile_clip_bounds())."""
+        block_key, block_bounds = self._get_block(clip_bounds)
+        # Tiles larger than the block margin are clipped directly
+        use_block = _contains_bounds(block_bounds, clip_bounds)
+        clipped_polygons = []
+        for index in indices:
+            polygon_bounds = self.polygon_bounds_list[index]
+            if _contains_bounds(clip_bounds, polygon_bounds):
+                clipped_polygons.append(self.polygon_list[index])
+                continue
+            if use_block and not _contains_bounds(
+                block_bounds, polygon_bounds
+            ):
+                geometry = self._get_block_part(index, block_key, block_bounds)
+            else:
+                geometry = self._get_geometry(index)
+            clipped_polygons.extend(
+                _convert_to_geojson_polygons(
+                    shapely.clip_by_rect(geometry, *clip_bounds)
+                )
+            )
+        return clipped_polygons
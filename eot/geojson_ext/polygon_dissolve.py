@@ -0,0 +1,206 @@
+from collections import defaultdict
+import geojson
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+from eot.geojson_ext import geojson_precision
+
+# The grid size (used to snap the coordinates of adjacent tiles) relative to
+#  the pixel size of the tiles
+DISSOLVE_GRID_SIZE_FACTOR = 1.0e-3
+
+
+class _Fragment:
+    """Polygon (or merged polygons) of one or more tiles."""
+
+    def __init__(self, geometry, geojson_polygon=None):
+        self.geometry = geometry
+        # The unchanged input polygon (None for merged polygons)
+        self.geojson_polygon = geojson_polygon
+
+    def to_geojson_polygon(self):
+        if self.geojson_polygon is not None:
+            return self.geojson_polygon
+        return geojson.Polygon(
+            coordinates=mapping(self.geometry)["coordinates"],
+            precision=geojson_precision,
+        )
+
+
+def _compute_components(geometries):
+    """Return the groups of (transitively) intersecting geometries."""
+    parents = np.arange(len(geometries))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    tree = STRtree(geometries)
+    input_indices, tree_indices = tree.query(
+        geometries, predicate="intersects"
+    )
+    for input_index, tree_index in zip(input_indices, tree_indices):
+        input_root, tree_root = find(input_index), find(tree_index)
+        if input_root != tree_root:
+            parents[max(input_root, tree_root)] = min(input_root, tree_root)
+    components = defaultdict(list)
+    for index in range(len(geometries)):
+        components[find(index)].append(index)
+    return list(components.values())
+
+
+class TilePolygonDissolver:
+    """Dissolve the polygons of adjacent (or overlapping) tiles (of the same
+    category).
+
+    The bounds of all tiles (in the crs of the tile polygons) are given in
+    advance. Polygons neither touching the border of their tile nor
+    intersecting another tile are complete and are kept as they are. The
+    remaining fragments are grouped by tile row (i.e. tiles with the same
+    top) and merged row by row (from top to bottom): an STR-tree over the
+    fragments of the current row and the open polygons of the previous rows
+    determines the groups of adjacent (or duplicated) fragments, which are
+    unioned. Merged polygons not reaching the next row are complete.
+
+    A row is dissolved as soon as the tiles of this row and of all rows
+    above have been added, i.e. if the tiles are added (roughly) row by row
+    only the fragments of a few rows are kept in memory.
+
+    The coordinates of the fragments are snapped to a grid (a fraction of
+    the pixel size) to remove numerical gaps between adjacent tiles.
+    """
+
+    def __init__(
+        self, tile_bounds_list, grid_size_factor=DISSOLVE_GRID_SIZE_FACTOR
+    ):
+        self.tile_bounds_array = np.asarray(
+            tile_bounds_list, dtype=np.float64
+        ).reshape(-1, 4)
+        self.tile_tree = STRtree(shapely.box(*self.tile_bounds_array.T))
+        self.grid_size_factor = grid_size_factor
+        self.grid_size = None
+        row_tops, tile_row_indices = np.unique(
+            self.tile_bounds_array[:, 3], return_inverse=True
+        )
+        # From top to bottom
+        self.row_tops = row_tops[::-1]
+        self.tile_row_indices = len(row_tops) - 1 - tile_row_indices
+        self.row_num_missing_tiles = np.bincount(
+            self.tile_row_indices, minlength=len(self.row_tops)
+        )
+        self.next_row_index = 0
+        # {row_index: [fragment, ...]}
+        self.row_to_fragments = defaultdict(list)
+        self.open_fragments = []
+        self.polygons = []
+        self.num_input_polygons = 0
+        self.num_output_polygons = 0
+
+    def _is_fragment(self, tile_index, geometries):
+        """Return for each geometry, if it touches the border of the tile or
+        intersects another tile."""
+        if len(geometries) == 0:
+            return np.zeros(0, dtype=bool)
+        min_x, min_y, max_x, max_y = self.tile_bounds_array[tile_index]
+        geometry_bounds = shapely.bounds(geometries)
+        is_fragment = (
+            (geometry_bounds[:, 0] <= min_x + self.grid_size)
+            | (geometry_bounds[:, 1] <= min_y + self.grid_size)
+            | (geometry_bounds[:, 2] >= max_x - self.grid_size)
+            | (geometry_bounds[:, 3] >= max_y - self.grid_size)
+        )
+        # NB: Polygons in the overlap of tiles are part of several tiles
+        geometry_indices, tile_indices = self.tile_tree.query(
+            geometries, predicate="intersects"
+        )
+        is_fragment[geometry_indices[tile_indices != tile_index]] = True
+        return is_fragment
+
+    def add_tile_polygons(self, tile_index, geojson_polygons, tile_transform):
+        """Add the polygons of a tile (in the crs of the tile transform).
+
+        Must be called once for each tile (also for tiles without
+        polygons)."""
+        self.num_input_polygons += len(geojson_polygons)
+        pixel_size = min(abs(tile_transform.a), abs(tile_transform.e))
+        grid_size = pixel_size * self.grid_size_factor
+        if self.grid_size is None or grid_size < self.grid_size:
+            self.grid_size = grid_size
+        geometries = np.array(
+            [shape(geojson_polygon) for geojson_polygon in geojson_polygons],
+            dtype=object,
+        )
+        row_index = self.tile_row_indices[tile_index]
+        for geojson_polygon, geometry, is_fragment in zip(
+            geojson_polygons,
+            geometries,
+            self._is_fragment(tile_index, geometries),
+        ):
+            if is_fragment:
+                self.row_to_fragments[row_index].append(
+                    _Fragment(geometry, geojson_polygon)
+                )
+            else:
+                self.polygons.append(geojson_polygon)
+        self.row_num_missing_tiles[row_index] -= 1
+        while (
+            self.next_row_index < len(self.row_tops)
+            and self.row_num_missing_tiles[self.next_row_index] <= 0
+        ):
+            self._dissolve_row(self.next_row_index)
+            self.next_row_index += 1
+
+    def _merge_fragments(self, fragments):
+        geometries = [
+            shapely.set_precision(fragment.geometry, self.grid_size)
+            for fragment in fragments
+        ]
+        merged_fragments = []
+        for component in _compute_components(geometries):
+            if len(component) == 1:
+                merged_fragments.append(fragments[component[0]])
+                continue
+            merged = unary_union([geometries[index] for index in component])
+            # Fragments touching only at corners remain separate polygons
+            for polygon in getattr(merged, "geoms", [merged]):
+                merged_fragments.append(_Fragment(polygon))
+        return merged_fragments
+
+    def _dissolve_row(self, row_index):
+        row_fragments = self.row_to_fragments.pop(row_index, [])
+        if len(row_fragments) > 0:
+            fragments = self._merge_fragments(
+                self.open_fragments + row_fragments
+            )
+        else:
+            fragments = self.open_fragments
+        self.open_fragments = []
+        is_last_row = row_index + 1 == len(self.row_tops)
+        for fragment in fragments:
+            # Polygons reaching the next row may continue in the next rows
+            if (
+                not is_last_row
+                and fragment.geometry.bounds[1]
+                <= self.row_tops[row_index + 1] + self.grid_size
+            ):
+                self.open_fragments.append(fragment)
+            else:
+                self.polygons.append(fragment.to_geojson_polygon())
+
+    def dissolve(self):
+        """Return the dissolved polygons (as geojson polygons)."""
+        # NB: Rows with missing tiles are dissolved with the available tiles
+        for row_index in range(self.next_row_index, len(self.row_tops)):
+            self._dissolve_row(row_index)
+        self.next_row_index = len(self.row_tops)
+        polygons = self.polygons + [
+            fragment.to_geojson_polygon() for fragment in self.open_fragments
+        ]
+        self.polygons = []
+        self.open_fragments = []
+        self.num_output_polygons = len(polygons)
+        return polygons
@@ -0,0 +1,364 @@
+import math
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+import numpy as np
+import rasterio
+from rasterio import shutil as rio_shutil
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+# Block size of the internal tiles (and of the overviews) of written COGs
+COG_BLOCK_SIZE = 512
+
+
+def get_cog_overview_factors(width, height, block_size=COG_BLOCK_SIZE):
+    """Return the overview factors (2, 4, 8, ...) of a COG, i.e. until the
+    overview fits into a single block.
+
+    The factors are restricted to divisors of the block size, so that each
+    (block aligned) window maps to an integral overview window.
+    """
+    factors = []
+    factor = 2
+    while (
+        block_size % factor == 0
+        and max(width, height) / (factor // 2) > block_size
+    ):
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def _downsample_block(data, factor, resampling):
+    """Downsample (channel, height, width) data by an integral factor."""
+    if resampling == Resampling.nearest:
+        return data[:, ::factor, ::factor]
+    assert resampling == Resampling.average, resampling
+    count, height, width = data.shape
+    out_height = math.ceil(height / factor)
+    out_width = math.ceil(width / factor)
+    # Cells at the borders of the raster are averaged w.r.t. the existing
+    #  pixels (by replicating the border pixels)
+    padded = np.pad(
+        data,
+        (
+            (0, 0),
+            (0, out_height * factor - height),
+            (0, out_width * factor - width),
+        ),
+        mode="edge",
+    )
+    cells = padded.reshape(count, out_height, factor, out_width, factor)
+    averaged = cells.mean(axis=(2, 4))
+    if np.issubdtype(data.dtype, np.integer):
+        averaged = np.rint(averaged)
+    return averaged.astype(data.dtype)
+
+
+def _add_sub_element(parent, tag, text=None, **attributes):
+    element = ET.SubElement(parent, tag, **attributes)
+    if text is not None:
+        element.text = text
+    return element
+
+
+def _write_vrt_with_overviews(vrt_ofp, base_fp, overview_fps):
+    """Write a VRT of base_fp exposing overview_fps as (explicit)
+    overviews."""
+    with rasterio.open(base_fp) as base:
+        vrt = ET.Element(
+            "VRTDataset",
+            rasterXSize=str(base.width),
+            rasterYSize=str(base.height),
+        )
+        if base.crs is not None:
+            _add_sub_element(vrt, "SRS", base.crs.to_wkt())
+            geo_transform = ", ".join(
+                repr(value) for value in base.transform.to_gdal()
+            )
+            _add_sub_element(vrt, "GeoTransform", geo_transform)
+        for band_index in base.indexes:
+            band = _add_sub_element(
+                vrt,
+                "VRTRasterBand",
+                dataType=_get_gdal_data_type(base.dtypes[band_index - 1]),
+                band=str(band_index),
+            )
+            if base.nodata is not None:
+                _add_sub_element(band, "NoDataValue", repr(base.nodata))
+            color_interp = base.colorinterp[band_index - 1].name
+            _add_sub_element(band, "ColorInterp", color_interp.capitalize())
+            if color_interp == "palette":
+                color_table = _add_sub_element(band, "ColorTable")
+                for index, color in sorted(base.colormap(band_index).items()):
+                    _add_sub_element(
+                        color_table,
+                        "Entry",
+                        **{
+                            f"c{i + 1}": str(value)
+                            for i, value in enumerate(color)
+                        },
+                    )
+            source = _add_sub_element(band, "SimpleSource")
+            _add_sub_element(
+                source, "SourceFilename", base_fp, relativeToVRT="0"
+            )
+            _add_sub_element(source, "SourceBand", str(band_index))
+            for overview_fp in overview_fps:
+                overview = _add_sub_element(band, "Overview")
+                _add_sub_element(
+                    overview, "SourceFilename", overview_fp, relativeToVRT="0"
+                )
+                _add_sub_element(overview, "SourceBand", str(band_index))
+    ET.ElementTree(vrt).write(vrt_ofp)
+
+
+def _get_gdal_data_type(dtype):
+    # https://gdal.org/user/raster_data_model.html#raster-band
+    return {
+        "uint8": "Byte",
+        "int8": "Int8",
+        "uint16": "UInt16",
+        "int16": "Int16",
+        "uint32": "UInt32",
+        "int32": "Int32",
+        "float32": "Float32",
+        "float64": "Float64",
+    }[np.dtype(dtype).name]
+
+
+class BlockWiseCogWriter:
+    """Write a Cloud Optimized GeoTIFF block by block.
+
+    The blocks are written to a temporary tiled GeoTIFF, while the overviews
+    are computed from the same blocks (i.e. in the same streaming pass) and
+    written to temporary overview GeoTIFFs. Closing the writer copies the
+    data and the existing overviews to the COG layout (tiled, compressed,
+    overviews before the full resolution data) without reading the full
+    resolution data into memory or resampling it again.
+
+    The windows must be aligned to the block size (except at the right and
+    bottom raster border).
+    """
+
+    def __init__(
+        self,
+        ofp,
+        profile,
+        block_size=COG_BLOCK_SIZE,
+        overview_resampling=Resampling.nearest,
+        color_map=None,
+        compress="DEFLATE",
+    ):
+        msg = "The block size of tiled GeoTIFFs must be a multiple of 16"
+        assert block_size % 16 == 0, msg
+        self.ofp = ofp
+        self.block_size = block_size
+        self.overview_resampling = Resampling(overview_resampling)
+        self.compress = compress
+        # NB: Use the directory of the output to avoid copies between file
+        #  systems
+        self.tmp_dp = tempfile.mkdtemp(
+            prefix=".cog_", dir=os.path.dirname(os.path.abspath(ofp))
+        )
+        self.base_fp = os.path.join(self.tmp_dp, "base.tif")
+        width, height = profile["width"], profile["height"]
+        self.overview_factors = get_cog_overview_factors(
+            width, height, block_size
+        )
+        tmp_profile = {
+            key: value
+            for key, value in profile.items()
+            if key not in ["compress", "photometric", "interleave"]
+        }
+        tmp_profile.update(
+            {
+                "driver": "GTiff",
+                "tiled": True,
+                "blockxsize": block_size,
+                "blockysize": block_size,
+                "BIGTIFF": "IF_SAFER",
+            }
+        )
+        self.base = rasterio.open(self.base_fp, "w", **tmp_profile)
+        if color_map is not None:
+            assert self.base.count == 1
+            self.base.write_colormap(1, color_map)
+        self.overviews = []
+        for factor in self.overview_factors:
+            overview_profile = dict(tmp_profile)
+            overview_profile["width"] = math.ceil(width / factor)
+            overview_profile["height"] = math.ceil(height / factor)
+            overview_fp = os.path.join(self.tmp_dp, f"overview_{factor}.tif")
+            self.overviews.append(
+                rasterio.open(overview_fp, "w", **overview_profile)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.close()
+        finally:
+            self._remove_tmp_files()
+
+    @property
+    def width(self):
+        return self.base.width
+
+    @property
+    def height(self):
+        return self.base.height
+
+    def write(self, data, window):
+        assert window.col_off % self.block_size == 0
+        assert window.row_off % self.block_size == 0
+        self.base.write(data, window=window)
+        previous_factor = 1
+        for factor, overview in zip(self.overview_factors, self.overviews):
+            # Each level is derived from the previous one
+            data = _downsample_block(
+                data, factor // previous_factor, self.overview_resampling
+            )
+            previous_factor = factor
+            overview_window = Window(
+                window.col_off // factor,
+                window.row_off // factor,
+                data.shape[2],
+                data.shape[1],
+            )
+            overview.write(data, window=overview_window)
+
+    def close(self):
+        for dataset in [self.base] + self.overviews:
+            dataset.close()
+        vrt_fp = os.path.join(self.tmp_dp, "cog.vrt")
+        _write_vrt_with_overviews(
+            vrt_fp,
+            self.base_fp,
+            [overview.name for overview in self.overviews],
+        )
+        # https://gdal.org/drivers/raster/cog.html
+        rio_shutil.copy(
+            vrt_fp,
+            self.ofp,
+            driver="COG",
+            blocksize=self.block_size,
+            compress=self.compress,
+            overviews="FORCE_USE_EXISTING",
+            BIGTIFF="IF_SAFER",
+        )
+
+    def _remove_tmp_files(self):
+        for dataset in [self.base] + self.overviews:
+            dataset.close()
+        shutil.rmtree(self.tmp_dp, ignore_errors=True)
+
+
+def iterate_block_windows(width, height, block_size=COG_BLOCK_SIZE):
+    for row_off in range(0, height, block_size):
+        for col_off in range(0, width, block_size):
+            yield Window(
+                col_off,
+                row_off,
+                min(block_size, width - col_off),
+                min(block_size, height - row_off),
+            )
+
+
+@contextmanager
+def get_block_wise_cog_writer(
+    src,
+    ofp,
+    count,
+    dtype,
+    block_size=COG_BLOCK_SIZE,
+    overview_resampling=Resampling.nearest,
+    color_map=None,
+    compress="DEFLATE",
+):
+    """Open a COG (using the geo-information of src), which is written block
+    by block (see BlockWiseCogWriter)."""
+    profile = src.profile
+    profile["count"] = count
+    profile["dtype"] = dtype
+    if profile["crs"] is None:
+        profile["transform"] = None
+    with BlockWiseCogWriter(
+        ofp,
+        profile,
+        block_size=block_size,
+        overview_resampling=overview_resampling,
+        color_map=color_map,
+        compress=compress,
+    ) as writer:
+        yield writer
+
+
+def write_numpy_as_cog(
+    src,
+    ofp,
+    data,
+    image_axis_order=True,
+    block_size=COG_BLOCK_SIZE,
+    overview_resampling=Resampling.nearest,
+    color_map=None,
+    compress="DEFLATE",
+):
+    """Write the data (using the geo-information of src) as COG."""
+    if data.ndim == 2:
+        data = data[np.newaxis, :, :]
+    elif image_axis_order:
+        # (height, width, channel) -> (channel, height, width)
+        data = np.moveaxis(data, 2, 0)
+    count, height, width = data.shape
+    with get_block_wise_cog_writer(
+        src,
+        ofp,
+        count,
+        data.dtype.name,
+        block_size=block_size,
+        overview_resampling=overview_resampling,
+        color_map=color_map,
+        compress=compress,
+    ) as writer:
+        for window in iterate_block_windows(width, height, block_size):
+            row_slice, col_slice = window.toslices()
+            writer.write(data[:, row_slice, col_slice], window)
+
+
+def convert_raster_to_cog(
+    ifp,
+    ofp,
+    block_size=COG_BLOCK_SIZE,
+    overview_resampling=Resampling.nearest,
+    color_map=None,
+    compress="DEFLATE",
+):
+    """Convert the raster to a COG by streaming it block by block."""
+    with rasterio.open(ifp) as src:
+        if color_map is None and src.count == 1:
+            try:
+                color_map = src.colormap(1)
+            except ValueError:
+                # The raster has no color map
+                pass
+        with get_block_wise_cog_writer(
+            src,
+            ofp,
+            src.count,
+            src.dtypes[0],
+            block_size=block_size,
+            overview_resampling=overview_resampling,
+            color_map=color_map,
+            compress=compress,
+        ) as writer:
+            for window in iterate_block_windows(
+                src.width, src.height, block_size
+            ):
+                writer.write(src.read(window=window), window)
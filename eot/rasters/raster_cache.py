@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from rasterio import shutil as rio_shutil
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+
+from eot.crs.crs import EPSG_3857
+from eot.rasters.raster import Raster
+from eot.rasters.raster_reprojection import (
+    reproject_raster_to_tiled_geotiff_with_default_transform,
+)
+from eot.utility.os_ext import compute_file_hash
+
+
+def get_default_cache_dp():
+    """Return $EOT_CACHE_DP or ~/.cache/eot"""
+    cache_dp = os.environ.get("EOT_CACHE_DP")
+    if cache_dp is None:
+        cache_dp = os.path.join("~", ".cache", "eot")
+    return os.path.expanduser(cache_dp)
+
+
+def get_default_normalized_raster_cache_dp():
+    return os.path.join(get_default_cache_dp(), "normalized_rasters")
+
+
+class NormalizedRasterCache:
+    """Content-addressed cache of normalized rasters (see
+    Raster.get_normalized_dataset_generator()).
+
+    The entries are keyed by the hash of the source file content, the
+    target crs and the resampling, i.e. renamed or copied rasters share an
+    entry and modified rasters are normalized again. The entries are stored
+    as Cloud Optimized GeoTIFFs (tiled, compressed and with overviews). If
+    the entries exceed max_size_bytes, the least recently used entries are
+    removed. The rasters are normalized to tiled GeoTIFFs (see
+    reproject_raster_to_tiled_geotiff()), i.e. without loading the full
+    raster.
+
+    Files are written to a temporary subdirectory and moved into place, i.e.
+    files being written are neither entries nor evicted.
+    """
+
+    entry_ext = ".tif"
+    source_hashes_fn = "source_hashes.json"
+    tmp_dn = "tmp"
+
+    def __init__(
+        self,
+        cache_dp,
+        max_size_bytes=None,
+        compress="DEFLATE",
+        num_threads=1,
+    ):
+        self.cache_dp = os.path.expanduser(cache_dp)
+        self.max_size_bytes = max_size_bytes
+        self.compress = compress
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+        os.makedirs(self._get_tmp_dp(), exist_ok=True)
+
+    ###########################################################################
+    #                           Keys
+    ###########################################################################
+    def _get_source_hashes_fp(self):
+        return os.path.join(self.cache_dp, self.source_hashes_fn)
+
+    def _read_source_hashes(self):
+        source_hashes_fp = self._get_source_hashes_fp()
+        if not os.path.isfile(source_hashes_fp):
+            return {}
+        try:
+            with open(source_hashes_fp, "r") as source_hashes_file:
+                return json.load(source_hashes_file)
+        except ValueError:
+            # A corrupted file only causes the sources to be hashed again
+            return {}
+
+    def _write_source_hashes(self, source_hashes):
+        def write_source_hashes(tmp_fp):
+            with open(tmp_fp, "w") as source_hashes_file:
+                json.dump(source_hashes, source_hashes_file)
+
+        # NB: Concurrent processes may lose (but never corrupt) an update
+        self._write_atomically(
+            self._get_source_hashes_fp(), write_source_hashes
+        )
+
+    def compute_source_hash(self, raster_ifp):
+        """Return the content hash of the raster file.
+
+        The hashes are memorized w.r.t. the path, the size and the
+        modification time of the file, i.e. unchanged rasters are not read
+        again.
+        """
+        raster_ifp = os.path.realpath(os.path.expanduser(raster_ifp))
+        stat = os.stat(raster_ifp)
+        file_signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            source_hashes = self._read_source_hashes()
+        entry = source_hashes.get(raster_ifp)
+        if entry is not None and entry["signature"] == file_signature:
+            return entry["hash"]
+
+        source_hash = compute_file_hash(raster_ifp)
+        with self._lock:
+            source_hashes = self._read_source_hashes()
+            source_hashes[raster_ifp] = {
+                "signature": file_signature,
+                "hash": source_hash,
+            }
+            self._write_source_hashes(source_hashes)
+        return source_hash
+
+    def get_entry_fp(
+        self, raster_ifp, dst_crs=EPSG_3857, resampling=Resampling.nearest
+    ):
+        key_str = "|".join(
+            [
+                self.compute_source_hash(raster_ifp),
+                CRS.from_user_input(dst_crs).to_string(),
+                Resampling(resampling).name,
+            ]
+        )
+        key = hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dp, key + self.entry_ext)
+
+    ###########################################################################
+    #                           Entries
+    ###########################################################################
+    def _get_tmp_dp(self):
+        return os.path.join(self.cache_dp, self.tmp_dn)
+
+    def _get_tmp_fp(self, fn):
+        return os.path.join(self._get_tmp_dp(), f"{uuid.uuid4().hex}.{fn}")
+
+    def _write_atomically(self, ofp, write_func):
+        # Concurrent processes never observe partially written files
+        tmp_fp = self._get_tmp_fp(os.path.basename(ofp))
+        try:
+            write_func(tmp_fp)
+            os.replace(tmp_fp, ofp)
+        finally:
+            if os.path.isfile(tmp_fp):
+                os.remove(tmp_fp)
+
+    def _create_entry(self, raster_ifp, entry_fp, dst_crs, resampling):
+        def write_entry(tmp_fp):
+            normalized_fp = self._get_tmp_fp("normalized.tif")
+            try:
+                reproject_raster_to_tiled_geotiff_with_default_transform(
+                    raster_ifp,
+                    normalized_fp,
+                    dst_crs=dst_crs,
+                    resampling=resampling,
+                    num_threads=self.num_threads,
+                )
+                # https://gdal.org/drivers/raster/cog.html
+                rio_shutil.copy(
+                    normalized_fp,
+                    tmp_fp,
+                    driver="COG",
+                    compress=self.compress,
+                    overview_resampling=Resampling(resampling).name,
+                )
+            finally:
+                if os.path.isfile(normalized_fp):
+                    os.remove(normalized_fp)
+
+        self._write_atomically(entry_fp, write_entry)
+
+    def get_normalized_raster_fp(
+        self, raster_ifp, dst_crs=EPSG_3857, resampling=Resampling.nearest
+    ):
+        """Return the path of the normalized raster (which is created, if it
+        is not cached yet)."""
+        entry_fp = self.get_entry_fp(raster_ifp, dst_crs, resampling)
+        if os.path.isfile(entry_fp):
+            # Mark the entry as recently used
+            os.utime(entry_fp)
+        else:
+            self._create_entry(raster_ifp, entry_fp, dst_crs, resampling)
+            self.evict(keep_fps=[entry_fp])
+        return entry_fp
+
+    @contextmanager
+    def get_normalized_raster(
+        self, raster_ifp, dst_crs=EPSG_3857, resampling=Resampling.nearest
+    ):
+        entry_fp = self.get_normalized_raster_fp(
+            raster_ifp, dst_crs, resampling
+        )
+        with Raster.get_from_file(entry_fp) as normalized_raster:
+            yield normalized_raster
+
+    def get_entry_fps(self):
+        return [
+            os.path.join(self.cache_dp, fn)
+            for fn in os.listdir(self.cache_dp)
+            if fn.endswith(self.entry_ext)
+        ]
+
+    def evict(self, keep_fps=None):
+        """Remove the least recently used entries exceeding the size limit."""
+        if self.max_size_bytes is None:
+            return
+        keep_fps = set() if keep_fps is None else set(keep_fps)
+        entries = []
+        for entry_fp in self.get_entry_fps():
+            try:
+                stat = os.stat(entry_fp)
+            except FileNotFoundError:
+                # Removed by a concurrent process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_fp))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_fp in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            if entry_fp in keep_fps:
+                continue
+            try:
+                os.remove(entry_fp)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -25,12 +25,13 @@ def _create_reprojection_kwargs(
     return kwargs
 
 
-def _reproject_bands(src, dst, resampling=Resampling.nearest):
+def _reproject_bands(src, dst, resampling=Resampling.nearest, num_threads=1):
     for i in range(1, src.count + 1):
         reproject(
             source=rasterio.band(src, i),
             destination=rasterio.band(dst, i),
             resampling=resampling,
+            num_threads=num_threads,
         )
 
 
@@ -53,6 +54,54 @@ def reproject_raster(
             _reproject_bands(src, dst, resampling)
 
 
+# Block size of tiled GeoTIFFs (must be a multiple of 16)
+TILED_GEOTIFF_BLOCK_SIZE = 256
+
+
+def reproject_raster_to_tiled_geotiff(
+    ifp_or_src,
+    dst_crs,
+    dst_transform,
+    dst_width,
+    dst_height,
+    ofp,
+    resampling=Resampling.nearest,
+    num_threads=1,
+    compress=None,
+):
+    """Reproject the raster to a tiled GeoTIFF, which GDAL warps in its own
+    chunks.
+
+    In contrast to reproject_raster() with an in-memory destination, the
+    full raster is never held in memory. GDAL warps each band in chunks
+    (bounded by its default warp memory limit) and writes the chunks to the
+    tiled GeoTIFF, i.e. only the touched blocks are cached.
+
+    NB: Warping the destination blocks independently is not equivalent,
+     since GDAL approximates the coordinate transformation per chunk (i.e.
+     nearest sampling changes along the block boundaries). Using the same
+     chunks as reproject_raster() yields identical results.
+    """
+    assert get_driver(ofp) == "GTiff", ofp
+    with get_src_raster(ifp_or_src) as src:
+        kwargs = _create_reprojection_kwargs(
+            src, dst_crs, dst_transform, dst_width, dst_height
+        )
+        kwargs.update(
+            {
+                "driver": "GTiff",
+                "tiled": True,
+                "blockxsize": TILED_GEOTIFF_BLOCK_SIZE,
+                "blockysize": TILED_GEOTIFF_BLOCK_SIZE,
+                "BIGTIFF": "IF_SAFER",
+            }
+        )
+        if compress is not None:
+            kwargs["compress"] = compress
+        with rasterio.open(ofp, "w", **kwargs) as dst:
+            _reproject_bands(src, dst, resampling, num_threads=num_threads)
+
+
 def reproject_raster_2(
     ifp_or_src,
     dst_crs,
@@ -108,6 +157,34 @@ def reproject_raster_with_default_transform(
     return default_transform, default_crs, width, height
 
 
+def reproject_raster_to_tiled_geotiff_with_default_transform(
+    ifp_or_src,
+    ofp,
+    dst_crs=None,
+    resampling=Resampling.nearest,
+    num_threads=1,
+    compress=None,
+):
+    (
+        default_transform,
+        default_crs,
+        width,
+        height,
+    ) = get_default_transform_parameter(ifp_or_src, dst_crs)
+    reproject_raster_to_tiled_geotiff(
+        ifp_or_src,
+        default_crs,
+        default_transform,
+        width,
+        height,
+        ofp,
+        resampling=resampling,
+        num_threads=num_threads,
+        compress=compress,
+    )
+    return default_transform, default_crs, width, height
+
+
 @contextmanager
 def get_reprojected_raster_generator(
     ifp_or_src,
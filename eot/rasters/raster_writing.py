@@ -242,3 +242,42 @@ def get_written_raster_generator(
         with memory_file.open() as dst:
             # yield (not return) is required for with statements
             yield dst
+
+
+@contextmanager
+def get_block_wise_raster_writer(
+    src,
+    ofp,
+    count,
+    dtype,
+    block_size,
+    build_overviews=True,
+    label_compatible_meta_data=False,
+    **kwargs
+):
+    """Open a tiled GeoTIFF (using the geo-information of src), which is
+    written block by block, i.e. with dst.write(data, window=window).
+
+    Thus, the data of the raster must never be held in memory at once.
+    """
+    # https://gdal.org/drivers/raster/gtiff.html#creation-options
+    msg = "The block size of tiled GeoTIFFs must be a multiple of 16"
+    assert block_size % 16 == 0, msg
+    profile = src.profile
+    _initialize_profile(profile, kwargs, ofp, None)
+    assert profile["driver"] == "GTiff", profile["driver"]
+    profile["count"] = count
+    profile["dtype"] = dtype
+    profile["tiled"] = True
+    profile["blockxsize"] = block_size
+    profile["blockysize"] = block_size
+
+    if label_compatible_meta_data:
+        profile = _ensure_label_compatible_meta_data(profile)
+
+    profile = _ensure_consistent_crs_transform_values(profile)
+
+    with rasterio.open(ofp, "w", **profile) as dst:
+        yield dst
+        if build_overviews:
+            _build_overviews(src, dst)
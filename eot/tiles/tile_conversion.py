@@ -1,7 +1,9 @@
 import json
 
 import supermercado
+from eot.geojson_ext.geojson_writing import convert_feature_to_str
 from eot.tiles.mercator_tile import MercatorTile
+from eot.tiles.tile_footprint import iterate_tile_footprint_feature_strs
 
 
 def convert_tiles_to_granules(tiles, pg):
@@ -28,32 +30,28 @@ def convert_tiles_to_granules(tiles, pg):
     return granules
 
 
+def iterate_union_tile_features(tiles):
+    """Yield the features of the union of the (mercator) tiles."""
+    for tile in tiles:
+        assert isinstance(tile, MercatorTile)
+    tiles = ["-".join(map(str, tile.get_z_x_y())) + "\n" for tile in tiles]
+    yield from supermercado.uniontiles.union(tiles, True)
+
+
 def convert_tiles_to_geojson(tiles, union=True):
     """Convert tiles to their footprint GeoJSON."""
 
-    first = True
-    geojson = '{"type":"FeatureCollection","features":['
-
     if union:  # smaller tiles union geometries (but losing properties)
-        for tile in tiles:
-            assert isinstance(tile, MercatorTile)
-        tiles = ["-".join(map(str, tile.get_z_x_y())) + "\n" for tile in tiles]
-        for feature in supermercado.uniontiles.union(tiles, True):
-            geojson += (
-                json.dumps(feature) if first else "," + json.dumps(feature)
-            )
-            first = False
+        feature_strs = (
+            convert_feature_to_str(feature)
+            for feature in iterate_union_tile_features(tiles)
+        )
     else:  # keep each tile geometry and properties (but fat)
-        for tile in tiles:
-            assert isinstance(tile, MercatorTile)
-            prop = '"properties":{{"x":{},"y":{},"z":{}}}'.format(
-                *tile.get_x_y_z()
-            )
-            geom = '"geometry":{}'.format(json.dumps(tile.feature("geometry")))
-            geojson += '{}{{"type":"Feature",{},{}}}'.format(
-                "," if not first else "", geom, prop
-            )
-            first = False
-
-    geojson += "]}"
-    return geojson
+        feature_strs = iterate_tile_footprint_feature_strs(tiles, precision=6)
+
+    # NB: Joining the features avoids quadratic string concatenation
+    return (
+        '{"type":"FeatureCollection","features":['
+        + ",".join(feature_strs)
+        + "]}"
+    )
@@ -0,0 +1,201 @@
+import itertools
+import json
+import os
+import numpy as np
+from affine import Affine
+
+from eot.crs.crs import EPSG_4326, transform_coords
+from eot.geojson_ext.geojson_writing import (
+    GeoJSONFeatureWriter,
+    write_points_as_geojson_polygon,
+)
+from eot.tiles.image_pixel_tile import ImagePixelTile
+from eot.tiles.mercator_tile import MercatorTile
+from eot.tiles.tile_path_manager import TilePathManager
+
+
+def _compute_mercator_tile_bounds(tiles):
+    """Vectorized version of mercantile.bounds() (i.e. EPSG:4326 bounds)"""
+    x, y, z = np.array([tile.get_x_y_z() for tile in tiles], dtype=float).T
+    num_tiles_per_axis = 2.0**z
+    west = x / num_tiles_per_axis * 360.0 - 180.0
+    east = (x + 1) / num_tiles_per_axis * 360.0 - 180.0
+    north = np.degrees(
+        np.arctan(np.sinh(np.pi * (1 - 2 * y / num_tiles_per_axis)))
+    )
+    south = np.degrees(
+        np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / num_tiles_per_axis)))
+    )
+    return west, south, east, north
+
+
+def _get_image_pixel_tile_area_transform(tile):
+    """Return the transform and the pixel size of the tile area.
+
+    If the disk size (and thus the tile transform) of a tile is unknown, the
+    area is derived from the raster transform and the source window, i.e.
+    without opening the tile file.
+    """
+    disk_width, disk_height = tile.get_disk_size()
+    tile_transform = tile.get_tile_transform()
+    if disk_width is None or disk_height is None or tile_transform is None:
+        raster_transform = tile.get_raster_transform()
+        assert raster_transform is not None
+        area_transform = raster_transform * Affine.translation(
+            *tile.get_source_offset()
+        )
+        area_size = tile.get_source_size()
+    else:
+        area_transform = tile_transform
+        area_size = disk_width, disk_height
+    return area_transform, area_size
+
+
+def _compute_image_pixel_tile_bounds(tiles):
+    """Compute the bounds of the tile corners (see BoundedPixelArea)"""
+    area_transforms, area_sizes = zip(
+        *[_get_image_pixel_tile_area_transform(tile) for tile in tiles]
+    )
+    # Affine coefficients (a, b, c, d, e, f) of the tile area transforms
+    coefficients = np.array(
+        [tuple(area_transform)[:6] for area_transform in area_transforms],
+        dtype=float,
+    )
+    a, b, c, d, e, f = coefficients.T
+    area_sizes = np.array(area_sizes, dtype=float)
+    # Pixel corners: left top, right top, left bottom, right bottom
+    zeros = np.zeros(len(tiles))
+    corner_x = np.stack([zeros, area_sizes[:, 0], zeros, area_sizes[:, 0]])
+    corner_y = np.stack([zeros, zeros, area_sizes[:, 1], area_sizes[:, 1]])
+    x = a * corner_x + b * corner_y + c
+    y = d * corner_x + e * corner_y + f
+    return x.min(axis=0), y.min(axis=0), x.max(axis=0), y.max(axis=0)
+
+
+def compute_tile_footprints(tiles, dst_crs=EPSG_4326):
+    """Compute the bound corners of all tiles at once.
+
+    Returns an array with shape (num_tiles, 4, 2) containing the left top,
+    right top, right bottom and left bottom corner of each tile (i.e. the
+    same corners as BoundedPixelArea.compute_bound_corners()). The corners
+    of all tiles sharing a crs are reprojected with a single call.
+    """
+    tiles = list(tiles)
+    footprints = np.empty((len(tiles), 4, 2), dtype=float)
+    crs_str_to_indices = {}
+    for index, tile in enumerate(tiles):
+        crs_str_to_indices.setdefault(str(tile.get_crs()), []).append(index)
+
+    for indices in crs_str_to_indices.values():
+        group_tiles = [tiles[index] for index in indices]
+        reference_tile = group_tiles[0]
+        if isinstance(reference_tile, MercatorTile):
+            assert all(isinstance(tile, MercatorTile) for tile in group_tiles)
+            left, bottom, right, top = _compute_mercator_tile_bounds(
+                group_tiles
+            )
+        elif isinstance(reference_tile, ImagePixelTile):
+            left, bottom, right, top = _compute_image_pixel_tile_bounds(
+                group_tiles
+            )
+        else:
+            assert False
+        corners_x = np.stack([left, right, right, left], axis=1)
+        corners_y = np.stack([top, top, bottom, bottom], axis=1)
+
+        src_crs = reference_tile.get_crs()
+        if dst_crs is not None and src_crs != dst_crs:
+            assert src_crs is not None
+            x_list, y_list = transform_coords(
+                src_crs, dst_crs, corners_x.ravel(), corners_y.ravel()
+            )
+            corners_x = np.asarray(x_list).reshape(corners_x.shape)
+            corners_y = np.asarray(y_list).reshape(corners_y.shape)
+        footprints[indices, :, 0] = corners_x
+        footprints[indices, :, 1] = corners_y
+    return footprints
+
+
+def _get_tile_properties(tile):
+    properties = tile.to_dict()
+    del properties[tile.CLASS_STR]
+    return properties
+
+
+def _convert_footprint_to_feature_str(tile, footprint, precision):
+    if precision is not None:
+        footprint = np.round(footprint, precision)
+    # Close the linear ring of the polygon
+    ring = footprint.tolist()
+    ring.append(ring[0])
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": _get_tile_properties(tile),
+    }
+    return json.dumps(feature, separators=(",", ":"))
+
+
+def iterate_tile_footprint_feature_strs(
+    tiles, dst_crs=EPSG_4326, precision=None, batch_size=65536
+):
+    """Yield the footprints of the tiles as GeoJSON feature strings.
+
+    The footprints are computed batch-wise, i.e. the memory consumption is
+    independent of the number of tiles.
+    """
+    tiles = iter(tiles)
+    while True:
+        tile_batch = list(itertools.islice(tiles, batch_size))
+        if not tile_batch:
+            break
+        footprints = compute_tile_footprints(tile_batch, dst_crs=dst_crs)
+        for tile, footprint in zip(tile_batch, footprints):
+            yield _convert_footprint_to_feature_str(tile, footprint, precision)
+
+
+def write_tile_footprints_as_geojson(
+    ofp,
+    tiles,
+    dst_crs=EPSG_4326,
+    ndjson=False,
+    precision=None,
+    batch_size=65536,
+):
+    """Stream the tile footprints to a single file.
+
+    If ndjson is set, write one feature per line (newline-delimited GeoJSON)
+    instead of a FeatureCollection.
+    """
+    feature_strs = iterate_tile_footprint_feature_strs(
+        tiles, dst_crs=dst_crs, precision=precision, batch_size=batch_size
+    )
+    with GeoJSONFeatureWriter(ofp, ndjson=ndjson) as writer:
+        for feature_str in feature_strs:
+            writer.write_feature_str(feature_str)
+
+
+def write_tile_footprints_as_polygon_files(
+    odp, tiles, ext, tile_path_layout=None, batch_size=65536
+):
+    """Write a polygon file next to each tile (see create_polygon_file).
+
+    Equivalent to calling write_bound_corners_as_geojson() for each tile,
+    but computes the footprints batch-wise.
+    """
+    tiles = iter(tiles)
+    while True:
+        tile_batch = list(itertools.islice(tiles, batch_size))
+        if not tile_batch:
+            break
+        footprints = compute_tile_footprints(tile_batch, dst_crs=EPSG_4326)
+        for tile, footprint in zip(tile_batch, footprints):
+            tile_fp = os.path.join(
+                odp,
+                TilePathManager.get_relative_tile_fp(
+                    tile, ext, tile_path_layout
+                ),
+            )
+            write_points_as_geojson_polygon(
+                tile_fp + ".geojson", [tuple(corner) for corner in footprint]
+            )
@@ -7,7 +7,10 @@ import csv
 from eot.tiles.mercator_tile import MercatorTile
 from eot.tiles.image_pixel_tile import ImagePixelTile
 from eot.tiles.tile_path_manager import TilePathManager
-from eot.tiles.tile_conversion import convert_tiles_to_geojson
+from eot.tiles.tile_path_layout import TilePathLayout
+from eot.geojson_ext.geojson_writing import write_geojson_features
+from eot.tiles.tile_conversion import iterate_union_tile_features
+from eot.tiles.tile_footprint import write_tile_footprints_as_geojson
 
 
 def _str_to_class(class_name):
@@ -86,18 +89,25 @@ class TileManager:
          directories, e.g.
           <path>/<to>/spherical_mercator_tiles/<tile_structure>
           <path>/>to>/image_pixel_tiles/<tile_structure>
+        The tile structure is defined by the layout stored in the dataset
+         descriptor (see TilePathLayout).
         """
         idp = os.path.expanduser(idp)
+        tile_path_layout = TilePathLayout.get_from_dir(idp)
         tile_relative_fp_scheme = (
-            TilePathManager.read_relative_tile_fp_scheme_from_dir(idp)
+            TilePathManager.read_relative_tile_fp_scheme_from_dir(
+                idp, tile_path_layout
+            )
         )
         tile_absolute_fp_scheme = os.path.join(idp, tile_relative_fp_scheme)
-        tile_ifp_list = glob.glob(tile_absolute_fp_scheme)
+        tile_ifp_list = glob.glob(tile_absolute_fp_scheme, recursive=True)
         for tile_ifp in tile_ifp_list:
             if tile_ifp.endswith("aux.xml") or tile_ifp.endswith(".geojson"):
                 continue
             tile = TilePathManager.convert_tile_fp_to_tile(
-                root_idp=idp, tile_ifp=tile_ifp
+                root_idp=idp,
+                tile_ifp=tile_ifp,
+                tile_path_layout=tile_path_layout,
             )
 
             if target_raster_name is not None:
@@ -124,6 +134,20 @@ class TileManager:
                 csv.writer(csv_file).writerow(row_as_tuple)
 
     @staticmethod
-    def write_tiles_as_geojson(ofp, tiles, union):
-        with open(ofp, "w") as geojson_file:
-            geojson_file.write(convert_tiles_to_geojson(tiles, union=union))
+    def write_tiles_as_geojson(
+        ofp, tiles, union, ndjson=False, precision=None
+    ):
+        if union:
+            write_geojson_features(
+                ofp,
+                iterate_union_tile_features(tiles),
+                ndjson=ndjson,
+                precision=precision,
+            )
+        else:
+            if precision is None:
+                precision = 6
+            # Stream the footprints instead of assembling a single string
+            write_tile_footprints_as_geojson(
+                ofp, tiles, ndjson=ndjson, precision=precision
+            )
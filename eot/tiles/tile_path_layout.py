@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import mercantile
+
+from eot.tiles.mercator_tile import MercatorTile
+from eot.tiles.image_pixel_tile import ImagePixelTile
+from eot.tiles.structured_representation import StructuredRepresentation
+from eot.tiles.tile_path_manager import TilePathManager
+
+
+def _get_max_num_digits(max_dir_entries, base):
+    """Largest number of digits n, s.t. base**n <= max_dir_entries"""
+    num_digits = 1
+    while base ** (num_digits + 1) <= max_dir_entries:
+        num_digits += 1
+    return num_digits
+
+
+class TilePathLayout(StructuredRepresentation):
+    """Defines the directory structure of the tiles of a dataset.
+
+    The layout of a dataset is stored in a descriptor file next to the
+    tiling directory (see TilePathManager.get_tiling_layout_json_fp_from_dir)
+    so that readers do not need any configuration.
+    """
+
+    def __init__(self, name=None, max_dir_entries=None, **kwargs):
+        if name is None:
+            name = self.__class__.__name__
+        self.name = name
+        self.max_dir_entries = max_dir_entries
+
+    def __str__(self):
+        return self.name
+
+    def get_relative_tile_fp(self, tile, tile_file_ext=""):
+        raise NotImplementedError
+
+    def get_relative_tile_fp_scheme(self, tile_class):
+        raise NotImplementedError
+
+    def convert_relative_tile_fp_to_tile(self, relative_tile_fp):
+        raise NotImplementedError
+
+    @staticmethod
+    def get_from_dir(root_idp):
+        """Return the layout of the dataset in root_idp.
+
+        Datasets without layout descriptor use the DefaultTilePathLayout.
+        """
+        layout_fp = TilePathManager.get_tiling_layout_json_fp_from_dir(
+            root_idp
+        )
+        if not os.path.isfile(layout_fp):
+            return DefaultTilePathLayout()
+        with open(layout_fp) as layout_file:
+            layout_dict = json.load(layout_file)
+        return TilePathLayout.from_layout_dict(layout_dict)
+
+    @staticmethod
+    def from_layout_dict(layout_dict):
+        layout_class = getattr(sys.modules[__name__], layout_dict["name"])
+        return layout_class.from_dict(layout_dict)
+
+    def write_as_json(self, root_odp):
+        layout_ofp = TilePathManager.get_tiling_layout_json_fp_from_dir(
+            root_odp
+        )
+        with open(layout_ofp, "w") as layout_file:
+            json.dump(self.to_plain_dict(), layout_file, indent=4)
+
+
+class DefaultTilePathLayout(TilePathLayout):
+    """Layout using one directory per (z, x) or (raster, size, x_offset)"""
+
+    def get_relative_tile_fp(self, tile, tile_file_ext=""):
+        return TilePathManager.get_relative_tile_fp(tile, tile_file_ext)
+
+    def get_relative_tile_fp_scheme(self, tile_class):
+        return TilePathManager.get_relative_tile_fp_scheme(tile_class)
+
+    def convert_relative_tile_fp_to_tile(self, relative_tile_fp):
+        return TilePathManager.convert_relative_tile_fp_to_tile(
+            relative_tile_fp
+        )
+
+
+class HashedTilePathLayout(TilePathLayout):
+    """Layout distributing the tiles over hash-prefixed subdirectories.
+
+    Example for mercator tiles:
+     spherical_mercator_tiles/z_<z>/<hash_1>/<hash_2>/x_<x>_y_<y>.png
+    Example for image pixel tiles:
+     image_pixel_tiles/<raster_name>/width_height_<width>_<height>/
+      <hash_1>/<hash_2>/width_offset_<x>_height_offset_<y>.png
+
+    Each hash directory level contains at most 16**hash_dn_length entries.
+    """
+
+    def __init__(
+        self,
+        max_dir_entries=4096,
+        hash_dir_levels=1,
+        hash_dn_length=None,
+        **kwargs,
+    ):
+        super().__init__(max_dir_entries=max_dir_entries, **kwargs)
+        if hash_dn_length is None:
+            hash_dn_length = _get_max_num_digits(max_dir_entries, 16)
+        msg = "The md5 hash provides at most 32 hex digits"
+        assert hash_dir_levels * hash_dn_length <= 32, msg
+        self.hash_dir_levels = hash_dir_levels
+        self.hash_dn_length = hash_dn_length
+
+    @classmethod
+    def from_num_tiles(cls, num_tiles, max_dir_entries=4096):
+        """Use enough hash levels to bound the number of files per directory"""
+        hash_dn_length = _get_max_num_digits(max_dir_entries, 16)
+        num_hash_dirs = 16**hash_dn_length
+        hash_dir_levels = 1
+        while num_tiles / num_hash_dirs**hash_dir_levels > max_dir_entries:
+            hash_dir_levels += 1
+        return cls(
+            max_dir_entries=max_dir_entries,
+            hash_dir_levels=hash_dir_levels,
+            hash_dn_length=hash_dn_length,
+        )
+
+    def _get_hash_dns(self, tile_key):
+        hex_digest = hashlib.md5(tile_key.encode()).hexdigest()
+        length = self.hash_dn_length
+        return [
+            hex_digest[level * length : (level + 1) * length]
+            for level in range(self.hash_dir_levels)
+        ]
+
+    def get_relative_tile_fp(self, tile, tile_file_ext=""):
+        assert tile_file_ext == "" or tile_file_ext[0] == "."
+        if isinstance(tile, MercatorTile):
+            x, y, z = tile.get_x_y_z()
+            x_prefix, y_prefix, z_prefix = (
+                TilePathManager.get_prefixes_of_tile_class(MercatorTile)
+            )
+            tile_dp = os.path.join(
+                TilePathManager.get_parent_dir_of_tile_class(MercatorTile),
+                f"{z_prefix}{z}",
+            )
+            tile_fn = f"{x_prefix}{x}_{y_prefix}{y}"
+        elif isinstance(tile, ImagePixelTile):
+            width_offset, height_offset = tile.get_source_offset()
+            width, height = tile.get_source_size()
+            (
+                width_height_prefix,
+                width_offset_prefix,
+                height_offset_prefix,
+            ) = TilePathManager.get_prefixes_of_tile_class(ImagePixelTile)
+            tile_dp = os.path.join(
+                TilePathManager.get_parent_dir_of_tile_class(ImagePixelTile),
+                f"{tile.get_raster_name()}",
+                f"{width_height_prefix}{width}_{height}",
+            )
+            tile_fn = (
+                f"{width_offset_prefix}{width_offset}_"
+                f"{height_offset_prefix}{height_offset}"
+            )
+        else:
+            assert False
+        return os.path.join(
+            tile_dp, *self._get_hash_dns(tile_fn), tile_fn + tile_file_ext
+        )
+
+    def get_relative_tile_fp_scheme(self, tile_class):
+        hash_dns_scheme = "/".join(["*"] * self.hash_dir_levels)
+        natural_num_scheme = "[0-9]*"
+        integer_num_scheme = "[-0-9]*"
+        parent_dir = TilePathManager.get_parent_dir_of_tile_class(tile_class)
+        if tile_class == MercatorTile:
+            x_prefix, y_prefix, z_prefix = (
+                TilePathManager.get_prefixes_of_tile_class(MercatorTile)
+            )
+            tile_fp_scheme = (
+                f"{parent_dir}/{z_prefix}{natural_num_scheme}/"
+                f"{hash_dns_scheme}/{x_prefix}{natural_num_scheme}_"
+                f"{y_prefix}{natural_num_scheme}.*"
+            )
+        elif tile_class == ImagePixelTile:
+            (
+                width_height_prefix,
+                width_offset_prefix,
+                height_offset_prefix,
+            ) = TilePathManager.get_prefixes_of_tile_class(ImagePixelTile)
+            tile_fp_scheme = (
+                f"{parent_dir}/*/{width_height_prefix}{natural_num_scheme}_"
+                f"{natural_num_scheme}/{hash_dns_scheme}/"
+                f"{width_offset_prefix}{integer_num_scheme}_"
+                f"{height_offset_prefix}{integer_num_scheme}.*"
+            )
+        else:
+            assert False
+        return tile_fp_scheme
+
+    def convert_relative_tile_fp_to_tile(self, relative_tile_fp):
+        hash_dns_regex = "/".join(
+            [f"[0-9a-f]{{{self.hash_dn_length}}}"] * self.hash_dir_levels
+        )
+        mercator_dn = TilePathManager.get_parent_dir_of_tile_class(
+            MercatorTile
+        )
+        if relative_tile_fp.startswith(mercator_dn + "/"):
+            x_prefix, y_prefix, z_prefix = (
+                TilePathManager.get_prefixes_of_tile_class(MercatorTile)
+            )
+            regex_str = (
+                f"{mercator_dn}/{z_prefix}(?P<z>[0-9]+)/{hash_dns_regex}/"
+                f"{x_prefix}(?P<x>[0-9]+)_{y_prefix}(?P<y>[0-9]+)\\..+"
+            )
+            tile_as_dict = re.fullmatch(regex_str, relative_tile_fp)
+            if tile_as_dict is None:
+                return None
+            return MercatorTile(
+                int(tile_as_dict[MercatorTile.X_STR]),
+                int(tile_as_dict[MercatorTile.Y_STR]),
+                int(tile_as_dict[MercatorTile.Z_STR]),
+            )
+        else:
+            (
+                width_height_prefix,
+                width_offset_prefix,
+                height_offset_prefix,
+            ) = TilePathManager.get_prefixes_of_tile_class(ImagePixelTile)
+            pixel_dn = TilePathManager.get_parent_dir_of_tile_class(
+                ImagePixelTile
+            )
+            regex_str = (
+                f"{pixel_dn}/(?P<raster_name>.+)/"
+                f"{width_height_prefix}(?P<width>[0-9]+)_(?P<height>[0-9]+)/"
+                f"{hash_dns_regex}/"
+                f"{width_offset_prefix}(?P<width_offset>[-]?[0-9]+)_"
+                f"{height_offset_prefix}(?P<height_offset>[-]?[0-9]+)\\..+"
+            )
+            tile_as_dict = re.fullmatch(regex_str, relative_tile_fp)
+            if tile_as_dict is None:
+                return None
+            return ImagePixelTile(
+                tile_as_dict["raster_name"],
+                int(tile_as_dict["width_offset"]),
+                int(tile_as_dict["height_offset"]),
+                int(tile_as_dict["width"]),
+                int(tile_as_dict["height"]),
+            )
+
+
+class QuadkeyTilePathLayout(TilePathLayout):
+    """Layout nesting mercator tiles according to their quadkey.
+
+    Each directory level corresponds to a chunk of quadkey digits, e.g.
+     spherical_mercator_tiles/z_<z>/<digits_1>/<digits_2>/q_<quadkey>.png
+    Since each quadkey digit has 4 children, a directory level with k digits
+    contains at most 4**k entries. Spatially close tiles share directories.
+    """
+
+    QUADKEY_PREFIX = "q_"
+
+    def __init__(self, max_dir_entries=4096, quadkey_dn_length=None, **kwargs):
+        super().__init__(max_dir_entries=max_dir_entries, **kwargs)
+        if quadkey_dn_length is None:
+            quadkey_dn_length = _get_max_num_digits(max_dir_entries, 4)
+        self.quadkey_dn_length = quadkey_dn_length
+
+    def _get_quadkey_dns(self, quadkey):
+        length = self.quadkey_dn_length
+        # The (last) remaining 1 to quadkey_dn_length digits are only part of
+        #  the file name
+        num_dir_levels = max(0, (len(quadkey) - 1) // length)
+        return [
+            quadkey[level * length : (level + 1) * length]
+            for level in range(num_dir_levels)
+        ]
+
+    def get_relative_tile_fp(self, tile, tile_file_ext=""):
+        assert tile_file_ext == "" or tile_file_ext[0] == "."
+        msg = f"{self.name} is only defined for mercator tiles"
+        assert isinstance(tile, MercatorTile), msg
+        x, y, z = tile.get_x_y_z()
+        _, _, z_prefix = TilePathManager.get_prefixes_of_tile_class(
+            MercatorTile
+        )
+        quadkey = mercantile.quadkey(x, y, z)
+        return os.path.join(
+            TilePathManager.get_parent_dir_of_tile_class(MercatorTile),
+            f"{z_prefix}{z}",
+            *self._get_quadkey_dns(quadkey),
+            f"{self.QUADKEY_PREFIX}{quadkey}{tile_file_ext}",
+        )
+
+    def get_relative_tile_fp_scheme(self, tile_class):
+        msg = f"{self.name} is only defined for mercator tiles"
+        assert tile_class == MercatorTile, msg
+        parent_dir = TilePathManager.get_parent_dir_of_tile_class(tile_class)
+        _, _, z_prefix = TilePathManager.get_prefixes_of_tile_class(
+            MercatorTile
+        )
+        # NB: "**" requires a recursive glob
+        return f"{parent_dir}/{z_prefix}[0-9]*/**/{self.QUADKEY_PREFIX}*.*"
+
+    def convert_relative_tile_fp_to_tile(self, relative_tile_fp):
+        parent_dir = TilePathManager.get_parent_dir_of_tile_class(MercatorTile)
+        _, _, z_prefix = TilePathManager.get_prefixes_of_tile_class(
+            MercatorTile
+        )
+        regex_str = (
+            f"{parent_dir}/{z_prefix}(?P<z>[0-9]+)/(?:[0-3]+/)*"
+            f"{self.QUADKEY_PREFIX}(?P<quadkey>[0-3]*)\\..+"
+        )
+        tile_as_dict = re.fullmatch(regex_str, relative_tile_fp)
+        if tile_as_dict is None:
+            return None
+        quadkey = tile_as_dict["quadkey"]
+        if quadkey == "":
+            return MercatorTile(0, 0, 0)
+        mercantile_tile = mercantile.quadkey_to_tile(quadkey)
+        assert mercantile_tile.z == int(tile_as_dict["z"])
+        return MercatorTile(
+            mercantile_tile.x, mercantile_tile.y, mercantile_tile.z
+        )
+
+
+TILE_PATH_LAYOUT_NAMES = ["default", "hashed", "quadkey"]
+
+
+def create_tile_path_layout(layout_name, num_tiles=None, max_dir_entries=4096):
+    """Create a layout by name, i.e. one of TILE_PATH_LAYOUT_NAMES"""
+    if layout_name == "default":
+        layout = DefaultTilePathLayout()
+    elif layout_name == "hashed":
+        if num_tiles is None:
+            layout = HashedTilePathLayout(max_dir_entries=max_dir_entries)
+        else:
+            layout = HashedTilePathLayout.from_num_tiles(
+                num_tiles, max_dir_entries=max_dir_entries
+            )
+    elif layout_name == "quadkey":
+        layout = QuadkeyTilePathLayout(max_dir_entries=max_dir_entries)
+    else:
+        assert False, f"Unknown tile path layout {layout_name}"
+    return layout
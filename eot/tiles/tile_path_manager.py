@@ -39,8 +39,15 @@ class TilePathManager:
             assert False
 
     @classmethod
-    def get_relative_tile_fp(cls, tile, tile_file_ext=""):
-        """Return the relative path to the corresponding tile file."""
+    def get_relative_tile_fp(
+        cls, tile, tile_file_ext="", tile_path_layout=None
+    ):
+        """Return the relative path to the corresponding tile file.
+
+        If no tile_path_layout is provided, the default layout is used.
+        """
+        if tile_path_layout is not None:
+            return tile_path_layout.get_relative_tile_fp(tile, tile_file_ext)
         assert tile_file_ext == "" or tile_file_ext[0] == "."
         if isinstance(tile, MercatorTile):
             # Returns "<web_map>/<z>/<x>/<y>.jpg" if the tile is located in
@@ -148,28 +155,28 @@ class TilePathManager:
         )
         return tiling_result_fp
 
+    @classmethod
+    def get_tiling_layout_json_fp_from_dir(cls, root_idp):
+        """Return the path of the descriptor storing the tile path layout"""
+        tiling_layout_fp = (
+            cls.get_tiling_dn_from_dir(root_idp) + "_layout.json"
+        )
+        return tiling_layout_fp
+
     @classmethod
     def get_tiling_panoptic_json_fp_from_dir(cls, root_idp):
         return os.path.join(root_idp, "panoptic.json")
 
     @classmethod
-    def read_relative_tile_fp_scheme_from_dir(cls, root_idp):
-        dataset_tile_types = cls._get_dataset_tile_types(root_idp)
-
+    def get_relative_tile_fp_scheme(cls, tile_class):
         natural_num_scheme = "[0-9]*"
-        if (
-            cls.get_parent_dir_of_tile_class(MercatorTile)
-            in dataset_tile_types
-        ):
+        if tile_class == MercatorTile:
             parent_dir = cls.get_parent_dir_of_tile_class(MercatorTile)
             x_prefix, y_prefix, z_prefix = cls.get_prefixes_of_tile_class(
                 MercatorTile
             )
             tile_fp_scheme = f"{parent_dir}/{z_prefix}{natural_num_scheme}/{x_prefix}{natural_num_scheme}/{y_prefix}{natural_num_scheme}.*"
-        elif (
-            cls.get_parent_dir_of_tile_class(ImagePixelTile)
-            in dataset_tile_types
-        ):
+        elif tile_class == ImagePixelTile:
             parent_dir = cls.get_parent_dir_of_tile_class(ImagePixelTile)
             (
                 width_height_prefix,
@@ -179,16 +186,44 @@ class TilePathManager:
             # Note: The first "-" is NOT treated as a special character.
             integer_num_scheme = "[-0-9]*"
             tile_fp_scheme = f"{parent_dir}/*/{width_height_prefix}{natural_num_scheme}_{natural_num_scheme}/{width_offset_prefix}{integer_num_scheme}/{height_offset_prefix}{integer_num_scheme}"
+        else:
+            assert False
+        return tile_fp_scheme
+
+    @classmethod
+    def read_relative_tile_fp_scheme_from_dir(
+        cls, root_idp, tile_path_layout=None
+    ):
+        dataset_tile_types = cls._get_dataset_tile_types(root_idp)
+
+        if (
+            cls.get_parent_dir_of_tile_class(MercatorTile)
+            in dataset_tile_types
+        ):
+            tile_class = MercatorTile
+        elif (
+            cls.get_parent_dir_of_tile_class(ImagePixelTile)
+            in dataset_tile_types
+        ):
+            tile_class = ImagePixelTile
         else:
             msg = "Found no valid tile directory."
             msg += f' Expected "{cls.SPHERICAL_MERCATOR_TILES}" or "{cls.IMAGE_PIXEL_TILES}", but found {dataset_tile_types} in {root_idp}!'
             assert False, msg
 
+        if tile_path_layout is None:
+            tile_fp_scheme = cls.get_relative_tile_fp_scheme(tile_class)
+        else:
+            tile_fp_scheme = tile_path_layout.get_relative_tile_fp_scheme(
+                tile_class
+            )
         return tile_fp_scheme
 
     @classmethod
-    def read_absolute_tile_fp_from_dir(cls, idp, tile):
-        relative_fp = cls.get_relative_tile_fp(tile, tile_file_ext=".*")
+    def read_absolute_tile_fp_from_dir(cls, idp, tile, tile_path_layout=None):
+        relative_fp = cls.get_relative_tile_fp(
+            tile, tile_file_ext=".*", tile_path_layout=tile_path_layout
+        )
         tile_fp_list = glob.glob(
             os.path.join(os.path.expanduser(idp), relative_fp)
         )
@@ -205,7 +240,7 @@ class TilePathManager:
         return absolute_fp
 
     @classmethod
-    def convert_tile_fp_to_tile(cls, root_idp, tile_ifp):
+    def convert_relative_tile_fp_to_tile(cls, relative_tile_fp):
         """
         There are two supported directory structures:
          Option 1: A "spherical_mercator_tile" directory, i.e.
@@ -213,30 +248,24 @@ class TilePathManager:
         Option 2: A "image_pixel_tiles" directory, i.e.
           image_pixel_tiles/<raster_name>/width_height_<width>_<height>/width_offset_<width_offset>/height_offset_<height_offset>.png
         """
-        dataset_tile_types = cls._get_dataset_tile_types(root_idp)
-        if (
-            cls.get_parent_dir_of_tile_class(MercatorTile)
-            in dataset_tile_types
+        if relative_tile_fp.startswith(
+            cls.get_parent_dir_of_tile_class(MercatorTile) + "/"
         ):
             parent_dir = cls.get_parent_dir_of_tile_class(MercatorTile)
             prefix = parent_dir
             x_prefix, y_prefix, z_prefix = cls.get_prefixes_of_tile_class(
                 MercatorTile
             )
-            regex_str = os.path.join(
-                root_idp,
-                f"{prefix}/{z_prefix}(?P<z>[0-9]+)/{x_prefix}(?P<x>[0-9]+)/{y_prefix}(?P<y>[0-9]+).+",
-            )
-            tile_as_dict = re.match(regex_str, tile_ifp)
+            regex_str = f"{prefix}/{z_prefix}(?P<z>[0-9]+)/{x_prefix}(?P<x>[0-9]+)/{y_prefix}(?P<y>[0-9]+).+"
+            tile_as_dict = re.match(regex_str, relative_tile_fp)
             if tile_as_dict is None:
                 return None
             x = int(tile_as_dict[MercatorTile.X_STR])
             y = int(tile_as_dict[MercatorTile.Y_STR])
             z = int(tile_as_dict[MercatorTile.Z_STR])
             tile = MercatorTile(x, y, z)
-        elif (
-            cls.get_parent_dir_of_tile_class(ImagePixelTile)
-            in dataset_tile_types
+        elif relative_tile_fp.startswith(
+            cls.get_parent_dir_of_tile_class(ImagePixelTile) + "/"
         ):
             parent_dir = cls.get_parent_dir_of_tile_class(ImagePixelTile)
             prefix = parent_dir
@@ -256,11 +285,8 @@ class TilePathManager:
                 f"{height_offset_prefix}(?P<height_offset>[-]?[0-9]+)"
             )
 
-            regex_str = os.path.join(
-                root_idp,
-                f"{prefix}/{raster_string}/{width_height_string}/{width_offset_string}/{height_offset_string}.+",
-            )
-            tile_as_dict = re.match(regex_str, tile_ifp)
+            regex_str = f"{prefix}/{raster_string}/{width_height_string}/{width_offset_string}/{height_offset_string}.+"
+            tile_as_dict = re.match(regex_str, relative_tile_fp)
             if tile_as_dict is None:
                 return None
             width_height_str = tile_as_dict["width_height"]
@@ -275,5 +301,20 @@ class TilePathManager:
             )
         else:
             assert False
+        return tile
+
+    @classmethod
+    def convert_tile_fp_to_tile(
+        cls, root_idp, tile_ifp, tile_path_layout=None
+    ):
+        relative_tile_fp = os.path.relpath(tile_ifp, root_idp)
+        if tile_path_layout is None:
+            tile = cls.convert_relative_tile_fp_to_tile(relative_tile_fp)
+        else:
+            tile = tile_path_layout.convert_relative_tile_fp_to_tile(
+                relative_tile_fp
+            )
+        if tile is None:
+            return None
         tile.set_tile_fp(tile_ifp, is_absolute=True, root_dp=root_idp)
         return tile
@@ -53,11 +53,14 @@ def read_image_tile_from_file(ifp, bands=None, force_rgb=False):
     return image
 
 
-def read_label_tile_from_file_as_indices(path, silent=True):
+def read_label_tile_from_file_as_indices(
+    path, silent=True, compiled_categories=None
+):
     """Return a numpy array, from a label file path, or None.
 
     Note that the label images are stored in "P" mode, i.e. containing a color
-    palette.
+    palette. If compiled categories are provided, label images without
+    palette (i.e. color images) are converted to palette indices.
 
     pil_image = Image.open(ifp)
     print(pil_image.mode)
@@ -65,13 +68,23 @@ def read_label_tile_from_file_as_indices(path, silent=True):
     """
 
     try:
-        return np.array(Image.open(path)).astype(int)
+        pil_image = Image.open(path)
+        if compiled_categories is not None and pil_image.mode != "P":
+            return compiled_categories.convert_colors_to_indices(
+                np.array(pil_image.convert("RGB"))
+            ).astype(int)
+        return np.array(pil_image).astype(int)
     except:
         assert silent, "Unable to open existing label: {}".format(path)
 
 
 def read_label_tile_from_file(label_ifp):
-    img = Image.open(label_ifp).convert("P")
+    return convert_image_to_label_tile(Image.open(label_ifp), label_ifp)
+
+
+def convert_image_to_label_tile(pil_image, label_ifp=None):
+    """Return the palette indices and the palette of a (decoded) PIL image."""
+    img = pil_image.convert("P")
     tile_label_mat = np.array(img, dtype=np.uint8)
     # Note: img.getcolors() returns a list with the values PRESENT in the
     #   image. That means, the returned colors (i.e. the palette indices) are
@@ -0,0 +1,200 @@
+import os
+import threading
+import concurrent.futures as futures
+
+from eot.tiles.tile import Tile
+from eot.tiles.tile_path_manager import TilePathManager
+from eot.tiles.tile_writing import (
+    write_image_tile_to_file,
+    write_label_tile_to_file,
+)
+
+
+class TileWriterService:
+    """Write tiles asynchronously using a small pool of I/O threads.
+
+    The tiling workers only hand off the tile buffers, the tile directories
+    are created by the I/O threads when the first tile of a directory is
+    written (i.e. no directories of skipped tiles are created). The number
+    of bytes of buffers waiting to be written is bounded by
+    max_in_flight_bytes, i.e. submitting a tile only blocks if the writer
+    threads can not keep up.
+
+    Note: The buffers must not be modified after submitting them. Tiles
+    written with append=True must not be submitted multiple times.
+    """
+
+    def __init__(
+        self,
+        num_io_workers=4,
+        max_in_flight_bytes=256 * 1024**2,
+        use_fadvise=False,
+        tile_path_layout=None,
+    ):
+        assert num_io_workers >= 1
+        assert max_in_flight_bytes > 0
+        self.num_io_workers = num_io_workers
+        self.max_in_flight_bytes = max_in_flight_bytes
+        # https://man7.org/linux/man-pages/man2/posix_fadvise.2.html
+        self.use_fadvise = use_fadvise and hasattr(os, "posix_fadvise")
+        self.tile_path_layout = tile_path_layout
+
+        self._executor = futures.ThreadPoolExecutor(num_io_workers)
+        self._condition = threading.Condition()
+        self._in_flight_bytes = 0
+        self._num_pending = 0
+        self._exceptions = []
+        self._created_dps = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    ###########################################################################
+    #                           Directories
+    ###########################################################################
+    def _get_tile_dp(self, odp, tile, ext):
+        odp = os.path.expanduser(odp)
+        if isinstance(tile, Tile):
+            relative_fp = TilePathManager.get_relative_tile_fp(
+                tile, ext, self.tile_path_layout
+            )
+            tile_dp = os.path.dirname(os.path.join(odp, relative_fp))
+        else:
+            tile_dp = odp
+        return tile_dp
+
+    def _ensure_tile_dp(self, tile_dp):
+        # NB: Each directory is created only once (by the first I/O thread
+        #  writing a tile of it)
+        if tile_dp not in self._created_dps:
+            os.makedirs(tile_dp, exist_ok=True)
+            with self._condition:
+                self._created_dps.add(tile_dp)
+
+    ###########################################################################
+    #                           Writing
+    ###########################################################################
+    def submit_image_tile(
+        self,
+        odp,
+        geo_tile,
+        image_data,
+        ext,
+        create_aux_file=False,
+        create_polygon_file=False,
+    ):
+        self._submit(
+            image_data.nbytes,
+            self._get_tile_dp(odp, geo_tile, ext),
+            self._get_tile_fp(odp, geo_tile, ext),
+            write_image_tile_to_file,
+            odp,
+            geo_tile,
+            image_data,
+            ext,
+            create_aux_file=create_aux_file,
+            create_polygon_file=create_polygon_file,
+            tile_path_layout=self.tile_path_layout,
+            create_tile_dir=False,
+        )
+
+    def submit_label_tile(
+        self,
+        odp,
+        geo_tile,
+        label_data,
+        palette_colors,
+        append=False,
+        create_aux_file=False,
+        copy_aux_file=False,
+        create_polygon_file=False,
+    ):
+        self._submit(
+            label_data.nbytes,
+            self._get_tile_dp(odp, geo_tile, ".png"),
+            self._get_tile_fp(odp, geo_tile, ".png"),
+            write_label_tile_to_file,
+            odp,
+            geo_tile,
+            label_data,
+            palette_colors,
+            append=append,
+            create_aux_file=create_aux_file,
+            copy_aux_file=copy_aux_file,
+            create_polygon_file=create_polygon_file,
+            tile_path_layout=self.tile_path_layout,
+            create_tile_dir=False,
+        )
+
+    def _get_tile_fp(self, odp, tile, ext):
+        if not self.use_fadvise or not isinstance(tile, Tile):
+            return None
+        relative_fp = TilePathManager.get_relative_tile_fp(
+            tile, ext, self.tile_path_layout
+        )
+        return os.path.join(os.path.expanduser(odp), relative_fp)
+
+    def _submit(
+        self, num_bytes, tile_dp, tile_fp, write_func, *args, **kwargs
+    ):
+        with self._condition:
+            # A single buffer exceeding the budget is accepted, if there are
+            #  no other buffers in flight
+            self._condition.wait_for(
+                lambda: self._in_flight_bytes == 0
+                or self._in_flight_bytes + num_bytes
+                <= self.max_in_flight_bytes
+            )
+            self._raise_pending_exception()
+            self._in_flight_bytes += num_bytes
+            self._num_pending += 1
+
+        def write():
+            self._ensure_tile_dp(tile_dp)
+            write_func(*args, **kwargs)
+            if tile_fp is not None:
+                self._advise_dont_need(tile_fp)
+
+        future = self._executor.submit(write)
+        future.add_done_callback(
+            lambda finished_future: self._on_done(finished_future, num_bytes)
+        )
+
+    @staticmethod
+    def _advise_dont_need(tile_fp):
+        # The tiles are not read again by the tiling, i.e. keeping them in
+        #  the page cache only displaces the (re-used) raster data.
+        fd = os.open(tile_fp, os.O_RDONLY)
+        try:
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+    def _on_done(self, future, num_bytes):
+        with self._condition:
+            self._in_flight_bytes -= num_bytes
+            self._num_pending -= 1
+            exception = future.exception()
+            if exception is not None:
+                self._exceptions.append(exception)
+            self._condition.notify_all()
+
+    def _raise_pending_exception(self):
+        if self._exceptions:
+            raise self._exceptions.pop(0)
+
+    def flush(self):
+        """Block until all submitted tiles are written."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._num_pending == 0)
+            self._raise_pending_exception()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
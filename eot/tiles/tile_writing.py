@@ -4,8 +4,10 @@ import rasterio
 import cv2
 import numpy as np
 from PIL import Image
-from collections import defaultdict
 
+from eot.categories.compiled_dataset_categories import (
+    CompiledDatasetCategories,
+)
 from eot.rasters.raster import Raster
 from eot.rasters.raster_writing import write_aux_xml
 from eot.tiles.image_pixel_tile import ImagePixelTile
@@ -22,8 +24,14 @@ def write_image_tile_to_file(
     ext,
     create_aux_file=False,
     create_polygon_file=False,
+    tile_path_layout=None,
+    create_tile_dir=True,
 ):
-    """Write an image tile on disk."""
+    """Write an image tile on disk.
+
+    Set create_tile_dir to False, if the tile directory already exists (e.g.
+    if the directories have been created by TileWriterService).
+    """
 
     assert ext in [".png", ".jpg", ".tif"]
     height, width, channel = image_data.shape
@@ -36,12 +44,16 @@ def write_image_tile_to_file(
 
     if isinstance(geo_tile, Tile):
         tile_fp = os.path.join(
-            odp, TilePathManager.get_relative_tile_fp(geo_tile, ext)
+            odp,
+            TilePathManager.get_relative_tile_fp(
+                geo_tile, ext, tile_path_layout
+            ),
         )
     else:
         tile_fp = os.path.join(odp, f"{geo_tile}{ext}")
 
-    os.makedirs(os.path.dirname(tile_fp), exist_ok=True)
+    if create_tile_dir:
+        os.makedirs(os.path.dirname(tile_fp), exist_ok=True)
 
     if create_aux_file:
         write_aux_xml(
@@ -95,11 +107,15 @@ def write_label_tile_to_file(
     copy_aux_file=False,
     create_polygon_file=False,
     default_palette_color=(0, 0, 0),
+    tile_path_layout=None,
+    create_tile_dir=True,
 ):
     """Write a label (or a mask) tile on disk using a color palette.
 
     That means, not only the color information, but also the corresponding
-    palette indices are stored.
+    palette indices are stored. The palette_colors are either compiled
+    categories (see DatasetCategories.compile()) or a dictionary mimicking
+    Pillows image.palette.colors.
     """
 
     if len(label_data.shape) == 3:  # H,W,C -> H,W
@@ -111,7 +127,10 @@ def write_label_tile_to_file(
     odp = os.path.expanduser(odp)
     if isinstance(geo_tile, Tile):
         ofp = os.path.join(
-            odp, TilePathManager.get_relative_tile_fp(geo_tile, ".png")
+            odp,
+            TilePathManager.get_relative_tile_fp(
+                geo_tile, ".png", tile_path_layout
+            ),
         )
         tile_dp = os.path.dirname(ofp)
     else:
@@ -120,7 +139,7 @@ def write_label_tile_to_file(
     if append and os.path.isfile(ofp):
         previous = read_label_tile_from_file_as_indices(ofp, silent=False)
         label_data = np.uint8(np.maximum(previous, label_data))
-    else:
+    elif create_tile_dir:
         os.makedirs(tile_dp, exist_ok=True)
 
     label_data = label_data.astype(np.uint8)
@@ -142,18 +161,13 @@ def write_label_tile_to_file(
             copyfile(aux_xml_ifp, ofp + ".aux.xml")
     label_image = Image.fromarray(label_data, mode="P")
 
-    max_index = max(palette_colors.values())
-    palette_color_indices = list(range(max_index + 1))
-    palette_index_to_color_dict = defaultdict(lambda: default_palette_color)
-    for color, index in palette_colors.items():
-        palette_index_to_color_dict[index] = color
-    palette_colors_list = [
-        palette_index_to_color_dict[index] for index in palette_color_indices
-    ]
-    # Flatten ((R1, G1, B1), (R2, G2, B2), ...) to
-    #  (R1, G1, B1, R2, G2, ...)
-    palette_colors_tuple = list(sum(palette_colors_list, ()))
-    label_image.putpalette(palette_colors_tuple)
+    if not isinstance(palette_colors, CompiledDatasetCategories):
+        # NB: Compile the categories once (i.e. DatasetCategories.compile())
+        #  and pass the result to avoid recomputing the palette for each tile
+        palette_colors = CompiledDatasetCategories.from_palette_colors(
+            palette_colors, default_palette_color
+        )
+    label_image.putpalette(palette_colors.used_palette)
     label_image.save(ofp, optimize=True)
 
 
@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+import numpy as np
+
+from eot.rasters.raster import Raster
+from eot.tiles.image_pixel_tile import ImagePixelTile
+from eot.tiles.mercator_tile import MercatorTile
+from eot.tiles.tile_footprint import compute_tile_footprints
+
+# Rough (average) compression ratios of the tile encoders w.r.t. the raw
+#  (uint8) tile data. The actual ratios depend heavily on the image content.
+IMAGE_COMPRESSION_RATIOS = {"raw": 1.0, ".jpg": 10.0, ".png": 1.6}
+LABEL_COMPRESSION_RATIOS = {"raw": 1.0, ".png": 25.0}
+
+
+def _compute_clipped_window_areas(col_min, row_min, col_max, row_max, raster):
+    # NB: Only pixels inside the raster are actually read
+    width = np.clip(col_max, 0, raster.width) - np.clip(
+        col_min, 0, raster.width
+    )
+    height = np.clip(row_max, 0, raster.height) - np.clip(
+        row_min, 0, raster.height
+    )
+    return np.maximum(width, 0) * np.maximum(height, 0)
+
+
+def _compute_source_window_areas(raster, tiles):
+    """Compute the number of source pixels read for each tile (w/o reading
+    any pixel data)."""
+    if len(tiles) == 0:
+        return np.zeros(0)
+    if isinstance(tiles[0], ImagePixelTile):
+        offsets = np.array([tile.get_source_offset() for tile in tiles])
+        sizes = np.array([tile.get_source_size() for tile in tiles])
+        col_min, row_min = offsets.T
+        col_max, row_max = (offsets + sizes).T
+    elif isinstance(tiles[0], MercatorTile):
+        raster_transform, raster_crs = raster.get_geo_transform_with_crs()
+        footprints = compute_tile_footprints(tiles, dst_crs=raster_crs)
+        a, b, c, d, e, f = tuple(~raster_transform)[:6]
+        x = footprints[:, :, 0]
+        y = footprints[:, :, 1]
+        cols = a * x + b * y + c
+        rows = d * x + e * y + f
+        col_min = np.floor(cols.min(axis=1))
+        row_min = np.floor(rows.min(axis=1))
+        col_max = np.ceil(cols.max(axis=1))
+        row_max = np.ceil(rows.max(axis=1))
+    else:
+        assert False
+    return _compute_clipped_window_areas(
+        col_min, row_min, col_max, row_max, raster
+    )
+
+
+def _compute_output_bytes(num_tiles, raw_tile_bytes, compression_ratios):
+    return {
+        encoder: int(num_tiles * raw_tile_bytes / ratio)
+        for encoder, ratio in compression_ratios.items()
+    }
+
+
+def compute_raster_tiling_plan(
+    raster_fp, tiles, tile_to_raster_fps, bands, raw_tile_bytes, ratios
+):
+    num_split_tiles = sum(
+        1 for tile in tiles if len(tile_to_raster_fps[tile]) > 1
+    )
+    with Raster.get_from_file(raster_fp) as raster:
+        item_size = np.dtype(raster.get_data_type()).itemsize
+        source_pixel_bytes = len(bands) * item_size
+        raster_bytes = raster.width * raster.height * source_pixel_bytes
+        source_bytes_read = int(
+            _compute_source_window_areas(raster, tiles).sum()
+            * source_pixel_bytes
+        )
+    if raster_bytes > 0:
+        overlap_amplification = source_bytes_read / raster_bytes
+    else:
+        overlap_amplification = 0.0
+    raster_plan = {
+        "raster_fp": raster_fp,
+        "num_tiles": len(tiles),
+        "num_split_tiles": num_split_tiles,
+        "raster_bytes": raster_bytes,
+        "source_bytes_read": source_bytes_read,
+        "overlap_amplification": overlap_amplification,
+        # Tiles shared with other rasters are written to the split directory
+        "output_bytes": _compute_output_bytes(
+            len(tiles), raw_tile_bytes, ratios
+        ),
+    }
+    return raster_plan
+
+
+def compute_tiling_plan(
+    raster_fp_to_tiles,
+    tile_to_raster_fps,
+    bands,
+    disk_tile_size,
+    write_labels,
+    tile_path_layout,
+):
+    """Estimate the costs of a tiling without reading any pixel data.
+
+    Note: The tile numbers are upper bounds, since the tiling skips (image)
+     tiles containing too many no data values.
+    """
+    if write_labels:
+        tile_ext = ".png"
+        num_channels = 1
+        ratios = LABEL_COMPRESSION_RATIOS
+    else:
+        tile_ext = ".jpg"
+        num_channels = len(bands)
+        ratios = IMAGE_COMPRESSION_RATIOS
+    disk_width, disk_height = disk_tile_size
+    # The written tiles are always 8 bit
+    raw_tile_bytes = disk_width * disk_height * num_channels
+
+    raster_plans = [
+        compute_raster_tiling_plan(
+            raster_fp,
+            tiles,
+            tile_to_raster_fps,
+            bands,
+            raw_tile_bytes,
+            ratios,
+        )
+        for raster_fp, tiles in raster_fp_to_tiles.items()
+    ]
+
+    shared_tiles = [
+        tile
+        for tile, raster_fps in tile_to_raster_fps.items()
+        if len(raster_fps) > 1
+    ]
+    num_split_files = sum(
+        len(tile_to_raster_fps[tile]) for tile in shared_tiles
+    )
+    num_output_tiles = len(tile_to_raster_fps)
+    tile_dns = set(
+        os.path.dirname(tile_path_layout.get_relative_tile_fp(tile, tile_ext))
+        for tile in tile_to_raster_fps
+    )
+    raster_bytes = sum(plan["raster_bytes"] for plan in raster_plans)
+    source_bytes_read = sum(plan["source_bytes_read"] for plan in raster_plans)
+    if raster_bytes > 0:
+        overlap_amplification = source_bytes_read / raster_bytes
+    else:
+        overlap_amplification = 0.0
+    total_plan = {
+        "num_rasters": len(raster_plans),
+        "num_tiles": num_output_tiles,
+        "num_split_tiles": len(shared_tiles),
+        "num_split_files": num_split_files,
+        "num_tile_dirs": len(tile_dns),
+        "raster_bytes": raster_bytes,
+        "source_bytes_read": source_bytes_read,
+        "overlap_amplification": overlap_amplification,
+        "output_bytes": _compute_output_bytes(
+            num_output_tiles, raw_tile_bytes, ratios
+        ),
+        # Split files are removed after the aggregation
+        "split_output_bytes": _compute_output_bytes(
+            num_split_files, raw_tile_bytes, ratios
+        ),
+    }
+    tiling_plan = {
+        "tile_ext": tile_ext,
+        "disk_tile_size": list(disk_tile_size),
+        "raw_tile_bytes": raw_tile_bytes,
+        "tile_path_layout": tile_path_layout.to_plain_dict(),
+        "rasters": raster_plans,
+        "total": total_plan,
+    }
+    return tiling_plan
+
+
+def write_tiling_plan_as_json(tiling_plan, json_ofp=None):
+    """Write the plan to json_ofp or (if json_ofp is None) to stdout."""
+    if json_ofp is None:
+        json.dump(tiling_plan, sys.stdout, indent=4)
+        sys.stdout.write("\n")
+    else:
+        with open(json_ofp, "w") as json_file:
+            json.dump(tiling_plan, json_file, indent=4)
@@ -4,13 +4,23 @@ from distutils.util import strtobool
 from rasterio.enums import Resampling
 
 from eot.tiles.tile_manager import TileManager
+from eot.geojson_ext.geojson_writing import get_geojson_ext
 from eot.rasters.raster import Raster
+from eot.rasters.raster_cache import get_default_normalized_raster_cache_dp
+from eot.tools.aggregation.aggregation_engine import aggregate_tiles
 from eot.tools.aggregation.geojson_aggregation import (
     create_grid_geojson,
-    create_category_geojson,
+    get_category_geojson_sinks,
 )
 from eot.tools.aggregation.image_aggregation import create_images
+from eot.tools.aggregation.image_aggregation.pixel_projection import (
+    PixelProjectionSink,
+    compute_memory_bounded_block_size,
+)
+from eot.tools.aggregation.image_aggregation.preview import PreviewSink
 from eot.tools import initialize_categories
+from eot.utility.log import Logs
+from eot.utility.timing import StageTimer, optional_stage
 
 
 def add_parser(subparser, formatter_class):
@@ -50,8 +60,28 @@ def add_parser(subparser, formatter_class):
     ofp.add_argument(
         "--geojson_grid_ofn",
         type=str,
-        default="grid.json",
-        help="file name to store the grid as geojson",
+        help="file name to store the grid as geojson (defaults to grid.json"
+        " or grid.ndjson if --geojson_ndjson is set)",
+    )
+    ofp.add_argument(
+        "--dissolve_polygons",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="If set, the category polygons of adjacent tiles are merged"
+        " (instead of one polygon fragment per tile)",
+    )
+    ofp.add_argument(
+        "--geojson_ndjson",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="If set, the geojson files are written as newline-delimited"
+        " GeoJSON (one feature per line) instead of feature collections",
+    )
+    ofp.add_argument(
+        "--geojson_precision",
+        type=int,
+        help="if set, the geojson coordinates are rounded to this number of"
+        " decimal places",
     )
     # Option 2: aggregate geo tile masks as a single image (and overlay with
     # a single raster image)
@@ -89,6 +119,27 @@ def add_parser(subparser, formatter_class):
         default=0,
         help="Defines how (in the case of mercator tiles) the overlay raster images are resampled",
     )
+    ofp.add_argument(
+        "--block_size",
+        type=int,
+        help="if set, the pixel projection writes the images block-wise"
+        " (as tiled GeoTIFF with blocks of this size, i.e. a multiple of 16)"
+        " instead of allocating the full raster in memory",
+    )
+    ofp.add_argument(
+        "--write_cog",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="If set, the pixel projection writes .tif images as Cloud"
+        " Optimized GeoTIFFs (tiled, compressed and with overviews)",
+    )
+    ofp.add_argument(
+        "--preview_max_size",
+        type=int,
+        help="if set, the images are written as quick-look previews, i.e."
+        " downsampled to this maximal width/height (supports .tif, .png and"
+        " .jpg)",
+    )
     # Additional parameter corresponding to "--mask_overlay_png_ofp"
     ofp.add_argument(
         "--original_raster_ifp",
@@ -106,6 +157,28 @@ def add_parser(subparser, formatter_class):
         default=False,
         help="If provided, writes the normalized raster to --normalized_raster_fp (accelerates future computations)",
     )
+    ofp.add_argument(
+        "--use_normalized_raster_cache",
+        type=lambda x: bool(strtobool(x)),
+        default=False,
+        help="If set, normalized rasters (required for mercator tiles) are"
+        " cached in --normalized_raster_cache_dp (keyed by the raster"
+        " content)",
+    )
+    ofp.add_argument(
+        "--normalized_raster_cache_dp",
+        type=str,
+        default=get_default_normalized_raster_cache_dp(),
+        help="directory of the normalized raster cache"
+        " [default: $EOT_CACHE_DP/normalized_rasters]",
+    )
+    ofp.add_argument(
+        "--normalized_raster_cache_max_mb",
+        type=int,
+        default=10240,
+        help="maximal size of the normalized raster cache (least recently"
+        " used rasters are removed first) [default: 10240]",
+    )
     ofp.add_argument(
         "--use_contours",
         type=lambda x: bool(strtobool(x)),
@@ -125,6 +198,26 @@ def add_parser(subparser, formatter_class):
         default="128,255,0",
         help="",
     )
+
+    perf = parser.add_argument_group("Performances")
+    perf.add_argument(
+        "--workers",
+        type=int,
+        help="number of threads decoding the tiles and computing the blocks"
+        " [default: CPU]",
+    )
+    perf.add_argument(
+        "--memory_budget_mb",
+        type=int,
+        help="if set and the aggregated images of the full raster exceed the"
+        " budget, the images are computed block-wise (with a block size"
+        " respecting the budget)",
+    )
+    perf.add_argument(
+        "--timings",
+        action="store_true",
+        help="if set, print the duration of each aggregation stage",
+    )
     parser.set_defaults(func=main)
 
 
@@ -138,6 +231,35 @@ def _initialize_tile_boundary_color(args):
     return args
 
 
+def _initialize_workers(args):
+    args.workers = (
+        min(os.cpu_count(), args.workers) if args.workers else os.cpu_count()
+    )
+    return args
+
+
+def _initialize_block_size(args):
+    # The block size is only derived from the budget, if not provided
+    if args.memory_budget_mb is None or args.block_size is not None:
+        return args
+    if args.preview_max_size is not None:
+        return args
+    if not args.use_pixel_projection or args.original_raster_ifp is None:
+        return args
+    # NB: The (normalized) raster of mercator tiles has a similar size
+    with Raster.get_from_file(args.original_raster_ifp) as raster:
+        width, height = raster.width, raster.height
+    args.block_size = compute_memory_bounded_block_size(
+        width, height, args.memory_budget_mb * 1024**2, args.workers
+    )
+    if args.block_size is not None:
+        Logs.sinfo(
+            f"neo aggregate - Images exceed the memory budget, using a"
+            f" block size of {args.block_size}"
+        )
+    return args
+
+
 def _check_masks(masks, masks_dp):
     assert len(masks), "empty masks directory: {}".format(masks_dp)
 
@@ -150,14 +272,21 @@ def main(args):
     print(args)
     args = _initialize_tile_boundary_color(args)
     args = initialize_categories(args, include_ignore=True)
+    args = _initialize_workers(args)
+    args = _initialize_block_size(args)
     categories = args.categories
-    masks = list(
-        TileManager.read_tiles_from_dir(
-            idp=args.masks_idp, target_raster_name=args.masks_raster_name
+    timer = StageTimer() if args.timings else None
+    with optional_stage(timer, "tile index"):
+        masks = list(
+            TileManager.read_tiles_from_dir(
+                idp=args.masks_idp, target_raster_name=args.masks_raster_name
+            )
         )
-    )
     _check_masks(masks, args.masks_idp)
 
+    # All outputs are computed with a single pass over the tiles, i.e. each
+    #  tile is read and decoded only once (see aggregate_tiles())
+    sinks = []
     if args.geojson_odp is not None:
         category_names = categories.get_category_names(
             only_active=True, include_ignore=True
@@ -174,19 +303,29 @@ def main(args):
         else:
             raster_transform = None
             raster_crs = None
-        geojson_ofp = os.path.join(args.geojson_odp, args.geojson_grid_ofn)
-        create_grid_geojson(
-            masks,
-            geojson_ofp,
-            raster_transform=raster_transform,
-            raster_crs=raster_crs,
-        )
-        create_category_geojson(
-            masks,
+        geojson_grid_ofn = args.geojson_grid_ofn
+        if geojson_grid_ofn is None:
+            geojson_grid_ofn = "grid" + get_geojson_ext(args.geojson_ndjson)
+        geojson_ofp = os.path.join(args.geojson_odp, geojson_grid_ofn)
+        # NB: The grid is computed without reading the tiles
+        with optional_stage(timer, "grid"):
+            create_grid_geojson(
+                masks,
+                geojson_ofp,
+                raster_transform=raster_transform,
+                raster_crs=raster_crs,
+                ndjson=args.geojson_ndjson,
+                precision=args.geojson_precision,
+            )
+        sinks += get_category_geojson_sinks(
             categories,
             args.geojson_odp,
             raster_transform=raster_transform,
             raster_crs=raster_crs,
+            dissolve_polygons=args.dissolve_polygons,
+            tiles=masks,
+            ndjson=args.geojson_ndjson,
+            precision=args.geojson_precision,
         )
 
     image_ofps = [
@@ -198,11 +337,33 @@ def main(args):
     write_png_image = False
     for image_ofp in image_ofps:
         if image_ofp is not None:
-            _create_dir(os.path.dirname(args.gray_mask_png_ofp))
+            _create_dir(os.path.dirname(image_ofp))
             write_png_image = True
 
-    if write_png_image:
-        resampling = Resampling(args.pixel_projection_overlay_resampling)
-        create_images(
-            args, masks, categories, args.use_pixel_projection, resampling
+    # The block-wise and the polygon projection use their own tile order
+    use_preview_sink = write_png_image and args.preview_max_size is not None
+    use_image_sink = (
+        write_png_image
+        and args.use_pixel_projection
+        and args.block_size is None
+    )
+    resampling = Resampling(args.pixel_projection_overlay_resampling)
+    if use_preview_sink:
+        assert args.original_raster_ifp is not None
+        sinks.append(
+            PreviewSink(
+                args, masks, categories, resampling, args.preview_max_size
+            )
         )
+    elif use_image_sink:
+        sinks.append(PixelProjectionSink(args, masks, categories, resampling))
+    aggregate_tiles(masks, sinks, workers=args.workers, timer=timer)
+
+    if write_png_image and not (use_preview_sink or use_image_sink):
+        with optional_stage(timer, "images"):
+            create_images(
+                args, masks, categories, args.use_pixel_projection, resampling
+            )
+
+    if timer is not None:
+        timer.log_durations(prefix="neo aggregate - ")
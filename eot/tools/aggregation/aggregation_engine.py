@@ -0,0 +1,107 @@
+import collections
+import concurrent.futures as futures
+from contextlib import ExitStack
+
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+from eot.tiles.tile_reading import convert_image_to_label_tile
+from eot.utility.timing import optional_stage
+
+
+class DecodedTile:
+    """The content of a tile file, decoded exactly once per aggregation.
+
+    label_mat and palette correspond to read_label_tile_from_file(), while
+    image_mat corresponds to read_image_tile_from_file() (i.e. the palette
+    indices for tiles with color palette and the colors otherwise).
+    """
+
+    def __init__(self, tile):
+        self.tile = tile
+        pil_image = Image.open(tile.get_absolute_tile_fp())
+        pil_image.load()
+        self.has_palette = pil_image.getpalette() is not None
+        self.label_mat, self.palette = convert_image_to_label_tile(
+            pil_image, tile.get_absolute_tile_fp()
+        )
+        if pil_image.mode == "P":
+            self.image_mat = self.label_mat
+        else:
+            self.image_mat = np.array(pil_image)
+
+
+class AggregationSink:
+    """Consumer of the decoded tiles of an aggregation pass.
+
+    Sinks are entered (as context managers) before the first tile is
+    decoded and finalized after the last tile has been added.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def add_tile(self, decoded_tile):
+        raise NotImplementedError
+
+    def finalize(self):
+        pass
+
+
+def iterate_ordered_results(func, items, workers=1, max_in_flight=None):
+    """Yield func(item) for all items (in the order of the items).
+
+    With multiple workers, the items are processed by a thread pool. At most
+    max_in_flight (default: 2 * workers) results are computed in advance,
+    i.e. the memory consumption does not depend on the number of items.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    assert max_in_flight >= 1
+    with futures.ThreadPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def aggregate_tiles(tiles, sinks, show_progress=True, workers=1, timer=None):
+    """Read and decode each tile once and feed it to all sinks.
+
+    Instead of iterating over the tiles once per output (e.g. once per
+    category polygon file and once for the images), all outputs of an
+    aggregation are computed in a single pass. With multiple workers, the
+    tiles are decoded in parallel, while the sinks consume the decoded tiles
+    in the original tile order.
+    """
+    if len(sinks) == 0:
+        return
+    with ExitStack() as exit_stack:
+        for sink in sinks:
+            exit_stack.enter_context(sink)
+        with optional_stage(timer, "tile pass"):
+            decoded_tiles = iterate_ordered_results(
+                DecodedTile, tiles, workers=workers
+            )
+            if show_progress:
+                decoded_tiles = tqdm(
+                    decoded_tiles, total=len(tiles), ascii=True, unit="mask"
+                )
+            for decoded_tile in decoded_tiles:
+                for sink in sinks:
+                    sink.add_tile(decoded_tile)
+        with optional_stage(timer, "finalize"):
+            for sink in sinks:
+                sink.finalize()
@@ -1,45 +1,229 @@
 import os
+import time
+from eot.crs.crs import EPSG_4326
 from eot.geojson_ext.geo_segmentation import GeoSegmentation
-from eot.tools.aggregation import get_tile_boundary, get_tile_mask
+from eot.geojson_ext.geojson_writing import get_geojson_ext
+from eot.geojson_ext.polygon_dissolve import TilePolygonDissolver
+from eot.tiles.image_pixel_tile import ImagePixelTile
+from eot.tiles.tile_footprint import write_tile_footprints_as_geojson
+from eot.tools.aggregation.aggregation_engine import (
+    AggregationSink,
+    aggregate_tiles,
+)
+from eot.utility.log import Logs
+
+
+def _compute_tile_bounds_in_crs(tile, raster_transform=None):
+    """Return the bounds of the tile in the crs of the tile polygons
+    (without decoding the tile)."""
+    if isinstance(tile, ImagePixelTile):
+        msg = "ImagePixelTiles requires a valid raster_transform"
+        assert raster_transform is not None, msg
+        x_offset, y_offset = tile.get_source_offset()
+        width, height = tile.get_source_size()
+        x_values, y_values = zip(
+            raster_transform * (x_offset, y_offset),
+            raster_transform * (x_offset + width, y_offset + height),
+        )
+        return min(x_values), min(y_values), max(x_values), max(y_values)
+    return tile.compute_bounds_in_crs()
+
+
+class CategoryGeoSegmentationSink(AggregationSink):
+    """Polygonise all categories of a tile at once and write one geojson
+    feature collection per category.
+
+    Each tile is polygonised only once (see
+    GeoSegmentation.from_tile_label_values()), i.e. the cost does not grow
+    with the number of categories.
+
+    If dissolve_polygons is set, the polygons of adjacent tiles are merged
+    (see TilePolygonDissolver), which requires the tiles of the aggregation.
+    """
+
+    def __init__(
+        self,
+        palette_index_to_geojson_ofp,
+        palette_index_to_color,
+        raster_transform=None,
+        raster_crs=None,
+        dissolve_polygons=False,
+        tiles=None,
+        ndjson=False,
+        precision=None,
+    ):
+        self.palette_index_to_geojson_ofp = palette_index_to_geojson_ofp
+        self.palette_index_to_color = palette_index_to_color
+        self.raster_transform = raster_transform
+        self.raster_crs = raster_crs
+        self.ndjson = ndjson
+        self.precision = precision
+        self.palette_index_to_geo_segmentation = {
+            palette_index: GeoSegmentation()
+            for palette_index in palette_index_to_color
+        }
+        if dissolve_polygons:
+            assert tiles is not None, "Dissolving requires the tiles"
+            self.tile_to_index = {
+                tile: index for index, tile in enumerate(tiles)
+            }
+            tile_bounds_list = [
+                _compute_tile_bounds_in_crs(tile, raster_transform)
+                for tile in tiles
+            ]
+            self.palette_index_to_dissolver = {
+                palette_index: TilePolygonDissolver(tile_bounds_list)
+                for palette_index in palette_index_to_color
+            }
+        else:
+            self.tile_to_index = None
+            self.palette_index_to_dissolver = None
+
+    def add_tile(self, decoded_tile):
+        tile_geo_segmentations = GeoSegmentation.from_tile_label_values(
+            decoded_tile.tile,
+            decoded_tile.label_mat,
+            self.palette_index_to_color,
+            raster_transform=self.raster_transform,
+            raster_crs=self.raster_crs,
+        )
+        for palette_index, geo_segmentation in tile_geo_segmentations.items():
+            if self.palette_index_to_dissolver is not None:
+                # The polygons are kept by the dissolver
+                self.palette_index_to_dissolver[
+                    palette_index
+                ].add_tile_polygons(
+                    self.tile_to_index[decoded_tile.tile],
+                    geo_segmentation.get_polygons(geo_segmentation.crs),
+                    decoded_tile.tile.get_tile_transform(),
+                )
+                geo_segmentation = GeoSegmentation(
+                    crs=geo_segmentation.crs,
+                    mask_color=geo_segmentation.mask_color,
+                )
+            self.palette_index_to_geo_segmentation[
+                palette_index
+            ].add_geo_segmentation(geo_segmentation)
+
+    def _dissolve(self, palette_index, geo_segmentation):
+        dissolver = self.palette_index_to_dissolver[palette_index]
+        start = time.perf_counter()
+        polygon_list = dissolver.dissolve()
+        duration = time.perf_counter() - start
+        geojson_fn = os.path.basename(
+            self.palette_index_to_geojson_ofp[palette_index]
+        )
+        Logs.sinfo(
+            f"neo aggregate - dissolve {geojson_fn}:"
+            f" {dissolver.num_input_polygons} ->"
+            f" {dissolver.num_output_polygons} polygons ({duration:.3f}s)"
+        )
+        return GeoSegmentation(
+            polygon_list=polygon_list,
+            crs=geo_segmentation.crs,
+            mask_color=geo_segmentation.mask_color,
+        )
+
+    def finalize(self):
+        for (
+            palette_index,
+            geo_segmentation,
+        ) in self.palette_index_to_geo_segmentation.items():
+            if self.palette_index_to_dissolver is not None:
+                geo_segmentation = self._dissolve(
+                    palette_index, geo_segmentation
+                )
+            geo_segmentation.write_as_geojson_feature_collection(
+                self.palette_index_to_geojson_ofp[palette_index],
+                ndjson=self.ndjson,
+                precision=self.precision,
+            )
+
+
+def get_category_geojson_sinks(
+    categories,
+    geojson_odp,
+    raster_transform=None,
+    raster_crs=None,
+    dissolve_polygons=False,
+    tiles=None,
+    ndjson=False,
+    precision=None,
+):
+    compiled_categories = categories.compile()
+    palette_index_to_geojson_ofp = {}
+    palette_index_to_color = {}
+    for category in categories:
+        # NB: The label tiles are written with the palette of the categories
+        palette_index_to_color[category.palette_index] = (
+            compiled_categories.get_palette_color(category.palette_index)
+        )
+        category_str = category.name.lower()
+        palette_index_to_geojson_ofp[category.palette_index] = os.path.join(
+            geojson_odp, category_str + get_geojson_ext(ndjson)
+        )
+    sink = CategoryGeoSegmentationSink(
+        palette_index_to_geojson_ofp,
+        palette_index_to_color,
+        raster_transform=raster_transform,
+        raster_crs=raster_crs,
+        dissolve_polygons=dissolve_polygons,
+        tiles=tiles,
+        ndjson=ndjson,
+        precision=precision,
+    )
+    return [sink]
 
 
 def create_grid_geojson(
-    masks, geojson_ofp, raster_transform=None, raster_crs=None
+    masks,
+    geojson_ofp,
+    raster_transform=None,
+    raster_crs=None,
+    ndjson=False,
+    precision=None,
 ):
-    def get_mask_callback(tile_label_mat, palette):
-        # palette not used in grid callback
-        return get_tile_boundary(tile_label_mat), None
+    """Write the footprints of the tiles as grid.
 
-    geo_segmentation = GeoSegmentation.from_tiles(
+    The footprints are computed from the tile indices (and the raster
+    transform), i.e. the tiles are neither read nor polygonised.
+    """
+    if isinstance(masks[0], ImagePixelTile):
+        msg = "ImagePixelTiles requires a valid raster_transform"
+        assert raster_transform is not None, msg
+        msg = "ImagePixelTiles requires a valid raster_crs"
+        assert raster_crs is not None, msg
+        for tile in masks:
+            tile.set_crs(raster_crs)
+            tile.set_raster_transform(raster_transform)
+    write_tile_footprints_as_geojson(
+        geojson_ofp,
         masks,
-        get_mask_callback=get_mask_callback,
-        raster_transform=raster_transform,
-        raster_crs=raster_crs,
+        dst_crs=EPSG_4326,
+        ndjson=ndjson,
+        precision=precision,
     )
-    geo_segmentation.write_as_geojson_feature_collection(geojson_ofp)
 
 
 def create_category_geojson(
-    masks, categories, geojson_odp, raster_transform=None, raster_crs=None
+    masks,
+    categories,
+    geojson_odp,
+    raster_transform=None,
+    raster_crs=None,
+    dissolve_polygons=False,
+    ndjson=False,
+    precision=None,
 ):
-    for category in categories:
-
-        def get_mask_callback(tile_label_mat, palette):
-            index_to_color = {
-                index: color for color, index in palette.colors.items()
-            }
-            if category.palette_index in index_to_color:
-                color = index_to_color[category.palette_index]
-            else:
-                color = None
-            return get_tile_mask(tile_label_mat, category), color
-
-        geo_segmentation = GeoSegmentation.from_tiles(
-            masks,
-            get_mask_callback=get_mask_callback,
-            raster_transform=raster_transform,
-            raster_crs=raster_crs,
-        )
-        category_str = category.name.lower()
-        geojson_ofp = os.path.join(geojson_odp, category_str + ".json")
-        geo_segmentation.write_as_geojson_feature_collection(geojson_ofp)
+    # All categories are extracted from a single pass over the tiles
+    sinks = get_category_geojson_sinks(
+        categories,
+        geojson_odp,
+        raster_transform=raster_transform,
+        raster_crs=raster_crs,
+        dissolve_polygons=dissolve_polygons,
+        tiles=masks,
+        ndjson=ndjson,
+        precision=precision,
+    )
+    aggregate_tiles(masks, sinks)
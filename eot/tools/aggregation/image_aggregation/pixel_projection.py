@@ -1,23 +1,42 @@
 import os
 import sys
+import tempfile
 import numpy as np
 from tqdm import tqdm
 import cv2
-from contextlib import contextmanager
+from collections import defaultdict
+from functools import lru_cache
+from contextlib import contextmanager, ExitStack
 from PIL import Image
+from rasterio import shutil as rio_shutil
 from rasterio.enums import Resampling
+from rasterio.windows import Window
 from eot.crs.crs import IDENTITY, EPSG_3857
 from eot.rasters.raster import Raster
+from eot.rasters.raster_cache import NormalizedRasterCache
 from eot.rasters.raster_writing import (
     write_numpy_as_raster,
     write_raster,
     get_written_raster_generator,
+    get_block_wise_raster_writer,
+)
+from eot.rasters.raster_driver import get_driver
+from eot.rasters.cog_writing import (
+    convert_raster_to_cog,
+    get_block_wise_cog_writer,
+    write_numpy_as_cog,
 )
 from eot.rasters.raster_reprojection import (
     reproject_raster,
+    reproject_raster_to_tiled_geotiff,
+    reproject_raster_to_tiled_geotiff_with_default_transform,
 )
 from eot.geojson_ext import get_feature_shapes
 from eot.tools.aggregation import get_tile_mask
+from eot.tools.aggregation.aggregation_engine import (
+    AggregationSink,
+    iterate_ordered_results,
+)
 from eot.tiles.tile_reading import (
     read_label_tile_from_file,
     read_image_tile_from_file,
@@ -27,6 +46,47 @@ from eot.tiles.mercator_tile import MercatorTile
 from eot.tiles.image_pixel_tile import ImagePixelTile
 from eot.utility.conversion import convert_rasterio_to_opencv_resampling
 
+TILE_BOUNDARY_THICKNESS = 3
+# Gray mask (1 byte) + color mask, mask overlay and grid overlay (4 bytes each)
+RASTER_MASK_BYTES_PER_PIXEL = 13
+
+
+def _save_normalized_raster(args, tiling_raster):
+    if args.save_normalized_raster:
+        assert args.normalized_raster_fp != "None"
+
+        write_raster(
+            tiling_raster,
+            args.normalized_raster_fp,
+            build_overviews=True,
+            label_compatible_meta_data=False,
+        )
+
+
+@contextmanager
+def _get_block_wise_normalized_raster(args, resampling):
+    # NB: In contrast to get_normalized_dataset_generator(), the normalized
+    #  raster is written to a (temporary) tiled GeoTIFF, i.e. the memory
+    #  consumption does not depend on the raster size
+    with tempfile.TemporaryDirectory(prefix=".normalized_") as tmp_dp:
+        normalized_fp = os.path.join(tmp_dp, "normalized.tif")
+        reproject_raster_to_tiled_geotiff_with_default_transform(
+            args.original_raster_ifp,
+            normalized_fp,
+            dst_crs=EPSG_3857,
+            resampling=resampling,
+            num_threads=args.workers,
+        )
+        if args.save_normalized_raster:
+            assert args.normalized_raster_fp != "None"
+            rio_shutil.copy(
+                normalized_fp,
+                args.normalized_raster_fp,
+                driver=get_driver(args.normalized_raster_fp),
+            )
+        with Raster.get_from_file(normalized_fp, mode="r") as tiling_raster:
+            yield tiling_raster
+
 
 @contextmanager
 def _get_tiling_raster(original_raster, args, tile_class, resampling):
@@ -48,21 +108,35 @@ def _get_tiling_raster(original_raster, args, tile_class, resampling):
             ) as tiling_raster:
                 assert tiling_raster.crs == EPSG_3857
                 yield tiling_raster
+        elif args.use_normalized_raster_cache:
+            assert resampling is not None
+            cache = NormalizedRasterCache(
+                args.normalized_raster_cache_dp,
+                max_size_bytes=args.normalized_raster_cache_max_mb * 1024**2,
+                num_threads=args.workers,
+            )
+            print("Reading normalized raster from cache ...")
+            with cache.get_normalized_raster(
+                args.original_raster_ifp,
+                dst_crs=EPSG_3857,
+                resampling=resampling,
+            ) as tiling_raster:
+                _save_normalized_raster(args, tiling_raster)
+                yield tiling_raster
+        elif args.block_size is not None:
+            print("Normalizing raster block-wise. This might take a while ...")
+            assert resampling is not None
+            with _get_block_wise_normalized_raster(
+                args, resampling
+            ) as tiling_raster:
+                yield tiling_raster
         else:
             print("Must normalizing raster. This might take a while ...")
             assert resampling is not None
             with original_raster.get_normalized_dataset_generator(
                 dst_crs=EPSG_3857, resampling=resampling
             ) as tiling_raster:
-                if args.save_normalized_raster:
-                    assert args.normalized_raster_fp != "None"
-
-                    write_raster(
-                        tiling_raster,
-                        args.normalized_raster_fp,
-                        build_overviews=True,
-                        label_compatible_meta_data=False,
-                    )
+                _save_normalized_raster(args, tiling_raster)
                 yield tiling_raster
     else:
         assert False
@@ -140,29 +214,116 @@ def _convert_tile_pixels_to_raster_pixels(
     return raster_x_coords, raster_y_coords
 
 
+@lru_cache(maxsize=64)
+def _get_tile_border_pixels(width, height, boundary_thickness):
+    # The following expression creates:
+    # [-boundary_thickness, ..., -1, 0, 1, ..., boundary_thickness]
+    boundary_offsets = np.arange(-boundary_thickness + 1, boundary_thickness)
+    num_offsets = len(boundary_offsets)
+    x_range = np.arange(width)
+    y_range = np.arange(height)
+    tile_x_coords = np.concatenate(
+        [
+            # Top and bottom boundary
+            np.tile(x_range, 2 * num_offsets),
+            # Left and right boundary
+            np.repeat(boundary_offsets, height),
+            np.repeat(width - 1 + boundary_offsets, height),
+        ]
+    )
+    tile_y_coords = np.concatenate(
+        [
+            np.repeat(boundary_offsets, width),
+            np.repeat(height - 1 + boundary_offsets, width),
+            np.tile(y_range, 2 * num_offsets),
+        ]
+    )
+    # The cached arrays are shared
+    tile_x_coords.flags.writeable = False
+    tile_y_coords.flags.writeable = False
+    return tile_x_coords, tile_y_coords
+
+
 def _compute_tile_border_pixels(tile_mask, boundary_thickness=6):
     height, width = tile_mask.shape[:2]
-    tile_x_coords = []
-    tile_y_coords = []
+    return _get_tile_border_pixels(width, height, boundary_thickness)
 
-    # The following expression creates:
-    # [-boundary_thickness, ..., -1, 0, 1, ..., boundary_thickness]
-    boundary_offsets = list(range(-boundary_thickness + 1, boundary_thickness))
-    for offset in boundary_offsets:
-        # Top boundary
-        tile_x_coords += list(range(width))  # 0 .... width -1
-        tile_y_coords += [offset] * width
-        # Bottom boundary
-        tile_x_coords += list(range(width))  # 0 .... width -1
-        tile_y_coords += [height - 1 + offset] * width
-        # Left boundary
-        tile_x_coords += [offset] * height  # 0 .... width -1
-        tile_y_coords += list(range(height))
-        # Right boundary
-        tile_x_coords += [width - 1 + offset] * height  # 0 .... width -1
-        tile_y_coords += list(range(height))
 
-    return tile_x_coords, tile_y_coords
+def _compute_tiles_border_pixels(tiles, tiling_raster, batch_size=64):
+    """Yield the raster pixels of the borders of the tiles.
+
+    Equivalent to _compute_tile_border_pixels() and
+    _convert_tile_pixels_to_raster_pixels() for each tile, but the
+    transformations are computed at once for batches of tiles with the same
+    size (without reading the tiles).
+    """
+    size_to_transform_mats = defaultdict(list)
+    for tile in tiles:
+        tile_offset, tile_size = _get_target_tile_raster_area(
+            tile, tiling_raster
+        )
+        if isinstance(tile, MercatorTile):
+            if not _check_tile_raster_area(
+                tile_offset, tile_size, tiling_raster
+            ):
+                continue
+        # See _compute_tile_raster_pixels()
+        tile.set_disk_size(*tile_size)
+        size_to_transform_mats[tile_size].append(
+            _compute_transform_tile_pixel_to_raster_pixel(tiling_raster, tile)
+        )
+
+    for tile_size, transform_mats in size_to_transform_mats.items():
+        # NB: The tile data is resized with cv2.resize(), i.e. tile_size
+        #  corresponds to (width, height)
+        tile_x_coords, tile_y_coords = _get_tile_border_pixels(
+            *tile_size, TILE_BOUNDARY_THICKNESS
+        )
+        tile_coords_1d_hom_t = _create_1d_hom_idx_mat_from_lists(
+            tile_x_coords, tile_y_coords
+        ).T
+        for start in range(0, len(transform_mats), batch_size):
+            transform_mat_batch = np.stack(
+                transform_mats[start : start + batch_size]
+            )
+            # NB: The homogeneous coordinate is not required
+            raster_x_coords = transform_mat_batch[:, 0] @ tile_coords_1d_hom_t
+            raster_y_coords = transform_mat_batch[:, 1] @ tile_coords_1d_hom_t
+            yield (
+                raster_x_coords.astype(np.int32).ravel(),
+                raster_y_coords.astype(np.int32).ravel(),
+            )
+
+
+def _paint_tiles_grid(
+    raster_grid_overlay,
+    tiles,
+    tiling_raster,
+    tile_boundary_color,
+    window_x_offset=0,
+    window_y_offset=0,
+):
+    """Paint the borders of all tiles into the (window of the) grid
+    overlay."""
+    window_height, window_width = raster_grid_overlay.shape[:2]
+    # Marking the pixels in a boolean mask (and coloring them at once) is
+    #  considerably faster than scattering the colors
+    is_border_mat = np.zeros((window_height, window_width), dtype=bool)
+    is_border_vec = is_border_mat.reshape(-1)
+    for r_x_pix, r_y_pix in _compute_tiles_border_pixels(tiles, tiling_raster):
+        w_x_pix = r_x_pix - np.int32(window_x_offset)
+        w_y_pix = r_y_pix - np.int32(window_y_offset)
+        # NB: Negative values become large unsigned values, i.e. a single
+        #  comparison per axis is sufficient (see _filter_raster_pixels())
+        in_bounds = np.logical_and(
+            w_x_pix.view(np.uint32) < window_width,
+            w_y_pix.view(np.uint32) < window_height,
+        )
+        is_border_vec[
+            w_y_pix[in_bounds].astype(np.intp) * window_width
+            + w_x_pix[in_bounds]
+        ] = True
+    raster_grid_overlay[is_border_mat] = (*tile_boundary_color, 255)
 
 
 def _print_aggregation_msg(categories, idp, ofp):
@@ -176,6 +337,25 @@ def _print_aggregation_msg(categories, idp, ofp):
     )
 
 
+###############################################################################
+#                           Cloud Optimized GeoTIFFs
+###############################################################################
+def _use_cog(args, ofp):
+    # Only GeoTIFFs are written as COG
+    return args.write_cog and get_driver(ofp) == "GTiff"
+
+
+def _get_cog_overview_resampling(overlay_with_raster):
+    # The overviews of label masks must not contain interpolated values
+    if overlay_with_raster:
+        return Resampling.average
+    return Resampling.nearest
+
+
+def _get_reprojected_ofp(ofp):
+    return os.path.splitext(ofp)[0] + "_reprojected.tif"
+
+
 def _save_image(
     ofp,
     tiling_data,
@@ -184,6 +364,7 @@ def _save_image(
     tiling_raster=None,
     overlay_with_raster=False,
     resampling=None,
+    write_cog=False,
     **kwargs,
 ):
     if original_raster is None:
@@ -219,47 +400,60 @@ def _save_image(
             ) as tiling_overwrite_raster:
                 transform, crs = original_raster.get_geo_transform_with_crs()
                 assert resampling is not None
+                if write_cog:
+                    reprojected_ofp = _get_reprojected_ofp(ofp)
+                else:
+                    reprojected_ofp = ofp
                 reproject_raster(
                     tiling_overwrite_raster,
                     crs,
                     transform,
                     original_raster.width,
                     original_raster.height,
-                    ofp,
+                    reprojected_ofp,
                     resampling=resampling,
                 )
+            if write_cog:
+                convert_raster_to_cog(
+                    reprojected_ofp,
+                    ofp,
+                    overview_resampling=_get_cog_overview_resampling(
+                        overlay_with_raster
+                    ),
+                )
+                os.remove(reprojected_ofp)
         elif tile_class == ImagePixelTile:
-            write_raster(
-                tiling_raster,
-                ofp,
-                overwrite_data=tiling_overwrite_data,
-                image_axis_order=True,
-                build_overviews=True,
-                label_compatible_meta_data=False,
-                **kwargs,
-            )
+            if write_cog:
+                write_numpy_as_cog(
+                    tiling_raster,
+                    ofp,
+                    tiling_overwrite_data,
+                    image_axis_order=True,
+                    overview_resampling=_get_cog_overview_resampling(
+                        overlay_with_raster
+                    ),
+                )
+            else:
+                write_raster(
+                    tiling_raster,
+                    ofp,
+                    overwrite_data=tiling_overwrite_data,
+                    image_axis_order=True,
+                    build_overviews=True,
+                    label_compatible_meta_data=False,
+                    **kwargs,
+                )
         else:
             assert False
 
 
-def _get_raster_masks(tiling_raster):
-    raster_mask = np.zeros(
-        (tiling_raster.height, tiling_raster.width), dtype=np.uint8
-    )
-    raster_mask_color = np.zeros(
-        (tiling_raster.height, tiling_raster.width, 4),
-        dtype=np.uint8,
-    )
+def _get_raster_masks(height, width):
+    raster_mask = np.zeros((height, width), dtype=np.uint8)
+    raster_mask_color = np.zeros((height, width, 4), dtype=np.uint8)
     # The alpha component is not a binary switch,
     # but makes the other colors more or less transparent
-    raster_mask_overlay = np.zeros(
-        (tiling_raster.height, tiling_raster.width, 4),
-        dtype=np.uint8,
-    )
-    raster_grid_overlay = np.zeros(
-        (tiling_raster.height, tiling_raster.width, 4),
-        dtype=np.uint8,
-    )
+    raster_mask_overlay = np.zeros((height, width, 4), dtype=np.uint8)
+    raster_grid_overlay = np.zeros((height, width, 4), dtype=np.uint8)
     return (
         raster_mask,
         raster_mask_color,
@@ -268,19 +462,23 @@ def _get_raster_masks(tiling_raster):
     )
 
 
-def create_images_with_pixel_projection(args, masks, categories, resampling):
-    reference_tile = masks[0]
+def _get_tile_class(tiles):
+    reference_tile = tiles[0]
     if isinstance(reference_tile, ImagePixelTile):
         tile_class = ImagePixelTile
     elif isinstance(reference_tile, MercatorTile):
         tile_class = MercatorTile
     else:
         assert False
+    return tile_class
+
+
+def create_images_with_pixel_projection(args, masks, categories, resampling):
     create_images_from_tiles_with_pixel_projection(
         args,
         masks,
         categories,
-        tile_class=tile_class,
+        tile_class=_get_tile_class(masks),
         resampling=resampling,
     )
 
@@ -316,6 +514,720 @@ def _check_tile_raster_area(tile_offset, tile_size, raster):
     return valid
 
 
+def _filter_raster_pixels(r_x_pix, r_y_pix, width, height):
+    # NB: Negative indices would wrap around to the opposite raster border
+    in_bounds = np.logical_and(
+        np.logical_and(r_x_pix >= 0, r_x_pix < width),
+        np.logical_and(r_y_pix >= 0, r_y_pix < height),
+    )
+    return r_x_pix[in_bounds], r_y_pix[in_bounds]
+
+
+def _read_tile_data(tile, use_color_palette):
+    if use_color_palette:
+        tile_data, _ = read_label_tile_from_file(tile.get_absolute_tile_fp())
+    else:
+        tile_data = read_image_tile_from_file(tile.get_absolute_tile_fp())
+    return tile_data
+
+
+def _compute_tile_raster_pixels(
+    args,
+    tile,
+    tiling_raster,
+    categories,
+    category_colors,
+    use_color_palette,
+    label_mask_resampling,
+    tile_data=None,
+    compute_border_pixels=True,
+):
+    """Compute the raster pixels covered by the categories (and the border)
+    of a single tile.
+
+    Returns None, if the tile is not (completely) contained in the raster.
+    Otherwise, returns a list of (palette_index, color_opaque, color_alpha,
+    r_x_pix, r_y_pix) tuples and the border pixels (or None).
+    """
+    tile_offset, tile_size = _get_target_tile_raster_area(tile, tiling_raster)
+    if isinstance(tile, MercatorTile):
+        if not _check_tile_raster_area(tile_offset, tile_size, tiling_raster):
+            return None
+    if tile_data is None:
+        tile_data = _read_tile_data(tile, use_color_palette)
+
+    # If a tile has a lower resolution than the corresponding raster image,
+    # the mapping of tile data to the corresponding raster area potentially
+    # introduces holes. See for example forward vs. reverse mapping in
+    # https://www.cs.princeton.edu/courses/archive/spr11/cos426/notes/cos426_s11_lecture03_warping.pdf
+    # To avoid this we resize the tile data.
+    label_mask_resampling_cv = convert_rasterio_to_opencv_resampling(
+        label_mask_resampling
+    )
+    tile_data = cv2.resize(
+        tile_data,
+        tile_size,
+        interpolation=label_mask_resampling_cv,
+    )
+    assert (
+        tile_size == tile_data.shape[:2]
+    ), f"{tile_size} vs {tile_data.shape}"
+    tile.set_disk_size(*tile_size)
+
+    tile_pixel_to_raster_pixel_transform_mat = (
+        _compute_transform_tile_pixel_to_raster_pixel(tiling_raster, tile)
+    )
+    category_pixels = []
+    for idx, category in enumerate(categories):
+        (
+            category_color_opaque,
+            category_color_alpha,
+        ) = category_colors[idx]
+
+        tile_mask = get_tile_mask(
+            tile_data, category, use_palette_index=use_color_palette
+        )
+
+        # Compute tile/raster category pixels
+        t_cat_x_pix, t_cat_y_pix = _compute_tile_category_pixels(
+            tile_mask, args.use_contours
+        )
+        r_cat_x_pix, r_cat_y_pix = _convert_tile_pixels_to_raster_pixels(
+            tile_pixel_to_raster_pixel_transform_mat,
+            t_cat_x_pix,
+            t_cat_y_pix,
+        )
+        r_cat_x_pix, r_cat_y_pix = _filter_raster_pixels(
+            r_cat_x_pix, r_cat_y_pix, tiling_raster.width, tiling_raster.height
+        )
+        category_pixels.append(
+            (
+                category.palette_index,
+                category_color_opaque,
+                category_color_alpha,
+                r_cat_x_pix,
+                r_cat_y_pix,
+            )
+        )
+
+    if args.tile_boundary_color is not None and compute_border_pixels:
+        # Compute tile/raster border pixels
+        t_border_x_pix, t_border_y_pix = _compute_tile_border_pixels(
+            tile_data, boundary_thickness=TILE_BOUNDARY_THICKNESS
+        )
+        r_border_x_pix, r_border_y_pix = _convert_tile_pixels_to_raster_pixels(
+            tile_pixel_to_raster_pixel_transform_mat,
+            t_border_x_pix,
+            t_border_y_pix,
+        )
+        border_pixels = _filter_raster_pixels(
+            r_border_x_pix,
+            r_border_y_pix,
+            tiling_raster.width,
+            tiling_raster.height,
+        )
+    else:
+        border_pixels = None
+    return category_pixels, border_pixels
+
+
+def _paint_tile_raster_pixels(
+    raster_masks,
+    tile_raster_pixels,
+    tile_boundary_color,
+    window_x_offset=0,
+    window_y_offset=0,
+):
+    """Paint the pixels of a tile into the (window of the) raster masks.
+
+    The grid overlay is painted separately for all tiles (see
+    _paint_tiles_grid()).
+    """
+    (
+        raster_mask,
+        raster_mask_color,
+        raster_mask_overlay,
+        raster_grid_overlay,
+    ) = raster_masks
+    window_height, window_width = raster_mask.shape[:2]
+
+    def to_window_pixels(r_x_pix, r_y_pix):
+        return _filter_raster_pixels(
+            r_x_pix - window_x_offset,
+            r_y_pix - window_y_offset,
+            window_width,
+            window_height,
+        )
+
+    category_pixels, border_pixels = tile_raster_pixels
+    for (
+        palette_index,
+        category_color_opaque,
+        category_color_alpha,
+        r_cat_x_pix,
+        r_cat_y_pix,
+    ) in category_pixels:
+        w_cat_x_pix, w_cat_y_pix = to_window_pixels(r_cat_x_pix, r_cat_y_pix)
+        # This assumes that the dataset is normalized (i.e. using a
+        # north-up-convention). Otherwise the x and y axes of the tile data
+        # are not aligned with the x and y axes of the raster images.
+        raster_mask[w_cat_y_pix, w_cat_x_pix] = palette_index
+        raster_mask_color[w_cat_y_pix, w_cat_x_pix] = category_color_opaque
+        raster_mask_overlay[w_cat_y_pix, w_cat_x_pix] = category_color_alpha
+
+    if border_pixels is not None:
+        w_border_x_pix, w_border_y_pix = to_window_pixels(*border_pixels)
+        raster_mask_overlay[w_border_y_pix, w_border_x_pix] = (
+            *tile_boundary_color,
+            255,
+        )
+
+
+def _get_category_colors(args, categories):
+    category_colors = [
+        (
+            (*category.palette_color, 255),
+            (*category.palette_color, args.overlay_weight),
+        )
+        for category in categories
+    ]
+    return category_colors
+
+
+###############################################################################
+#                           Tile Pasting
+###############################################################################
+def _use_tile_pasting(args, tiles, use_color_palette):
+    # Local tiles are axis-aligned with the raster, i.e. the transformation
+    #  of tile pixels to raster pixels is a simple offset. Contours can not
+    #  be represented by (rectangular) slices.
+    return (
+        use_color_palette
+        and not args.use_contours
+        and all(isinstance(tile, ImagePixelTile) for tile in tiles)
+    )
+
+
+def _get_category_luts(categories, category_colors):
+    """Look up tables mapping palette indices to category colors."""
+    is_category_lut = np.zeros(256, dtype=bool)
+    color_opaque_lut = np.zeros((256, 4), dtype=np.uint8)
+    color_alpha_lut = np.zeros((256, 4), dtype=np.uint8)
+    for category, (color_opaque, color_alpha) in zip(
+        categories, category_colors
+    ):
+        is_category_lut[category.palette_index] = True
+        color_opaque_lut[category.palette_index] = color_opaque
+        color_alpha_lut[category.palette_index] = color_alpha
+    return is_category_lut, color_opaque_lut, color_alpha_lut
+
+
+def _get_tile_border_rectangles(x_offset, y_offset, width, height):
+    """Rectangles (x_min, y_min, x_max, y_max) covering the same pixels as
+    _compute_tile_border_pixels()"""
+    t = TILE_BOUNDARY_THICKNESS - 1
+    x_max = x_offset + width
+    y_max = y_offset + height
+    return [
+        # Top and bottom boundary
+        (x_offset, y_offset - t, x_max, y_offset + t + 1),
+        (x_offset, y_max - 1 - t, x_max, y_max + t),
+        # Left and right boundary
+        (x_offset - t, y_offset, x_offset + t + 1, y_max),
+        (x_max - 1 - t, y_offset, x_max + t, y_max),
+    ]
+
+
+def _clip_rectangle_to_window(rectangle, window):
+    """Return the slices of the rectangle relative to the window and
+    relative to the rectangle (or None, if they do not intersect)."""
+    x_min, y_min, x_max, y_max = rectangle
+    w_x_min = max(x_min, window.col_off)
+    w_y_min = max(y_min, window.row_off)
+    w_x_max = min(x_max, window.col_off + window.width)
+    w_y_max = min(y_max, window.row_off + window.height)
+    if w_x_min >= w_x_max or w_y_min >= w_y_max:
+        return None
+    window_slices = (
+        slice(w_y_min - window.row_off, w_y_max - window.row_off),
+        slice(w_x_min - window.col_off, w_x_max - window.col_off),
+    )
+    rectangle_slices = (
+        slice(w_y_min - y_min, w_y_max - y_min),
+        slice(w_x_min - x_min, w_x_max - x_min),
+    )
+    return window_slices, rectangle_slices
+
+
+def _paste_tile(
+    canvas,
+    tile,
+    window,
+    is_category_lut,
+    tile_boundary_color,
+    label_mask_resampling,
+    tile_data=None,
+):
+    """Paste the palette indices of a tile into the canvas (with numpy
+    slicing instead of transforming individual pixel coordinates)."""
+    index_mat, is_painted_mat, is_border_mat, grid_overlay = canvas
+    x_offset, y_offset = tile.get_source_offset()
+    if tile_data is None:
+        tile_data = _read_tile_data(tile, use_color_palette=True)
+    # Resize the tile once to the corresponding raster area (see
+    #  _compute_tile_raster_pixels())
+    tile_data = cv2.resize(
+        tile_data,
+        tile.get_source_size(),
+        interpolation=convert_rasterio_to_opencv_resampling(
+            label_mask_resampling
+        ),
+    )
+    height, width = tile_data.shape[:2]
+    tile.set_disk_size(width, height)
+
+    clipped_slices = _clip_rectangle_to_window(
+        (x_offset, y_offset, x_offset + width, y_offset + height), window
+    )
+    if clipped_slices is not None:
+        window_slices, tile_slices = clipped_slices
+        tile_indices = tile_data[tile_slices]
+        # Only pixels of (known) categories overwrite previous tiles
+        is_category = is_category_lut[tile_indices]
+        index_mat[window_slices][is_category] = tile_indices[is_category]
+        is_painted_mat[window_slices][is_category] = True
+        is_border_mat[window_slices][is_category] = False
+
+    if tile_boundary_color is not None:
+        for rectangle in _get_tile_border_rectangles(
+            x_offset, y_offset, width, height
+        ):
+            clipped_slices = _clip_rectangle_to_window(rectangle, window)
+            if clipped_slices is None:
+                continue
+            window_slices, _ = clipped_slices
+            is_border_mat[window_slices] = True
+            grid_overlay[window_slices] = (*tile_boundary_color, 255)
+
+
+def _convert_canvas_to_raster_masks(
+    canvas, color_opaque_lut, color_alpha_lut, tile_boundary_color
+):
+    index_mat, is_painted_mat, is_border_mat, grid_overlay = canvas
+    # Apply the category colors at once
+    mask_color = color_opaque_lut[index_mat]
+    mask_color[~is_painted_mat] = 0
+    mask_overlay = color_alpha_lut[index_mat]
+    mask_overlay[~is_painted_mat] = 0
+    if tile_boundary_color is not None:
+        mask_overlay[is_border_mat] = (*tile_boundary_color, 255)
+    return index_mat, mask_color, mask_overlay, grid_overlay
+
+
+class WindowRasterMasks:
+    """Aggregate tiles (one after another) into the masks of a raster
+    window."""
+
+    def __init__(
+        self,
+        args,
+        tiling_raster,
+        categories,
+        use_color_palette,
+        use_tile_pasting,
+        label_mask_resampling,
+        window,
+    ):
+        self.args = args
+        self.tiling_raster = tiling_raster
+        self.categories = categories
+        self.use_color_palette = use_color_palette
+        self.use_tile_pasting = use_tile_pasting
+        self.label_mask_resampling = label_mask_resampling
+        self.window = window
+        self.category_colors = _get_category_colors(args, categories)
+        if use_tile_pasting:
+            (
+                self.is_category_lut,
+                self.color_opaque_lut,
+                self.color_alpha_lut,
+            ) = _get_category_luts(categories, self.category_colors)
+            self.canvas = (
+                np.zeros((window.height, window.width), dtype=np.uint8),
+                np.zeros((window.height, window.width), dtype=bool),
+                np.zeros((window.height, window.width), dtype=bool),
+                np.zeros((window.height, window.width, 4), dtype=np.uint8),
+            )
+        else:
+            self.raster_masks = _get_raster_masks(window.height, window.width)
+            # The grid is painted at once (see get_raster_masks()), while
+            #  the borders of the mask overlay depend on the tile order
+            self.grid_tiles = []
+            self.paint_overlay_borders = (
+                args.tile_boundary_color is not None
+                and args.overlay_mask_png_ofp is not None
+            )
+
+    def add_tile(self, tile, tile_data=None):
+        """Add a tile. If tile_data is None, the tile is read from disk."""
+        if self.use_tile_pasting:
+            _paste_tile(
+                self.canvas,
+                tile,
+                self.window,
+                self.is_category_lut,
+                self.args.tile_boundary_color,
+                self.label_mask_resampling,
+                tile_data=tile_data,
+            )
+            return
+
+        tile_raster_pixels = _compute_tile_raster_pixels(
+            self.args,
+            tile,
+            self.tiling_raster,
+            self.categories,
+            self.category_colors,
+            self.use_color_palette,
+            self.label_mask_resampling,
+            tile_data=tile_data,
+            compute_border_pixels=self.paint_overlay_borders,
+        )
+        if tile_raster_pixels is None:
+            return
+        self.grid_tiles.append(tile)
+        _paint_tile_raster_pixels(
+            self.raster_masks,
+            tile_raster_pixels,
+            self.args.tile_boundary_color,
+            window_x_offset=self.window.col_off,
+            window_y_offset=self.window.row_off,
+        )
+
+    def get_raster_masks(self):
+        if self.use_tile_pasting:
+            return _convert_canvas_to_raster_masks(
+                self.canvas,
+                self.color_opaque_lut,
+                self.color_alpha_lut,
+                self.args.tile_boundary_color,
+            )
+        if self.args.tile_boundary_color is not None:
+            _paint_tiles_grid(
+                self.raster_masks[3],
+                self.grid_tiles,
+                self.tiling_raster,
+                self.args.tile_boundary_color,
+                window_x_offset=self.window.col_off,
+                window_y_offset=self.window.row_off,
+            )
+            self.grid_tiles = []
+        return self.raster_masks
+
+
+def _compute_window_raster_masks(
+    args,
+    tiles,
+    tiling_raster,
+    categories,
+    use_color_palette,
+    label_mask_resampling,
+    window,
+    show_progress=False,
+):
+    """Aggregate the tiles into the masks of the given (raster) window."""
+    window_raster_masks = WindowRasterMasks(
+        args,
+        tiling_raster,
+        categories,
+        use_color_palette,
+        _use_tile_pasting(args, tiles, use_color_palette),
+        label_mask_resampling,
+        window,
+    )
+    if show_progress:
+        tiles = tqdm(tiles, ascii=True, unit="mask")
+    for tile in tiles:
+        window_raster_masks.add_tile(tile)
+    return window_raster_masks.get_raster_masks()
+
+
+###############################################################################
+#                           Block-wise Aggregation
+###############################################################################
+def compute_memory_bounded_block_size(
+    width, height, memory_budget_bytes, workers
+):
+    """Return the largest block size respecting the memory budget (or None,
+    if the masks of the full raster fit into the memory budget)."""
+    if width * height * RASTER_MASK_BYTES_PER_PIXEL <= memory_budget_bytes:
+        return None
+    # See iterate_ordered_results()
+    max_blocks_in_flight = 2 * max(workers, 1)
+    max_block_pixels = memory_budget_bytes / (
+        max_blocks_in_flight * RASTER_MASK_BYTES_PER_PIXEL
+    )
+    block_size = int(np.sqrt(max_block_pixels)) // 16 * 16
+    return max(block_size, 16)
+
+
+def _compute_block_to_tile_indices(tiles, tiling_raster, block_size):
+    """Group the tiles by the output blocks they contribute to."""
+    num_block_cols = -(-tiling_raster.width // block_size)
+    num_block_rows = -(-tiling_raster.height // block_size)
+    # NB: The tile borders (and contours) exceed the raster area of a tile
+    margin = TILE_BOUNDARY_THICKNESS + 1
+    block_to_tile_indices = defaultdict(list)
+    for tile_index, tile in enumerate(tiles):
+        tile_offset, tile_size = _get_target_tile_raster_area(
+            tile, tiling_raster
+        )
+        x_offset, y_offset = tile_offset
+        # NB: Mercator tiles are (approximately) square
+        extent = max(tile_size)
+        first_col = max(0, (x_offset - margin) // block_size)
+        last_col = min(
+            num_block_cols - 1, (x_offset + extent + margin) // block_size
+        )
+        first_row = max(0, (y_offset - margin) // block_size)
+        last_row = min(
+            num_block_rows - 1, (y_offset + extent + margin) // block_size
+        )
+        for block_row in range(first_row, last_row + 1):
+            for block_col in range(first_col, last_col + 1):
+                block_to_tile_indices[(block_row, block_col)].append(
+                    tile_index
+                )
+    return block_to_tile_indices
+
+
+def _iterate_block_windows(width, height, block_size):
+    for block_row, row_off in enumerate(range(0, height, block_size)):
+        for block_col, col_off in enumerate(range(0, width, block_size)):
+            window = Window(
+                col_off,
+                row_off,
+                min(block_size, width - col_off),
+                min(block_size, height - row_off),
+            )
+            yield (block_row, block_col), window
+
+
+def _overlay_block_with_raster(block_data, tiling_raster, window):
+    tiling_raster_data = tiling_raster.get_raster_data_as_numpy(
+        image_axis_order=True, add_alpha_channel=True, window=window
+    )
+    mask_non_black_pixels = get_non_black_pixel_indices(block_data)
+    tiling_raster_data[mask_non_black_pixels] = block_data[
+        mask_non_black_pixels
+    ]
+    return tiling_raster_data
+
+
+def _get_block_wise_ofp(ofp, tile_class):
+    # Block-wise writing requires a (tiled) GeoTIFF. Mercator tiles are
+    #  aggregated w.r.t. the normalized raster and must be reprojected.
+    if tile_class == ImagePixelTile and get_driver(ofp) == "GTiff":
+        block_wise_ofp = ofp
+    else:
+        block_wise_ofp = os.path.splitext(ofp)[0] + "_blocks.tif"
+    return block_wise_ofp
+
+
+def _finalize_block_wise_image(
+    ofp,
+    block_wise_ofp,
+    tile_class,
+    original_raster,
+    resampling,
+    num_threads=1,
+    write_cog=False,
+    overlay_with_raster=False,
+):
+    if tile_class == MercatorTile:
+        transform, crs = original_raster.get_geo_transform_with_crs()
+        assert resampling is not None
+        # The reprojection writes a tiled GeoTIFF (without holding the full
+        #  raster in memory)
+        if get_driver(ofp) == "GTiff" and not write_cog:
+            reprojected_ofp = ofp
+        else:
+            reprojected_ofp = os.path.splitext(ofp)[0] + "_reprojected.tif"
+        reproject_raster_to_tiled_geotiff(
+            block_wise_ofp,
+            crs,
+            transform,
+            original_raster.width,
+            original_raster.height,
+            reprojected_ofp,
+            resampling=resampling,
+            num_threads=num_threads,
+        )
+        if write_cog:
+            convert_raster_to_cog(
+                reprojected_ofp,
+                ofp,
+                overview_resampling=_get_cog_overview_resampling(
+                    overlay_with_raster
+                ),
+            )
+            os.remove(reprojected_ofp)
+        elif reprojected_ofp != ofp:
+            rio_shutil.copy(reprojected_ofp, ofp, driver=get_driver(ofp))
+            os.remove(reprojected_ofp)
+    elif block_wise_ofp != ofp:
+        rio_shutil.copy(block_wise_ofp, ofp, driver=get_driver(ofp))
+    if block_wise_ofp != ofp:
+        os.remove(block_wise_ofp)
+
+
+def _create_images_block_wise(
+    args,
+    tiles,
+    categories,
+    tile_class,
+    resampling,
+    original_raster,
+    tiling_raster,
+    use_color_palette,
+    label_mask_resampling,
+):
+    """Aggregate the tiles block by block into tiled GeoTIFFs.
+
+    The tiles are grouped by output block, i.e. each block is computed,
+    written and released exactly once. Thus, the peak memory depends on the
+    block size (and the tile size) instead of the raster size.
+    """
+    block_size = args.block_size
+    block_to_tile_indices = _compute_block_to_tile_indices(
+        tiles, tiling_raster, block_size
+    )
+    # (ofp, count, overlay_with_raster, resampling, kwargs)
+    image_configs = [
+        (
+            args.gray_mask_png_ofp,
+            1,
+            False,
+            label_mask_resampling,
+            {"compress": "DEFLATE"},
+        ),
+        (
+            args.color_mask_png_ofp,
+            4,
+            False,
+            label_mask_resampling,
+            {"compress": "DEFLATE"},
+        ),
+        (args.overlay_mask_png_ofp, 4, True, resampling, {}),
+        (args.overlay_grid_png_ofp, 4, True, resampling, {}),
+    ]
+    with ExitStack() as exit_stack:
+        writers = []
+        for ofp, count, overlay_with_raster, _, kwargs in image_configs:
+            if ofp is None:
+                writers.append(None)
+                continue
+            _print_aggregation_msg(categories, args.masks_idp, ofp)
+            block_wise_ofp = _get_block_wise_ofp(ofp, tile_class)
+            if block_wise_ofp == ofp and _use_cog(args, ofp):
+                # The overviews are computed while writing the blocks
+                writer = get_block_wise_cog_writer(
+                    tiling_raster,
+                    ofp,
+                    count=count,
+                    dtype="uint8",
+                    block_size=block_size,
+                    overview_resampling=_get_cog_overview_resampling(
+                        overlay_with_raster
+                    ),
+                )
+            else:
+                writer = get_block_wise_raster_writer(
+                    tiling_raster,
+                    block_wise_ofp,
+                    count=count,
+                    dtype="uint8",
+                    block_size=block_size,
+                    build_overviews=True,
+                    label_compatible_meta_data=False,
+                    **kwargs,
+                )
+            writers.append(exit_stack.enter_context(writer))
+
+        block_windows = list(
+            _iterate_block_windows(
+                tiling_raster.width, tiling_raster.height, block_size
+            )
+        )
+
+        def iterate_block_items():
+            for block_index, window in block_windows:
+                block_tiles = [
+                    tiles[tile_index]
+                    for tile_index in block_to_tile_indices.pop(
+                        block_index, []
+                    )
+                ]
+                yield window, block_tiles
+
+        def compute_block_masks(block_item):
+            window, block_tiles = block_item
+            block_masks = _compute_window_raster_masks(
+                args,
+                block_tiles,
+                tiling_raster,
+                categories,
+                use_color_palette,
+                label_mask_resampling,
+                window,
+            )
+            return window, block_masks
+
+        # The blocks are disjoint, i.e. the workers compute the blocks
+        #  independently, while the blocks are written in order by this
+        #  thread.
+        for window, block_masks in tqdm(
+            iterate_ordered_results(
+                compute_block_masks,
+                iterate_block_items(),
+                workers=args.workers,
+            ),
+            total=len(block_windows),
+            ascii=True,
+            unit="block",
+        ):
+            for writer, block_data, image_config in zip(
+                writers, block_masks, image_configs
+            ):
+                if writer is None:
+                    continue
+                overlay_with_raster = image_config[2]
+                if overlay_with_raster:
+                    block_data = _overlay_block_with_raster(
+                        block_data, tiling_raster, window
+                    )
+                if block_data.ndim == 2:
+                    block_data = block_data[np.newaxis, :, :]
+                else:
+                    # (height, width, channel) -> (channel, height, width)
+                    block_data = np.moveaxis(block_data, 2, 0)
+                writer.write(block_data, window=window)
+
+    for ofp, _, overlay_with_raster, image_resampling, _ in image_configs:
+        if ofp is None:
+            continue
+        _finalize_block_wise_image(
+            ofp,
+            _get_block_wise_ofp(ofp, tile_class),
+            tile_class,
+            original_raster,
+            image_resampling,
+            num_threads=args.workers,
+            write_cog=_use_cog(args, ofp),
+            overlay_with_raster=overlay_with_raster,
+        )
+
+
 def create_images_from_tiles_with_pixel_projection(
     args, tiles, categories, tile_class, resampling
 ):
@@ -333,191 +1245,198 @@ def create_images_from_tiles_with_pixel_projection(
     with _get_tiling_raster(
         original_raster, args, tile_class, resampling
     ) as tiling_raster:
-        (
+        if args.block_size is not None:
+            _create_images_block_wise(
+                args,
+                tiles,
+                categories,
+                tile_class,
+                resampling,
+                original_raster,
+                tiling_raster,
+                use_color_palette,
+                label_mask_resampling,
+            )
+            return
+
+        raster_masks = _compute_window_raster_masks(
+            args,
+            tiles,
+            tiling_raster,
+            categories,
+            use_color_palette,
+            label_mask_resampling,
+            Window(0, 0, tiling_raster.width, tiling_raster.height),
+            show_progress=True,
+        )
+        _save_raster_masks(
+            args,
+            raster_masks,
+            categories,
+            tile_class,
+            original_raster,
+            tiling_raster,
+            resampling,
+            label_mask_resampling,
+        )
+
+
+def _save_raster_masks(
+    args,
+    raster_masks,
+    categories,
+    tile_class,
+    original_raster,
+    tiling_raster,
+    resampling,
+    label_mask_resampling,
+):
+    (
+        raster_mask,
+        raster_mask_color,
+        raster_mask_overlay,
+        raster_grid_overlay,
+    ) = raster_masks
+    # https://pillow.readthedocs.io/en/4.1.x/handbook/concepts.html#modes
+    if args.gray_mask_png_ofp is not None:
+        _print_aggregation_msg(
+            categories,
+            args.masks_idp,
+            args.gray_mask_png_ofp,
+        )
+        _save_image(
+            args.gray_mask_png_ofp,
             raster_mask,
+            tile_class=tile_class,
+            original_raster=original_raster,
+            tiling_raster=tiling_raster,
+            overlay_with_raster=False,
+            compress="DEFLATE",
+            resampling=label_mask_resampling,
+            write_cog=_use_cog(args, args.gray_mask_png_ofp),
+        )
+    if args.color_mask_png_ofp is not None:
+        _print_aggregation_msg(
+            categories,
+            args.masks_idp,
+            args.color_mask_png_ofp,
+        )
+        _save_image(
+            args.color_mask_png_ofp,
             raster_mask_color,
+            tile_class=tile_class,
+            original_raster=original_raster,
+            tiling_raster=tiling_raster,
+            overlay_with_raster=False,
+            compress="DEFLATE",
+            resampling=label_mask_resampling,
+            write_cog=_use_cog(args, args.color_mask_png_ofp),
+        )
+    if args.overlay_mask_png_ofp is not None:
+        _print_aggregation_msg(
+            categories,
+            args.masks_idp,
+            args.overlay_mask_png_ofp,
+        )
+        _save_image(
+            args.overlay_mask_png_ofp,
             raster_mask_overlay,
+            tile_class=tile_class,
+            original_raster=original_raster,
+            tiling_raster=tiling_raster,
+            overlay_with_raster=True,
+            resampling=resampling,
+            write_cog=_use_cog(args, args.overlay_mask_png_ofp),
+        )
+    if args.overlay_grid_png_ofp is not None:
+        _print_aggregation_msg(
+            categories,
+            args.masks_idp,
+            args.overlay_grid_png_ofp,
+        )
+        _save_image(
+            args.overlay_grid_png_ofp,
             raster_grid_overlay,
-        ) = _get_raster_masks(tiling_raster)
-        for tile in tqdm(tiles, ascii=True, unit="mask"):
-            if use_color_palette:
-                tile_data, _ = read_label_tile_from_file(
-                    tile.get_absolute_tile_fp()
-                )
-            else:
-                tile_data = read_image_tile_from_file(
-                    tile.get_absolute_tile_fp()
-                )
-            tile_offset, tile_size = _get_target_tile_raster_area(
-                tile, tiling_raster
-            )
-            if isinstance(tile, MercatorTile):
-                if not _check_tile_raster_area(
-                    tile_offset, tile_size, tiling_raster
-                ):
-                    continue
+            tile_class=tile_class,
+            original_raster=original_raster,
+            tiling_raster=tiling_raster,
+            overlay_with_raster=True,
+            resampling=resampling,
+            write_cog=_use_cog(args, args.overlay_grid_png_ofp),
+        )
 
-            # If a tile has a lower resolution than the corresponding raster image,
-            # the mapping of tile data to the corresponding raster area potentially
-            # introduces holes. See for example forward vs. reverse mapping in
-            # https://www.cs.princeton.edu/courses/archive/spr11/cos426/notes/cos426_s11_lecture03_warping.pdf
-            # To avoid this we resize the tile data.
-            label_mask_resampling_cv = convert_rasterio_to_opencv_resampling(
-                label_mask_resampling
-            )
-            tile_data = cv2.resize(
-                tile_data,
-                tile_size,
-                interpolation=label_mask_resampling_cv,
-            )
-            assert (
-                tile_size == tile_data.shape[:2]
-            ), f"{tile_size} vs {tile_data.shape}"
-            tile.set_disk_size(*tile_size)
-
-            tile_pixel_to_raster_pixel_transform_mat = (
-                _compute_transform_tile_pixel_to_raster_pixel(
-                    tiling_raster, tile
-                )
-            )
-            for idx, category in enumerate(categories):
-                category_color = category.palette_color
-                category_color_opaque = (*category_color, 255)
-                category_color_alpha = (*category_color, args.overlay_weight)
 
-                tile_mask = get_tile_mask(
-                    tile_data, category, use_palette_index=use_color_palette
-                )
+###############################################################################
+#                           Single-pass Aggregation
+###############################################################################
+class PixelProjectionSink(AggregationSink):
+    """Aggregate the (already decoded) tiles of an aggregation pass into the
+    gray, color, overlay and grid images (see aggregate_tiles()).
 
-                # Compute tile/raster category pixels
-                t_cat_x_pix, t_cat_y_pix = _compute_tile_category_pixels(
-                    tile_mask, args.use_contours
-                )
-                (
-                    r_cat_x_pix,
-                    r_cat_y_pix,
-                ) = _convert_tile_pixels_to_raster_pixels(
-                    tile_pixel_to_raster_pixel_transform_mat,
-                    t_cat_x_pix,
-                    t_cat_y_pix,
-                )
+    Equivalent to create_images_with_pixel_projection() without a block
+    size, i.e. the masks of the full raster are kept in memory.
+    """
 
-                # Filter x values out of bounds
-                r_cat_x_pix_in_bounds = r_cat_x_pix < tiling_raster.width
-                r_cat_x_pix = r_cat_x_pix[r_cat_x_pix_in_bounds]
-                r_cat_y_pix = r_cat_y_pix[r_cat_x_pix_in_bounds]
-
-                # Filter y values out of bounds
-                r_cat_y_pix_in_bounds = r_cat_y_pix < tiling_raster.height
-                r_cat_x_pix = r_cat_x_pix[r_cat_y_pix_in_bounds]
-                r_cat_y_pix = r_cat_y_pix[r_cat_y_pix_in_bounds]
-
-                # This assumes that the dataset is normalized (i.e. using a
-                # north-up-convention). Otherwise the x and y axes of the tile data
-                # are not aligned with the x and y axes of the raster images.
-                raster_mask[r_cat_y_pix, r_cat_x_pix] = category.palette_index
-                raster_mask_color[
-                    r_cat_y_pix, r_cat_x_pix
-                ] = category_color_opaque
-                raster_mask_overlay[
-                    r_cat_y_pix, r_cat_x_pix
-                ] = category_color_alpha
-
-            if args.tile_boundary_color is not None:
-                # Compute tile/raster border pixels
-                t_border_x_pix, t_border_y_pix = _compute_tile_border_pixels(
-                    tile_mask, boundary_thickness=3
-                )
-                (
-                    r_border_x_pix,
-                    r_border_y_pix,
-                ) = _convert_tile_pixels_to_raster_pixels(
-                    tile_pixel_to_raster_pixel_transform_mat,
-                    t_border_x_pix,
-                    t_border_y_pix,
-                )
+    def __init__(self, args, tiles, categories, resampling):
+        assert args.block_size is None
+        self.args = args
+        self.categories = categories
+        self.resampling = resampling
+        self.tile_class = _get_tile_class(tiles)
+        self.original_raster = Raster.get_from_file(args.original_raster_ifp)
+        if self.tile_class == MercatorTile:
+            assert self.original_raster.crs is not None
+        # See create_images_from_tiles_with_pixel_projection()
+        self.label_mask_resampling = Resampling.nearest
+        img = Image.open(tiles[0].get_absolute_tile_fp())
+        self.use_color_palette = img.getpalette() is not None
+        self.use_tile_pasting = _use_tile_pasting(
+            args, tiles, self.use_color_palette
+        )
+        self._exit_stack = ExitStack()
+        self.tiling_raster = None
+        self.window_raster_masks = None
 
-                # Filter x values out of bounds
-                r_border_x_pix_in_bounds = r_border_x_pix < tiling_raster.width
-                r_border_x_pix = r_border_x_pix[r_border_x_pix_in_bounds]
-                r_border_y_pix = r_border_y_pix[r_border_x_pix_in_bounds]
+    def __enter__(self):
+        self.tiling_raster = self._exit_stack.enter_context(
+            _get_tiling_raster(
+                self.original_raster,
+                self.args,
+                self.tile_class,
+                self.resampling,
+            )
+        )
+        self.window_raster_masks = WindowRasterMasks(
+            self.args,
+            self.tiling_raster,
+            self.categories,
+            self.use_color_palette,
+            self.use_tile_pasting,
+            self.label_mask_resampling,
+            Window(0, 0, self.tiling_raster.width, self.tiling_raster.height),
+        )
+        return self
 
-                # Filter y values out of bounds
-                r_border_y_pix_in_bounds = (
-                    r_border_y_pix < tiling_raster.height
-                )
-                r_border_x_pix = r_border_x_pix[r_border_y_pix_in_bounds]
-                r_border_y_pix = r_border_y_pix[r_border_y_pix_in_bounds]
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._exit_stack.close()
 
-                raster_mask_overlay[r_border_y_pix, r_border_x_pix] = (
-                    *args.tile_boundary_color,
-                    255,
-                )
-                raster_grid_overlay[r_border_y_pix, r_border_x_pix] = (
-                    *args.tile_boundary_color,
-                    255,
-                )
+    def add_tile(self, decoded_tile):
+        if self.use_color_palette:
+            tile_data = decoded_tile.label_mat
+        else:
+            tile_data = decoded_tile.image_mat
+        self.window_raster_masks.add_tile(
+            decoded_tile.tile, tile_data=tile_data
+        )
 
-        # https://pillow.readthedocs.io/en/4.1.x/handbook/concepts.html#modes
-        if args.gray_mask_png_ofp is not None:
-            _print_aggregation_msg(
-                categories,
-                args.masks_idp,
-                args.gray_mask_png_ofp,
-            )
-            _save_image(
-                args.gray_mask_png_ofp,
-                raster_mask,
-                tile_class=tile_class,
-                original_raster=original_raster,
-                tiling_raster=tiling_raster,
-                overlay_with_raster=False,
-                compress="DEFLATE",
-                resampling=label_mask_resampling,
-            )
-        if args.color_mask_png_ofp is not None:
-            _print_aggregation_msg(
-                categories,
-                args.masks_idp,
-                args.color_mask_png_ofp,
-            )
-            _save_image(
-                args.color_mask_png_ofp,
-                raster_mask_color,
-                tile_class=tile_class,
-                original_raster=original_raster,
-                tiling_raster=tiling_raster,
-                overlay_with_raster=False,
-                compress="DEFLATE",
-                resampling=label_mask_resampling,
-            )
-        if args.overlay_mask_png_ofp is not None:
-            _print_aggregation_msg(
-                categories,
-                args.masks_idp,
-                args.overlay_mask_png_ofp,
-            )
-            _save_image(
-                args.overlay_mask_png_ofp,
-                raster_mask_overlay,
-                tile_class=tile_class,
-                original_raster=original_raster,
-                tiling_raster=tiling_raster,
-                overlay_with_raster=True,
-                resampling=resampling,
-            )
-        if args.overlay_grid_png_ofp is not None:
-            _print_aggregation_msg(
-                categories,
-                args.masks_idp,
-                args.overlay_grid_png_ofp,
-            )
-            _save_image(
-                args.overlay_grid_png_ofp,
-                raster_grid_overlay,
-                tile_class=tile_class,
-                original_raster=original_raster,
-                tiling_raster=tiling_raster,
-                overlay_with_raster=True,
-                resampling=resampling,
-            )
+    def finalize(self):
+        _save_raster_masks(
+            self.args,
+            self.window_raster_masks.get_raster_masks(),
+            self.categories,
+            self.tile_class,
+            self.original_raster,
+            self.tiling_raster,
+            self.resampling,
+            self.label_mask_resampling,
+        )
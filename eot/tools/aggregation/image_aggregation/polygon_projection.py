@@ -1,7 +1,7 @@
 import copy
 import numpy as np
 from eot.rasters.raster import Raster
-from eot.tools.aggregation import get_tile_boundary, get_tile_mask
+from eot.tools.aggregation import get_tile_boundary
 from eot.geojson_ext.geo_segmentation import GeoSegmentation
 from eot.rasters.raster_writing import write_raster
 from eot.utility.np_ext import (
@@ -10,31 +10,38 @@ from eot.utility.np_ext import (
 )
 
 
-def _compute_label_color_raster_data(original_raster, masks, categories):
-    def get_category_mask_callback(tile_label_mat, palette, category):
-        color = category.palette_color
-        return get_tile_mask(tile_label_mat, category), color
+def _compute_category_geo_segmentations(raster, masks, categories):
+    # All categories are polygonised with a single pass over the tiles
+    raster_transform, raster_crs = raster.get_geo_transform_with_crs()
+    return GeoSegmentation.from_tiles_per_label_value(
+        masks,
+        {category.palette_index: None for category in categories},
+        raster_transform=raster_transform,
+        raster_crs=raster_crs,
+    )
 
+
+def _compute_label_color_raster_data(
+    original_raster, categories, category_geo_segmentations
+):
     label_raster_data = _compute_label_raster_data(
         original_raster,
-        masks,
         categories,
-        get_category_mask_callback,
+        category_geo_segmentations,
+        lambda category: category.palette_color,
         label_raster_depth=4,
     )
     return label_raster_data
 
 
-def _compute_label_mask_raster_data(original_raster, masks, categories):
-    def get_category_mask_callback(tile_label_mat, palette, category):
-        mask_value = category.palette_index
-        return (get_tile_mask(tile_label_mat, category), mask_value)
-
+def _compute_label_mask_raster_data(
+    original_raster, categories, category_geo_segmentations
+):
     label_raster_data = _compute_label_raster_data(
         original_raster,
-        masks,
         categories,
-        get_category_mask_callback,
+        category_geo_segmentations,
+        lambda category: category.palette_index,
         label_raster_depth=1,
     )
     return label_raster_data
@@ -50,9 +57,9 @@ def _get_index_alpha_color(tile_color):
 
 def _compute_label_raster_data(
     raster,
-    masks,
     categories,
-    get_category_mask_callback,
+    category_geo_segmentations,
+    get_category_color_callback,
     label_raster_depth,
 ):
     label_raster_data = np.zeros(
@@ -62,26 +69,15 @@ def _compute_label_raster_data(
         background_color = 0
     else:
         background_color = tuple([0] * label_raster_depth)
+    raster_transform, raster_crs = raster.get_geo_transform_with_crs()
     for category in categories:
-
-        def get_geojson_mask_callback(tile_label_mat, palette):
-            return get_category_mask_callback(
-                tile_label_mat, palette, category
-            )
-
-        raster_transform, raster_crs = raster.get_geo_transform_with_crs()
-        geo_segmentation = GeoSegmentation.from_tiles(
-            masks,
-            get_mask_callback=get_geojson_mask_callback,
-            raster_transform=raster_transform,
-            raster_crs=raster_crs,
-        )
+        geo_segmentation = category_geo_segmentations[category.palette_index]
         geojson_raster_data = geo_segmentation.to_raster_data(
             raster.width,
             raster.height,
             raster_transform,
             raster_crs,
-            _get_index_alpha_color(geo_segmentation.mask_color),
+            _get_index_alpha_color(get_category_color_callback(category)),
             background_color,
         )
         non_zero_indices = geojson_raster_data > 0
@@ -121,9 +117,12 @@ def _compute_grid_raster_data(raster, masks):
 
 def create_images_with_polgyon_projection(args, masks, categories):
     original_raster = Raster.get_from_file(args.original_raster_ifp)
-    label_index_raster_data = _compute_label_mask_raster_data(
+    category_geo_segmentations = _compute_category_geo_segmentations(
         original_raster, masks, categories
     )
+    label_index_raster_data = _compute_label_mask_raster_data(
+        original_raster, categories, category_geo_segmentations
+    )
     color_map = {
         category.palette_index: category.palette_color
         for category in categories
@@ -140,7 +139,7 @@ def create_images_with_polgyon_projection(args, masks, categories):
     )
 
     label_color_raster_data = _compute_label_color_raster_data(
-        original_raster, masks, categories
+        original_raster, categories, category_geo_segmentations
     )
     write_raster(
         original_raster,
@@ -0,0 +1,339 @@
+import cv2
+import numpy as np
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+from rasterio.windows import from_bounds
+from eot.crs.crs import EPSG_3857
+from eot.rasters.raster import Raster
+from eot.rasters.raster_driver import get_driver
+from eot.rasters.raster_geo_data import get_default_geo_transform
+from eot.rasters.raster_writing import write_numpy_as_raster
+from eot.tiles.image_pixel_tile import ImagePixelTile
+from eot.tiles.mercator_tile import MercatorTile
+from eot.tools.aggregation.aggregation_engine import AggregationSink
+from eot.tools.aggregation.image_aggregation.pixel_projection import (
+    _compute_tile_category_pixels,
+    _filter_raster_pixels,
+    _get_category_colors,
+    _get_category_luts,
+    _get_tile_class,
+    _print_aggregation_msg,
+)
+from eot.utility.np_ext import get_non_black_pixel_indices
+
+
+class PreviewGeometry:
+    """Georeferenced pixel grid of a preview (i.e. a downsampled version of
+    the grid used by the pixel projection).
+
+    Local tiles are aggregated w.r.t. the (downsampled) original raster and
+    mercator tiles w.r.t. the (downsampled) normalized raster. In contrast
+    to the full resolution images, mercator previews are not reprojected
+    to the crs of the original raster.
+    """
+
+    def __init__(self, original_raster, tile_class, max_size):
+        assert max_size > 0
+        if tile_class == ImagePixelTile:
+            transform, crs = original_raster.get_geo_transform_with_crs()
+            width, height = original_raster.width, original_raster.height
+        elif tile_class == MercatorTile:
+            crs = EPSG_3857
+            transform, width, height = get_default_geo_transform(
+                original_raster, crs
+            )
+        else:
+            assert False
+        self.scale = max(1.0, max(width, height) / max_size)
+        self.width = max(1, round(width / self.scale))
+        self.height = max(1, round(height / self.scale))
+        self.transform = transform * Affine.scale(
+            width / self.width, height / self.height
+        )
+        self.crs = crs
+        self.tile_class = tile_class
+        self.source_width = width
+        self.source_height = height
+
+    def get_tile_rectangle(self, tile):
+        """Return the area (x_min, y_min, x_max, y_max) of the tile in the
+        preview. Rounding the tile corners (instead of the tile sizes) keeps
+        adjacent tiles adjacent.
+
+        Returns None for mercator tiles, which are not (completely)
+        contained in the normalized raster (see
+        _compute_tile_raster_pixels()).
+        """
+        if self.tile_class == ImagePixelTile:
+            x_offset, y_offset = tile.get_source_offset()
+            width, height = tile.get_source_size()
+            col_min = x_offset / self.scale
+            row_min = y_offset / self.scale
+            col_max = (x_offset + width) / self.scale
+            row_max = (y_offset + height) / self.scale
+        elif self.tile_class == MercatorTile:
+            left, bottom, right, top = tile.get_bounds_crs(self.crs)
+            window = from_bounds(left, bottom, right, top, self.transform)
+            col_min = window.col_off
+            row_min = window.row_off
+            col_max = window.col_off + window.width
+            row_max = window.row_off + window.height
+            x_scale = self.source_width / self.width
+            y_scale = self.source_height / self.height
+            if (
+                col_min < 0
+                or row_min < 0
+                or col_max * x_scale >= self.source_width
+                or row_max * y_scale >= self.source_height
+            ):
+                return None
+        else:
+            assert False
+        return (
+            round(col_min),
+            round(row_min),
+            round(col_max),
+            round(row_max),
+        )
+
+
+def _read_preview_raster_data(original_raster, geometry, resampling):
+    """Read the original raster at (roughly) the resolution of the preview.
+
+    Reading with a reduced output shape lets GDAL use the overviews of the
+    raster (if available) instead of reading the full resolution data.
+    """
+    # NB: For local tiles, the read data matches the preview grid
+    read_width = max(1, round(original_raster.width / geometry.scale))
+    read_height = max(1, round(original_raster.height / geometry.scale))
+    raster_data = original_raster.read(
+        out_shape=(original_raster.count, read_height, read_width),
+        resampling=Resampling.average,
+    )
+    if geometry.tile_class == MercatorTile:
+        transform, crs = original_raster.get_geo_transform_with_crs()
+        read_transform = transform * Affine.scale(
+            original_raster.width / read_width,
+            original_raster.height / read_height,
+        )
+        preview_data = np.zeros(
+            (original_raster.count, geometry.height, geometry.width),
+            dtype=raster_data.dtype,
+        )
+        reproject(
+            source=raster_data,
+            destination=preview_data,
+            src_transform=read_transform,
+            src_crs=crs,
+            dst_transform=geometry.transform,
+            dst_crs=geometry.crs,
+            resampling=resampling,
+        )
+        raster_data = preview_data
+    # channel, height, width -> height, width, channel
+    raster_data = np.moveaxis(raster_data, 0, 2)
+    return Raster._add_alpha_channel(raster_data, image_axis_order=True)
+
+
+def _write_preview(ofp, preview_data, geometry):
+    driver = get_driver(ofp, check_driver=False)
+    assert driver in ["GTiff", "PNG", "JPEG"], driver
+    kwargs = {}
+    if driver == "JPEG" and preview_data.ndim == 3:
+        # JPEG does not support an alpha channel
+        preview_data = preview_data[:, :, :3]
+    if driver in ["PNG", "JPEG"]:
+        # https://gdal.org/drivers/raster/png.html#creation-options
+        kwargs["WORLDFILE"] = "YES"
+    write_numpy_as_raster(
+        preview_data,
+        ofp,
+        transform=geometry.transform,
+        crs=geometry.crs,
+        image_axis_order=True,
+        check_driver=False,
+        **kwargs,
+    )
+
+
+class PreviewSink(AggregationSink):
+    """Aggregate the tiles into downsampled (quick-look) versions of the
+    gray, color, overlay and grid images.
+
+    The longer side of the previews is at most max_size pixels. The tiles
+    are downsampled with area interpolation (the gray mask with nearest
+    neighbor interpolation to preserve the labels) and the overlay imagery
+    is read from the raster overviews. Thus, neither the full resolution
+    masks nor the full resolution raster are kept in memory.
+    """
+
+    def __init__(self, args, tiles, categories, resampling, max_size):
+        self.args = args
+        self.categories = categories
+        self.resampling = resampling
+        self.original_raster = Raster.get_from_file(args.original_raster_ifp)
+        self.geometry = PreviewGeometry(
+            self.original_raster, _get_tile_class(tiles), max_size
+        )
+        category_colors = _get_category_colors(args, categories)
+        (
+            self.is_category_lut,
+            self.color_opaque_lut,
+            self.color_alpha_lut,
+        ) = _get_category_luts(categories, category_colors)
+        height, width = self.geometry.height, self.geometry.width
+        self.preview_mask = np.zeros((height, width), dtype=np.uint8)
+        self.preview_mask_color = np.zeros((height, width, 4), dtype=np.uint8)
+        self.preview_mask_overlay = np.zeros(
+            (height, width, 4), dtype=np.uint8
+        )
+        self.preview_grid_overlay = np.zeros(
+            (height, width, 4), dtype=np.uint8
+        )
+
+    def _get_tile_labels(self, decoded_tile):
+        """Return the palette indices of the tile and the mask of the pixels
+        belonging to a category."""
+        if decoded_tile.has_palette:
+            tile_labels = decoded_tile.label_mat
+            return tile_labels, self.is_category_lut[tile_labels]
+        image_mat = decoded_tile.image_mat
+        tile_labels = np.zeros(image_mat.shape[:2], dtype=np.uint8)
+        is_category = np.zeros(image_mat.shape[:2], dtype=bool)
+        for category in self.categories:
+            category_mask = np.all(
+                image_mat[:, :, :3] == category.palette_color, axis=-1
+            )
+            tile_labels[category_mask] = category.palette_index
+            is_category[category_mask] = True
+        return tile_labels, is_category
+
+    def _compute_contour_mask(self, tile_labels):
+        height, width = tile_labels.shape
+        is_contour = np.zeros((height, width), dtype=bool)
+        for category in self.categories:
+            tile_mask = (tile_labels == category.palette_index).astype(
+                np.uint8
+            )
+            x_pix, y_pix = _compute_tile_category_pixels(
+                tile_mask, use_contours=True
+            )
+            x_pix, y_pix = _filter_raster_pixels(
+                np.asarray(x_pix, dtype=int),
+                np.asarray(y_pix, dtype=int),
+                width,
+                height,
+            )
+            is_contour[y_pix, x_pix] = True
+        return is_contour
+
+    def add_tile(self, decoded_tile):
+        tile_rectangle = self.geometry.get_tile_rectangle(decoded_tile.tile)
+        if tile_rectangle is None:
+            return
+        x_min, y_min, x_max, y_max = tile_rectangle
+        # Clip the tile area to the preview
+        p_x_min, p_y_min = max(x_min, 0), max(y_min, 0)
+        p_x_max = min(x_max, self.geometry.width)
+        p_y_max = min(y_max, self.geometry.height)
+        if p_x_min >= p_x_max or p_y_min >= p_y_max:
+            return
+        preview_slices = (slice(p_y_min, p_y_max), slice(p_x_min, p_x_max))
+        tile_slices = (
+            slice(p_y_min - y_min, p_y_max - y_min),
+            slice(p_x_min - x_min, p_x_max - x_min),
+        )
+
+        tile_labels, is_category = self._get_tile_labels(decoded_tile)
+        size = (x_max - x_min, y_max - y_min)
+        preview_labels = cv2.resize(
+            tile_labels, size, interpolation=cv2.INTER_NEAREST
+        )
+        if self.args.use_contours:
+            # Contours are computed at the preview resolution, i.e. they
+            #  remain visible
+            is_painted = self._compute_contour_mask(preview_labels)
+            tile_color = self.color_opaque_lut[preview_labels]
+            tile_overlay = self.color_alpha_lut[preview_labels]
+        else:
+            is_painted = cv2.resize(
+                is_category.astype(np.uint8),
+                size,
+                interpolation=cv2.INTER_NEAREST,
+            ).astype(bool)
+            # Area interpolation of the colors (instead of the labels)
+            #  avoids aliasing
+            tile_color = self.color_opaque_lut[tile_labels]
+            tile_color[~is_category] = 0
+            tile_color = cv2.resize(
+                tile_color, size, interpolation=cv2.INTER_AREA
+            )
+            tile_overlay = self.color_alpha_lut[tile_labels]
+            tile_overlay[~is_category] = 0
+            tile_overlay = cv2.resize(
+                tile_overlay, size, interpolation=cv2.INTER_AREA
+            )
+
+        is_painted = is_painted[tile_slices]
+        self.preview_mask[preview_slices][is_painted] = preview_labels[
+            tile_slices
+        ][is_painted]
+        self.preview_mask_color[preview_slices][is_painted] = tile_color[
+            tile_slices
+        ][is_painted]
+        self.preview_mask_overlay[preview_slices][is_painted] = tile_overlay[
+            tile_slices
+        ][is_painted]
+
+        if self.args.tile_boundary_color is not None:
+            self._paint_tile_boundary(x_min, y_min, x_max, y_max)
+
+    def _paint_tile_boundary(self, x_min, y_min, x_max, y_max):
+        boundary_color = (*self.args.tile_boundary_color, 255)
+        # The boundaries are one (preview) pixel wide
+        for image in [self.preview_mask_overlay, self.preview_grid_overlay]:
+            cv2.rectangle(
+                image,
+                (x_min, y_min),
+                (x_max - 1, y_max - 1),
+                boundary_color,
+                thickness=1,
+            )
+
+    def _overlay_with_raster(self, preview_data, raster_data):
+        overlay_data = raster_data.copy()
+        mask_non_black_pixels = get_non_black_pixel_indices(preview_data)
+        overlay_data[mask_non_black_pixels] = preview_data[
+            mask_non_black_pixels
+        ]
+        return overlay_data
+
+    def finalize(self):
+        args = self.args
+        ofp_to_preview_data = {
+            args.gray_mask_png_ofp: self.preview_mask,
+            args.color_mask_png_ofp: self.preview_mask_color,
+        }
+        if (
+            args.overlay_mask_png_ofp is not None
+            or args.overlay_grid_png_ofp is not None
+        ):
+            raster_data = _read_preview_raster_data(
+                self.original_raster, self.geometry, self.resampling
+            )
+            ofp_to_preview_data[args.overlay_mask_png_ofp] = (
+                self._overlay_with_raster(
+                    self.preview_mask_overlay, raster_data
+                )
+            )
+            ofp_to_preview_data[args.overlay_grid_png_ofp] = (
+                self._overlay_with_raster(
+                    self.preview_grid_overlay, raster_data
+                )
+            )
+        for ofp, preview_data in ofp_to_preview_data.items():
+            if ofp is None:
+                continue
+            _print_aggregation_msg(self.categories, args.masks_idp, ofp)
+            _write_preview(ofp, preview_data, self.geometry)
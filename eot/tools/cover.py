@@ -58,6 +58,17 @@ def add_parser(subparser, formatter_class):
         action="store_true",
         help="if set, union adjacent tiles, imply --type geojson",
     )
+    out.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="if set, write newline-delimited GeoJSON, imply --type geojson",
+    )
+    out.add_argument(
+        "--precision",
+        type=int,
+        help="number of decimal places of the GeoJSON coordinates"
+        " [default: 6, or unrounded with --union]",
+    )
     out.add_argument(
         "--splits",
         type=str,
@@ -240,7 +251,13 @@ def _write_covers_as_geojson(args, covers):
             os.path.dirname(args.out[i])
         ):
             os.makedirs(os.path.dirname(args.out[i]), exist_ok=True)
-        TileManager.write_tiles_as_geojson(args.out[i], cover, args.union)
+        TileManager.write_tiles_as_geojson(
+            args.out[i],
+            cover,
+            args.union,
+            ndjson=args.ndjson,
+            precision=args.precision,
+        )
 
 
 def main(args):
@@ -257,6 +274,9 @@ def main(args):
     assert not (
         args.union and args.type != "geojson"
     ), "--union imply --type geojson"
+    assert not (
+        args.ndjson and args.type != "geojson"
+    ), "--ndjson imply --type geojson"
     assert (
         int(args.bbox is not None)
         + int(args.dir is not None)
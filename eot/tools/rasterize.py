@@ -1,18 +1,53 @@
+import collections
+import hashlib
 import os
+import shutil
 import sys
+import tempfile
+import uuid
+import numpy as np
 from varname import nameof
 from tqdm import tqdm
 from functools import partial
 import concurrent.futures as futures
+from rasterio.enums import Resampling
 
 from eot.tiles.image_pixel_tile import ImagePixelTile
 from eot.tiles.mercator_tile import MercatorTile
 from eot.rasters.raster import Raster
+from eot.rasters.raster_tile_data import get_raster_data_of_tile
 from eot.tiles.tile_manager import TileManager
+from eot.tiles.tile_footprint import compute_tile_footprints
+from eot.tiles.tile_writing import write_label_tile_to_file
+from eot.bounds.spatial_index import BoundsSpatialIndex
+from eot.crs.crs import CRS, EPSG_3857
 from eot.geojson_ext.geo_segmentation import GeoSegmentation
+from eot.geojson_ext.polygon_arrays import (
+    PolygonArrays,
+    merge_polygon_arrays,
+    write_polygon_arrays,
+)
 from eot.tools import initialize_category, initialize_categories
 
 from eot.utility.log import Logs
+from eot.utility.os_ext import compute_file_hash
+
+# Several partitions per worker balance the load of dense and sparse areas
+TILE_PARTITIONS_PER_WORKER = 4
+
+PER_TILE_STRATEGY = "per_tile"
+RASTER_FIRST_STRATEGY = "raster_first"
+AUTO_STRATEGY = "auto"
+RASTERIZATION_STRATEGIES = [
+    AUTO_STRATEGY,
+    PER_TILE_STRATEGY,
+    RASTER_FIRST_STRATEGY,
+]
+# Burning the polygons of each tile separately repeats the polygon setup
+#  (querying, clipping) for all tiles covered by a polygon. For densely
+#  labeled scenes, burning the label raster once is faster.
+RASTER_FIRST_MIN_POLYGONS_PER_TILE = 32
+NUM_DENSITY_SAMPLE_TILES = 64
 
 
 def add_parser(subparser, formatter_class):
@@ -45,6 +80,17 @@ def add_parser(subparser, formatter_class):
         nargs="+",
         help="path to GeoJSON features files",
     )
+    inp.add_argument(
+        "--geojson_category_ifp_list",
+        type=str,
+        nargs="+",
+        help="GeoJSON features files of several categories given as"
+        " <category_name>=<geojson_ifp> (the category names refer to"
+        " --tile_data_categories). All categories of a tile are burned at"
+        " once (categories with higher palette indices take precedence),"
+        " i.e. each tile is written exactly once. Replaces --geojson_category"
+        " and --geojson_ifp_list.",
+    )
     inp.add_argument(
         "--raster_ifp_list",
         type=str,
@@ -80,115 +126,630 @@ def add_parser(subparser, formatter_class):
     perf.add_argument(
         "--workers", type=int, help="number of workers [default: CPU]"
     )
+    perf.add_argument(
+        "--rasterization_strategy",
+        type=str,
+        choices=RASTERIZATION_STRATEGIES,
+        default=AUTO_STRATEGY,
+        help=f"{PER_TILE_STRATEGY}: burn the polygons of each tile separately."
+        f" {RASTER_FIRST_STRATEGY}: burn the polygons block by block into a"
+        " label raster (at source resolution) and cut the tiles from it"
+        " (only for local tiles of rasters with a crs, whose disk size"
+        " equals the source size and which do not exceed the raster, i.e."
+        " if the result equals the one of per_tile)."
+        f" {AUTO_STRATEGY}: choose the strategy w.r.t. the number of"
+        f" polygons per tile [default: {AUTO_STRATEGY}]",
+    )
+    perf.add_argument(
+        "--polygon_index_dp",
+        type=str,
+        help="if set, the polygons of each GeoJSON file (in the crs of the"
+        " tiles) and a spatial index of their bounds are stored in this"
+        " directory, keyed by the file content, the tile crs and the"
+        " buffer. Later runs with the same label files skip reading the"
+        " files and building the indices. The entries contain all polygons"
+        " of a file (not only the ones of the cover).",
+    )
 
     parser.set_defaults(func=main)
 
 
-def write_geojson_to_tiles(
-    odp,
-    output_tile_size_pixel,
-    tiles,
-    geojson_category,
+def _check_tile_size(args):
+    assert (
+        len(args.output_tile_size_pixel.split(",")) == 2
+    ), "--output_tile_size_pixel expect width,height value (e.g 512,512)"
+
+
+def _initialize_workers(args):
+    args.workers = (
+        min(os.cpu_count(), args.workers) if args.workers else os.cpu_count()
+    )
+    return args
+
+
+def _initialize_odp(args):
+    args.odp = os.path.expanduser(args.odp)
+    return args
+
+
+def _compute_tiles_bbox_epsg_3857(tiles, polygon_buffer):
+    """Return the bbox of the tiles, enlarged by the polygon buffer (which
+    is applied in EPSG_3857, see GeoSegmentation.add_polygon_buffer())."""
+    footprints = compute_tile_footprints(tiles, dst_crs=EPSG_3857)
+    min_x, min_y = footprints.min(axis=(0, 1))
+    max_x, max_y = footprints.max(axis=(0, 1))
+    margin = abs(polygon_buffer) if polygon_buffer else 0
+    return min_x - margin, min_y - margin, max_x + margin, max_y + margin
+
+
+def _write_geojson_polygon_arrays(
+    tile_crs,
     polygon_buffer,
-    tile_data_categories,
-    append_labels,
-    show_progress,
+    tiles_bbox_epsg_3857,
+    polygon_arrays_odp,
+    geojson_category,
     geojson_ifp,
 ):
-    # TODO use args.workers
+    """Read the polygons of the GeoJSON file and write them (in the crs of
+    the tiles) as polygon arrays, which are memory-mapped by the workers."""
+    # NB: Polygons outside of the tiles are skipped while reading the file
     geo_segmentation = GeoSegmentation.from_geojson_file(
-        geojson_ifp, category_name=geojson_category.name
+        geojson_ifp,
+        bbox=tiles_bbox_epsg_3857,
+        bbox_crs=EPSG_3857,
+        category_name=geojson_category.name,
     )
     if polygon_buffer:
         geo_segmentation.add_polygon_buffer(polygon_buffer)
+    write_polygon_arrays(
+        geo_segmentation.get_polygons(tile_crs), polygon_arrays_odp
+    )
 
-    category_palette_colors = tile_data_categories.get_category_palette_colors(
-        only_active=False, include_ignore=False
+
+def _get_polygon_index_entry_dp(
+    polygon_index_dp, tile_crs, polygon_buffer, geojson_ifp
+):
+    """Return the directory of the polygon arrays (and the spatial index) of
+    the GeoJSON file, which is keyed by the file content, the crs of the
+    tiles and the buffer."""
+    key_str = "|".join(
+        [
+            compute_file_hash(os.path.expanduser(geojson_ifp)),
+            CRS.from_user_input(tile_crs).to_string(),
+            str(polygon_buffer),
+        ]
     )
+    key = hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+    return os.path.join(polygon_index_dp, key)
 
-    geo_segmentation.write_to_tiles(
+
+def _write_geojson_polygon_index_entry(
+    tile_crs,
+    polygon_buffer,
+    entry_dp,
+    geojson_category,
+    geojson_ifp,
+):
+    """Write the polygon arrays of all polygons of the GeoJSON file together
+    with a persistent spatial index of their bounds."""
+    # NB: The entry is moved into place once it is complete, i.e. concurrent
+    #  runs never read partial entries
+    tmp_dp = f"{entry_dp}.{uuid.uuid4().hex}.tmp"
+    try:
+        _write_geojson_polygon_arrays(
+            tile_crs,
+            polygon_buffer,
+            None,
+            tmp_dp,
+            geojson_category,
+            geojson_ifp,
+        )
+        polygon_arrays = PolygonArrays(tmp_dp)
+        BoundsSpatialIndex.from_bounds(
+            polygon_arrays.bounds,
+            index_fp_stem=polygon_arrays.bounds_index_fp_stem,
+        ).close()
+        try:
+            os.rename(tmp_dp, entry_dp)
+        except OSError:
+            # The entry has been written by a concurrent run
+            pass
+    finally:
+        if os.path.isdir(tmp_dp):
+            shutil.rmtree(tmp_dp)
+
+
+def _load_category_polygons_list(palette_index_with_polygon_arrays_idp_list):
+    category_polygons_list = []
+    for (
+        palette_index,
+        polygon_arrays_idp,
+    ) in palette_index_with_polygon_arrays_idp_list:
+        polygon_arrays = PolygonArrays(polygon_arrays_idp)
+        category_polygons = (
+            palette_index,
+            polygon_arrays,
+            polygon_arrays.bounds,
+        )
+        bounds_index_fp_stem = polygon_arrays.bounds_index_fp_stem
+        if BoundsSpatialIndex.exists(bounds_index_fp_stem):
+            category_polygons += (
+                BoundsSpatialIndex.read_from_file(bounds_index_fp_stem),
+            )
+        category_polygons_list.append(category_polygons)
+    return category_polygons_list
+
+
+def _write_polygon_arrays_to_tiles(
+    odp,
+    output_tile_size_pixel,
+    tile_data_categories,
+    append_labels,
+    palette_index_with_polygon_arrays_idp_list,
+    tiles,
+):
+    compiled_categories = tile_data_categories.compile(
+        only_active=False, include_ignore=False
+    )
+    GeoSegmentation.write_category_polygons_to_tiles(
         odp=odp,
         tile_size=output_tile_size_pixel,
         tiles=tiles,
         append_labels=append_labels,
-        palette_colors=category_palette_colors,
-        burn_color=geojson_category.palette_index,
-        show_progress=show_progress,
+        palette_colors=compiled_categories,
+        category_polygons_list=_load_category_polygons_list(
+            palette_index_with_polygon_arrays_idp_list
+        ),
     )
+    return len(tiles)
 
 
-def _check_tile_size(args):
-    assert (
-        len(args.output_tile_size_pixel.split(",")) == 2
-    ), "--output_tile_size_pixel expect width,height value (e.g 512,512)"
+def _write_polygon_arrays_to_label_raster(
+    palette_index_with_polygon_arrays_idp_list,
+    label_raster_ofp,
+    raster_ifp,
+):
+    with Raster.get_from_file(raster_ifp) as raster:
+        GeoSegmentation.write_category_polygons_to_raster_block_wise(
+            label_raster_ofp,
+            raster,
+            _load_category_polygons_list(
+                palette_index_with_polygon_arrays_idp_list
+            ),
+        )
 
 
-def _initialize_workers(args):
-    args.workers = (
-        min(os.cpu_count(), args.workers) if args.workers else os.cpu_count()
+def _write_label_raster_tiles(
+    odp,
+    tile_data_categories,
+    append_labels,
+    raster_name_to_label_raster_ifp,
+    tiles,
+):
+    """Cut the tiles from the label rasters (like the tiles of the images,
+    see get_raster_data_of_tile())."""
+    compiled_categories = tile_data_categories.compile(
+        only_active=False, include_ignore=False
     )
-    return args
+    raster_name_to_label_raster = {}
+    for tile in tiles:
+        raster_name = tile.get_raster_name()
+        if raster_name not in raster_name_to_label_raster:
+            raster_name_to_label_raster[raster_name] = Raster.get_from_file(
+                raster_name_to_label_raster_ifp[raster_name]
+            )
+        label_data = get_raster_data_of_tile(
+            raster_name_to_label_raster[raster_name],
+            tile,
+            bands=[1],
+            resampling=Resampling.nearest,
+        )
+        write_label_tile_to_file(
+            odp,
+            tile,
+            label_data,
+            compiled_categories,
+            append=append_labels,
+        )
+    for label_raster in raster_name_to_label_raster.values():
+        label_raster.close()
+    return len(tiles)
+
+
+def _get_category_with_geojson_ifp_list(args):
+    if args.geojson_category_ifp_list is None:
+        assert args.geojson_category is not None
+        assert args.geojson_ifp_list is not None
+        return [
+            (args.geojson_category, geojson_ifp)
+            for geojson_ifp in args.geojson_ifp_list
+        ]
+    msg = "--geojson_category_ifp_list replaces --geojson_category and"
+    msg += " --geojson_ifp_list"
+    assert args.geojson_category is None, msg
+    assert args.geojson_ifp_list is None, msg
+    category_with_geojson_ifp_list = []
+    for category_with_geojson_ifp in args.geojson_category_ifp_list:
+        msg = f"Invalid category file: {category_with_geojson_ifp}"
+        assert "=" in category_with_geojson_ifp, msg
+        category_name, geojson_ifp = category_with_geojson_ifp.split("=", 1)
+        category = args.tile_data_categories.get_category(category_name)
+        assert category is not None, f"Unknown category: {category_name}"
+        category_with_geojson_ifp_list.append((category, geojson_ifp))
+    return category_with_geojson_ifp_list
+
+
+def _partition_tiles(tiles, num_partitions):
+    """Split the tiles into spatially compact partitions (i.e. consecutive
+    tiles of the rows from top to bottom)."""
+    tile_bounds_array = np.array(
+        [tile.compute_bounds_in_crs() for tile in tiles], dtype=np.float64
+    )
+    tile_order = np.lexsort(
+        (tile_bounds_array[:, 0], -tile_bounds_array[:, 3])
+    )
+    return [
+        [tiles[index] for index in partition_indices]
+        for partition_indices in np.array_split(tile_order, num_partitions)
+        if len(partition_indices) > 0
+    ]
 
 
-def _initialize_odp(args):
-    args.odp = os.path.expanduser(args.odp)
-    return args
+def _write_polygon_arrays(
+    args, tiles, category_with_geojson_ifp_list, polygon_arrays_odp, log
+):
+    """Read the GeoJSON files (in parallel) and return the polygon arrays
+    (of the polygons of the tiles) per palette index."""
+    tile_crs = tiles[0].get_crs()
+    tiles_bbox_epsg_3857 = _compute_tiles_bbox_epsg_3857(tiles, args.buffer)
+    categories, geojson_ifps = zip(*category_with_geojson_ifp_list)
+    file_workers = min(args.workers, len(geojson_ifps))
+    log.info(
+        "neo rasterize - Read GeoJSON files with {} workers".format(
+            file_workers
+        )
+    )
+    polygon_arrays_dps = [
+        os.path.join(polygon_arrays_odp, str(index))
+        for index in range(len(geojson_ifps))
+    ]
+    with futures.ProcessPoolExecutor(file_workers) as executor:
+        for _ in tqdm(
+            executor.map(
+                partial(
+                    _write_geojson_polygon_arrays,
+                    tile_crs,
+                    args.buffer,
+                    tiles_bbox_epsg_3857,
+                ),
+                polygon_arrays_dps,
+                categories,
+                geojson_ifps,
+            ),
+            total=len(geojson_ifps),
+            disable=len(geojson_ifps) == 1,
+            ascii=True,
+            unit="file",
+        ):
+            pass
+
+    # The polygons of all files of a category are burned at once, i.e.
+    #  the files do not overwrite the labels of each other
+    palette_index_to_polygon_arrays_dps = collections.defaultdict(list)
+    for category, polygon_arrays_dp in zip(categories, polygon_arrays_dps):
+        palette_index_to_polygon_arrays_dps[category.palette_index].append(
+            polygon_arrays_dp
+        )
+    palette_index_with_polygon_arrays_dp_list = []
+    # NB: Categories with higher palette indices are burned last, i.e.
+    #  take precedence (like appending the labels of the categories)
+    for palette_index in sorted(palette_index_to_polygon_arrays_dps):
+        category_polygon_arrays_dps = palette_index_to_polygon_arrays_dps[
+            palette_index
+        ]
+        if len(category_polygon_arrays_dps) == 1:
+            polygon_arrays_dp = category_polygon_arrays_dps[0]
+        else:
+            polygon_arrays_dp = os.path.join(
+                polygon_arrays_odp, f"merged_{palette_index}"
+            )
+            merge_polygon_arrays(
+                category_polygon_arrays_dps, polygon_arrays_dp
+            )
+        palette_index_with_polygon_arrays_dp_list.append(
+            (palette_index, polygon_arrays_dp)
+        )
+    return palette_index_with_polygon_arrays_dp_list
 
 
-def _compute_geojson_rasterization(
-    args, output_tile_size_pixel, tiles, geojson_category, log
+def _get_polygon_index_entries(
+    args, tiles, category_with_geojson_ifp_list, log
 ):
-    workers = min(args.workers, len(args.geojson_ifp_list))
+    """Return the (persistent) polygon arrays with spatial indices of the
+    GeoJSON files per palette index. Missing entries are created (in
+    parallel)."""
+    tile_crs = tiles[0].get_crs()
+    os.makedirs(args.polygon_index_dp, exist_ok=True)
+    categories, geojson_ifps = zip(*category_with_geojson_ifp_list)
+    entry_dps = [
+        _get_polygon_index_entry_dp(
+            args.polygon_index_dp, tile_crs, args.buffer, geojson_ifp
+        )
+        for geojson_ifp in geojson_ifps
+    ]
+    missing_indices = [
+        index
+        for index, entry_dp in enumerate(entry_dps)
+        if not os.path.isdir(entry_dp)
+    ]
     log.info(
-        "neo rasterize - Compute spatial index with {} workers".format(workers)
+        f"neo rasterize - Reuse {len(entry_dps) - len(missing_indices)} of"
+        + f" {len(entry_dps)} polygon indices in {args.polygon_index_dp}"
     )
+    if len(missing_indices) > 0:
+        file_workers = min(args.workers, len(missing_indices))
+        with futures.ProcessPoolExecutor(file_workers) as executor:
+            for _ in tqdm(
+                executor.map(
+                    partial(
+                        _write_geojson_polygon_index_entry,
+                        tile_crs,
+                        args.buffer,
+                    ),
+                    [entry_dps[index] for index in missing_indices],
+                    [categories[index] for index in missing_indices],
+                    [geojson_ifps[index] for index in missing_indices],
+                ),
+                total=len(missing_indices),
+                disable=len(missing_indices) == 1,
+                ascii=True,
+                unit="file",
+            ):
+                pass
+    for entry_dp in entry_dps:
+        # Outdated (or incomplete) indices are rebuilt
+        polygon_arrays = PolygonArrays(entry_dp)
+        BoundsSpatialIndex.get_from_file_or_bounds(
+            polygon_arrays.bounds_index_fp_stem, polygon_arrays.bounds
+        ).close()
+    # NB: The files of a category are burned one after another with the same
+    #  color (i.e. like merged files), the entries are not merged to keep
+    #  their indices. Categories with higher palette indices are burned last.
+    palette_index_with_entry_dp_list = [
+        (category.palette_index, entry_dp)
+        for category, entry_dp in zip(categories, entry_dps)
+    ]
+    palette_index_with_entry_dp_list.sort(key=lambda entry: entry[0])
+    return palette_index_with_entry_dp_list
 
-    if len(args.geojson_ifp_list) > 1:
-        # Configure progress visualization for multiple files
-        progress = tqdm(
-            total=len(args.geojson_ifp_list), ascii=True, unit="file"
+
+def _compute_geojson_rasterization(
+    args, output_tile_size_pixel, tiles, category_with_geojson_ifp_list, log
+):
+    with tempfile.TemporaryDirectory(
+        prefix=".polygon_arrays_", dir=args.odp
+    ) as polygon_arrays_tmp_dp:
+        # Step 1: Read the GeoJSON files (or the persistent polygon indices)
+        if args.polygon_index_dp is None:
+            palette_index_with_polygon_arrays_dp_list = _write_polygon_arrays(
+                args,
+                tiles,
+                category_with_geojson_ifp_list,
+                polygon_arrays_tmp_dp,
+                log,
+            )
+        else:
+            palette_index_with_polygon_arrays_dp_list = (
+                _get_polygon_index_entries(
+                    args, tiles, category_with_geojson_ifp_list, log
+                )
+            )
+
+        # Step 2: Rasterize the (memory-mapped) polygons (in parallel)
+        rasterization_strategy = _select_rasterization_strategy(
+            args, tiles, palette_index_with_polygon_arrays_dp_list, log
         )
-        show_multiple_file_progress = True
-        show_single_file_progress = False
+        if rasterization_strategy == RASTER_FIRST_STRATEGY:
+            _rasterize_raster_first(
+                args,
+                tiles,
+                palette_index_with_polygon_arrays_dp_list,
+                polygon_arrays_tmp_dp,
+                log,
+            )
+        else:
+            _rasterize_per_tile(
+                args,
+                output_tile_size_pixel,
+                tiles,
+                palette_index_with_polygon_arrays_dp_list,
+                log,
+            )
+
+
+def _estimate_num_polygons_per_tile(
+    tiles, palette_index_with_polygon_arrays_dp_list
+):
+    """Estimate the number of polygons per tile (using the polygon bounds of
+    a sample of the tiles)."""
+    sample_indices = np.random.default_rng(0).choice(
+        len(tiles),
+        size=min(len(tiles), NUM_DENSITY_SAMPLE_TILES),
+        replace=False,
+    )
+    sample_tile_bounds_array = np.array(
+        [tiles[index].compute_bounds_in_crs() for index in sample_indices],
+        dtype=np.float64,
+    )
+    num_polygons = 0
+    for _, polygon_arrays_dp in palette_index_with_polygon_arrays_dp_list:
+        polygon_bounds_array = PolygonArrays(polygon_arrays_dp).bounds
+        for tile_bounds in sample_tile_bounds_array:
+            num_polygons += np.count_nonzero(
+                (polygon_bounds_array[:, 0] <= tile_bounds[2])
+                & (polygon_bounds_array[:, 1] <= tile_bounds[3])
+                & (polygon_bounds_array[:, 2] >= tile_bounds[0])
+                & (polygon_bounds_array[:, 3] >= tile_bounds[1])
+            )
+    return num_polygons / len(sample_tile_bounds_array)
+
+
+def _supports_raster_first(tiles, raster_ifp_list):
+    """Check that cutting the tiles from label rasters (at source
+    resolution) yields the same labels as burning each tile, i.e. that the
+    tiles are neither resampled nor exceed their raster."""
+    if not isinstance(tiles[0], ImagePixelTile) or tiles[0].get_crs() is None:
+        return False
+    raster_name_to_size = {}
+    for raster_ifp in raster_ifp_list:
+        with Raster.get_from_file(raster_ifp) as raster:
+            raster_name = os.path.splitext(os.path.basename(raster_ifp))[0]
+            raster_name_to_size[raster_name] = (raster.width, raster.height)
+    for tile in tiles:
+        if tuple(tile.get_disk_size()) != tuple(tile.get_source_size()):
+            return False
+        raster_width, raster_height = raster_name_to_size[
+            tile.get_raster_name()
+        ]
+        x_offset, y_offset, x_end_coord, y_end_coord = (
+            tile.get_source_rectangle()
+        )
+        if (
+            x_offset < 0
+            or y_offset < 0
+            or x_end_coord >= raster_width
+            or y_end_coord >= raster_height
+        ):
+            return False
+    return True
+
+
+def _select_rasterization_strategy(
+    args, tiles, palette_index_with_polygon_arrays_dp_list, log
+):
+    if args.rasterization_strategy == PER_TILE_STRATEGY:
+        return PER_TILE_STRATEGY
+    supports_raster_first = _supports_raster_first(tiles, args.raster_ifp_list)
+    if args.rasterization_strategy == RASTER_FIRST_STRATEGY:
+        msg = f"{RASTER_FIRST_STRATEGY} requires local tiles of rasters with"
+        msg += " a crs, whose disk size equals the source size and which do"
+        msg += " not exceed the raster"
+        assert supports_raster_first, msg
+        return RASTER_FIRST_STRATEGY
+    assert args.rasterization_strategy == AUTO_STRATEGY
+    if not supports_raster_first:
+        log.info(
+            f"neo rasterize - {RASTER_FIRST_STRATEGY} is not applicable to"
+            + f" the tiles, using strategy {PER_TILE_STRATEGY}"
+        )
+        return PER_TILE_STRATEGY
+    num_polygons_per_tile = _estimate_num_polygons_per_tile(
+        tiles, palette_index_with_polygon_arrays_dp_list
+    )
+    if num_polygons_per_tile >= RASTER_FIRST_MIN_POLYGONS_PER_TILE:
+        rasterization_strategy = RASTER_FIRST_STRATEGY
     else:
-        # Configure progress visualization for single files
-        progress = None
-        show_multiple_file_progress = False
-        show_single_file_progress = True
-
-    with futures.ProcessPoolExecutor(workers) as executor:
-        # Option 1:
-        # for geojson_ifp in args.geojson_ifp_list:
-        #     write_geojson_to_tiles(
-        #         odp=args.odp,
-        #         output_tile_size_pixel=output_tile_size_pixel,
-        #         tiles=tiles,
-        #         geojson_category=geojson_category,
-        #         polygon_buffer=args.buffer,
-        #         tile_data_categories=args.tile_data_categories,
-        #         append_labels=args.append_labels,
-        #         show_progress=show_single_file_progress,
-        #         geojson_ifp=geojson_ifp,
-        #     )
-        # Option 2:
-        for _ in executor.map(
+        rasterization_strategy = PER_TILE_STRATEGY
+    log.info(
+        f"neo rasterize - {num_polygons_per_tile:.1f} polygons per tile"
+        + f" (estimated), using strategy {rasterization_strategy}"
+    )
+    return rasterization_strategy
+
+
+def _rasterize_per_tile(
+    args,
+    output_tile_size_pixel,
+    tiles,
+    palette_index_with_polygon_arrays_dp_list,
+    log,
+):
+    """Rasterize the polygons to partitions of the tiles."""
+    tile_partitions = _partition_tiles(
+        tiles, min(len(tiles), args.workers * TILE_PARTITIONS_PER_WORKER)
+    )
+    log.info(
+        f"neo rasterize - Rasterize {len(tile_partitions)} tile"
+        + f" partitions with {args.workers} workers"
+    )
+    with futures.ProcessPoolExecutor(args.workers) as executor:
+        progress = tqdm(total=len(tiles), ascii=True, unit="tile")
+        for num_tiles in executor.map(
             partial(
-                write_geojson_to_tiles,
+                _write_polygon_arrays_to_tiles,
                 args.odp,
                 output_tile_size_pixel,
-                tiles,
-                geojson_category,
-                args.buffer,
                 args.tile_data_categories,
                 args.append_labels,
-                show_single_file_progress,
+                palette_index_with_polygon_arrays_dp_list,
             ),
-            args.geojson_ifp_list,
+            tile_partitions,
         ):
-            if show_multiple_file_progress:
-                progress.update()
-        if show_multiple_file_progress:
-            progress.close()
+            progress.update(num_tiles)
+        progress.close()
+
+
+def _rasterize_raster_first(
+    args,
+    tiles,
+    palette_index_with_polygon_arrays_dp_list,
+    label_raster_odp,
+    log,
+):
+    """Rasterize the polygons into (temporary) label rasters of the source
+    rasters and cut the tiles from the label rasters."""
+    raster_name_to_raster_ifp = {
+        os.path.splitext(os.path.basename(raster_ifp))[0]: raster_ifp
+        for raster_ifp in args.raster_ifp_list
+    }
+    raster_names = sorted({tile.get_raster_name() for tile in tiles})
+    raster_name_to_label_raster_ifp = {
+        raster_name: os.path.join(label_raster_odp, f"{raster_name}.tif")
+        for raster_name in raster_names
+    }
+    log.info(
+        f"neo rasterize - Rasterize {len(raster_names)} label rasters with"
+        + f" {args.workers} workers"
+    )
+    with futures.ProcessPoolExecutor(args.workers) as executor:
+        for _ in tqdm(
+            executor.map(
+                partial(
+                    _write_polygon_arrays_to_label_raster,
+                    palette_index_with_polygon_arrays_dp_list,
+                ),
+                [
+                    raster_name_to_label_raster_ifp[raster_name]
+                    for raster_name in raster_names
+                ],
+                [
+                    raster_name_to_raster_ifp[raster_name]
+                    for raster_name in raster_names
+                ],
+            ),
+            total=len(raster_names),
+            ascii=True,
+            unit="raster",
+        ):
+            pass
+
+    tile_partitions = _partition_tiles(
+        tiles, min(len(tiles), args.workers * TILE_PARTITIONS_PER_WORKER)
+    )
+    with futures.ProcessPoolExecutor(args.workers) as executor:
+        progress = tqdm(total=len(tiles), ascii=True, unit="tile")
+        for num_tiles in executor.map(
+            partial(
+                _write_label_raster_tiles,
+                args.odp,
+                args.tile_data_categories,
+                args.append_labels,
+                raster_name_to_label_raster_ifp,
+            ),
+            tile_partitions,
+        ):
+            progress.update(num_tiles)
+        progress.close()
 
 
 def _log_rasterizing_info(args, category_names, log, log_source):
@@ -260,15 +821,18 @@ def main(args):
     category_names = args.tile_data_categories.get_category_names(
         only_active=False, include_ignore=True
     )
-    if len(args.geojson_ifp_list) == 1:
-        log_source = args.geojson_ifp_list
+    category_with_geojson_ifp_list = _get_category_with_geojson_ifp_list(args)
+    if len(category_with_geojson_ifp_list) == 1:
+        log_source = [category_with_geojson_ifp_list[0][1]]
     else:
-        log_source = "{} geojson files".format(len(args.geojson_ifp_list))
+        log_source = "{} geojson files".format(
+            len(category_with_geojson_ifp_list)
+        )
     _compute_geojson_rasterization(
         args=args,
         output_tile_size_pixel=output_tile_size_pixel,
         tiles=tiles,
-        geojson_category=args.geojson_category,
+        category_with_geojson_ifp_list=category_with_geojson_ifp_list,
         log=log,
     )
 
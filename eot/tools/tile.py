@@ -20,9 +20,22 @@ from eot.tiles.tile_writing import (
 from eot.tiles.image_pixel_tile import ImagePixelTile
 from eot.tiles.tiling_scheme import TilingSchemes
 from eot.tiles.tile_path_manager import TilePathManager
+from eot.tiles.tile_path_layout import (
+    TILE_PATH_LAYOUT_NAMES,
+    create_tile_path_layout,
+)
 from eot.tiles.tile_manager import TileManager
+from eot.tiles.tile_writer_service import TileWriterService
+from eot.tiles.tile_footprint import write_tile_footprints_as_polygon_files
 from eot.tiles.tiling_result import RasterTilingResults
+from eot.tiles.tiling_plan import (
+    compute_tiling_plan,
+    write_tiling_plan_as_json,
+)
 from eot.rasters.raster import Raster
+from eot.rasters.raster_cache import NormalizedRasterCache
+from eot.tiles.mercator_tile import MercatorTile
+from eot.crs.crs import EPSG_3857
 from eot.tools.aggregation.geojson_aggregation import create_grid_geojson
 from eot.utility.os_ext import makedirs_safely
 from eot.tools import initialize_categories
@@ -167,6 +180,27 @@ def add_parser(subparser, formatter_class):
         required=True,
         help="output directory path [required]",
     )
+    out.add_argument(
+        "--plan_only",
+        action="store_true",
+        help="if set, only print the planned tiling and its estimated costs"
+        " as json (without reading any pixel data)",
+    )
+    out.add_argument(
+        "--tile_path_layout",
+        type=str,
+        default="default",
+        choices=TILE_PATH_LAYOUT_NAMES,
+        help="directory layout of the tiles (stored in the dataset"
+        " descriptor) [default: default]",
+    )
+    out.add_argument(
+        "--max_tiles_per_dir",
+        type=int,
+        default=4096,
+        help="upper bound of entries per directory for the hashed and"
+        " quadkey tile path layouts [default: 4096]",
+    )
     lab = parser.add_argument_group("Labels")
     lab.add_argument(
         "--write_labels",
@@ -182,6 +216,38 @@ def add_parser(subparser, formatter_class):
     perf.add_argument(
         "--workers", type=int, help="number of workers [default: raster files]"
     )
+    perf.add_argument(
+        "--io_workers",
+        type=int,
+        default=4,
+        help="number of threads writing the tiles [default: 4]",
+    )
+    perf.add_argument(
+        "--io_max_in_flight_mb",
+        type=int,
+        default=256,
+        help="maximal size of tile buffers waiting to be written"
+        " [default: 256]",
+    )
+    perf.add_argument(
+        "--io_fadvise",
+        action="store_true",
+        help="if set, drop written tiles from the page cache",
+    )
+    perf.add_argument(
+        "--normalized_raster_cache_dp",
+        type=str,
+        help="if set, mercator tiles are read from normalized (EPSG:3857)"
+        " rasters cached in this directory, i.e. repeated tilings of the"
+        " same raster skip the reprojection",
+    )
+    perf.add_argument(
+        "--normalized_raster_cache_max_mb",
+        type=int,
+        default=10240,
+        help="maximal size of the normalized raster cache (least recently"
+        " used rasters are removed first) [default: 10240]",
+    )
 
     debug = parser.add_argument_group("Labels")
     debug.add_argument(
@@ -286,11 +352,49 @@ def _initialize_workers(args):
     return args
 
 
+def _initialize_normalized_raster_cache(args):
+    if args.normalized_raster_cache_dp is None:
+        args.normalized_raster_cache = None
+    else:
+        args.normalized_raster_cache = NormalizedRasterCache(
+            args.normalized_raster_cache_dp,
+            max_size_bytes=args.normalized_raster_cache_max_mb * 1024**2,
+        )
+    return args
+
+
+def _get_tiling_raster_fp(args, raster_fp, tiles, resampling_method):
+    # Only the data of mercator tiles is warped to EPSG:3857
+    if args.normalized_raster_cache is None or not tiles:
+        return raster_fp
+    if not isinstance(tiles[0], MercatorTile):
+        return raster_fp
+    return args.normalized_raster_cache.get_normalized_raster_fp(
+        raster_fp, dst_crs=EPSG_3857, resampling=resampling_method
+    )
+
+
 def _initialize_out(args):
     args.out = os.path.expanduser(args.out)
     return args
 
 
+def _initialize_tile_path_layout(args, total_tile_number):
+    if args.tile_path_layout == "quadkey":
+        # NB: Quadkeys are only defined for mercator tiles
+        msg = (
+            "--tile_path_layout quadkey requires a mercator tiling scheme,"
+            + f" but got {args.tiling_scheme.__class__.__name__}"
+        )
+        assert args.tiling_scheme.represents_mercator_tiling(), msg
+    args.tile_path_layout = create_tile_path_layout(
+        args.tile_path_layout,
+        num_tiles=total_tile_number,
+        max_dir_entries=args.max_tiles_per_dir,
+    )
+    return args
+
+
 def _initialize_tiling_scheme(args):
     tiling_scheme = TilingSchemes[args.tiling_scheme].value
     if tiling_scheme.represents_mercator_tiling():
@@ -435,9 +539,29 @@ def _write_tile_data_to_disk(
     palette_colors,
     create_aux_file,
     create_polygon_file,
+    tile_path_layout=None,
+    tile_writer=None,
 ):
-
-    if write_labels:
+    if tile_writer is not None:
+        if write_labels:
+            tile_writer.submit_label_tile(
+                odp,
+                geo_tile,
+                tile_data,
+                palette_colors,
+                create_aux_file=create_aux_file,
+                create_polygon_file=create_polygon_file,
+            )
+        else:
+            tile_writer.submit_image_tile(
+                odp,
+                geo_tile,
+                tile_data,
+                ext=".jpg",
+                create_aux_file=create_aux_file,
+                create_polygon_file=create_polygon_file,
+            )
+    elif write_labels:
         write_label_tile_to_file(
             odp,
             geo_tile,
@@ -445,6 +569,7 @@ def _write_tile_data_to_disk(
             palette_colors,
             create_aux_file=create_aux_file,
             create_polygon_file=create_polygon_file,
+            tile_path_layout=tile_path_layout,
         )
     else:
         write_image_tile_to_file(
@@ -454,6 +579,7 @@ def _write_tile_data_to_disk(
             ext=".jpg",
             create_aux_file=create_aux_file,
             create_polygon_file=create_polygon_file,
+            tile_path_layout=tile_path_layout,
         )
 
 
@@ -490,15 +616,26 @@ def _perform_image_or_label_tiling(
     create_polygon_files,
     temp_splits_dp,
     progress,
+    tile_writer=None,
 ):
     if args.write_labels:
         resampling_method = Resampling.nearest
     else:
         resampling_method = Resampling.bilinear
 
+    if args.write_labels:
+        palette_colors = args.categories.compile(
+            only_active=False, include_ignore=False
+        )
+    else:
+        palette_colors = None
+
     tiled_by_worker = []
     worker_specific_tiles = raster_fp_to_tiles[raster_fp]
-    with Raster.get_from_file(raster_fp) as raster:
+    tiling_raster_fp = _get_tiling_raster_fp(
+        args, raster_fp, worker_specific_tiles, resampling_method
+    )
+    with Raster.get_from_file(tiling_raster_fp) as raster:
 
         for tile in worker_specific_tiles:
             odp = _compute_odp(
@@ -534,14 +671,6 @@ def _perform_image_or_label_tiling(
                 or tile_data_is_valid
                 or tile_is_in_multiple_rasters
             ):
-                if args.write_labels:
-                    palette_colors = (
-                        args.categories.get_category_palette_colors(
-                            only_active=False, include_ignore=False
-                        )
-                    )
-                else:
-                    palette_colors = None
                 _write_tile_data_to_disk(
                     odp=odp,
                     write_labels=args.write_labels,
@@ -550,6 +679,8 @@ def _perform_image_or_label_tiling(
                     palette_colors=palette_colors,
                     create_aux_file=create_aux_files,
                     create_polygon_file=create_polygon_files,
+                    tile_path_layout=args.tile_path_layout,
+                    tile_writer=tile_writer,
                 )
                 if not tile_is_in_multiple_rasters:
                     tiled_by_worker.append(tile)
@@ -567,6 +698,7 @@ def _perform_image_or_label_tiling_with_workers(
     create_aux_files,
     create_polygon_files,
     log,
+    tile_writer=None,
 ):
     """Subdivides a set of images in images or label tiles"""
 
@@ -599,6 +731,7 @@ def _perform_image_or_label_tiling_with_workers(
                 create_polygon_files,
                 temp_splits_dp,
                 progress,
+                tile_writer,
             )
             return tiles_of_thread
 
@@ -629,6 +762,9 @@ def _perform_image_or_label_tiling_with_workers(
     perform_aggregation = tiles_are_part_of_multiple_images(tile_to_raster_fps)
     log.vinfo("perform_aggregation", perform_aggregation)
     if perform_aggregation:
+        # NB: The splitted tiles must be on disk before aggregating them
+        if tile_writer is not None:
+            tile_writer.flush()
         tiles_in_multiple_raster = _aggregate_splitted_tiles(
             temp_splits_dp,
             tile_to_raster_fps,
@@ -636,7 +772,8 @@ def _perform_image_or_label_tiling_with_workers(
             log,
             args.clear_split_data,
             args.create_aux_files,
-            args.create_polygon_files,
+            create_polygon_files,
+            tile_writer,
         )
     else:
         tiles_in_multiple_raster = []
@@ -652,8 +789,8 @@ def _aggregate_splitted_tiles(
     clear_split_data=True,
     create_aux_file=False,
     create_polygon_files=False,
+    tile_writer=None,
 ):
-
     """
     Aggregate tiles that are splitted over multiple (potentially adjacent
     or overlapping) satellite images.
@@ -676,6 +813,12 @@ def _aggregate_splitted_tiles(
     progress = tqdm(
         desc="Aggregate splits", total=total, ascii=True, unit="tile"
     )
+    if args.categories is None:
+        palette_colors = None
+    else:
+        palette_colors = args.categories.compile(
+            only_active=False, include_ignore=True
+        )
     aggregated_tiles = []
     with futures.ThreadPoolExecutor(args.workers) as executor:
 
@@ -694,7 +837,7 @@ def _aggregate_splitted_tiles(
             for i in range(len(tile_to_raster_fps[tile])):
                 root = os.path.join(temp_splits_dp, str(i))
                 absolute_fp = TilePathManager.read_absolute_tile_fp_from_dir(
-                    root, tile
+                    root, tile, args.tile_path_layout
                 )
                 if args.write_labels:
                     splitted_tile = read_label_tile_from_file_as_indices(
@@ -726,12 +869,6 @@ def _aggregate_splitted_tiles(
                 progress.update()
                 return None
 
-            if args.categories is None:
-                palette_colors = None
-            else:
-                palette_colors = args.categories.get_category_palette_colors(
-                    only_active=False, include_ignore=True
-                )
             _write_tile_data_to_disk(
                 odp=args.out,
                 write_labels=args.write_labels,
@@ -740,6 +877,8 @@ def _aggregate_splitted_tiles(
                 palette_colors=palette_colors,
                 create_aux_file=create_aux_file,
                 create_polygon_file=create_polygon_files,
+                tile_path_layout=args.tile_path_layout,
+                tile_writer=tile_writer,
             )
 
             progress.update()
@@ -749,6 +888,8 @@ def _aggregate_splitted_tiles(
             if tiled is not None:
                 aggregated_tiles.append(tiled)
 
+        if tile_writer is not None:
+            tile_writer.flush()
         if clear_split_data:
             if temp_splits_dp and os.path.isdir(temp_splits_dp):
                 shutil.rmtree(temp_splits_dp)  # Delete suffixes dir if any
@@ -934,11 +1075,15 @@ def main(args):
     args = _initialize_workers(args)
     args = _initialize_out(args)
     args = _initialize_tiling_scheme(args)
+    args = _initialize_normalized_raster_cache(args)
 
     cover = _compute_tile_cover(args.cover_csv_ifp)
-    _create_odp(args.out)
-
-    log = Logs(os.path.join(args.out, "log"), out=sys.stderr)
+    if args.plan_only:
+        # NB: Planning must not touch the output directory
+        log = Logs(out=sys.stderr)
+    else:
+        _create_odp(args.out)
+        log = Logs(os.path.join(args.out, "log"), out=sys.stderr)
     log.vinfo("args", args)
 
     log.info(
@@ -958,19 +1103,53 @@ def main(args):
     tile_to_raster_fps = _compute_tile_to_raster_fps(args, raster_fp_to_tiles)
     _check_tile_to_raster_fps(tile_to_raster_fps)
     total_tile_number = _compute_total_tile_number(args, raster_fp_to_tiles)
+    args = _initialize_tile_path_layout(args, total_tile_number)
+    log.vinfo("tile_path_layout", args.tile_path_layout)
 
-    (
-        tiles_in_single_raster,
-        tiles_in_multiple_raster,
-    ) = _perform_image_or_label_tiling_with_workers(
-        args,
-        raster_fp_to_tiles,
-        tile_to_raster_fps,
-        total_tile_number,
-        args.create_aux_files,
-        args.create_polygon_files,
-        log,
-    )
+    if args.plan_only:
+        tiling_plan = compute_tiling_plan(
+            raster_fp_to_tiles,
+            tile_to_raster_fps,
+            args.bands,
+            args.output_tile_size_pixel,
+            args.write_labels,
+            args.tile_path_layout,
+        )
+        write_tiling_plan_as_json(tiling_plan)
+        return
+
+    with TileWriterService(
+        num_io_workers=args.io_workers,
+        max_in_flight_bytes=args.io_max_in_flight_mb * 1024**2,
+        use_fadvise=args.io_fadvise,
+        tile_path_layout=args.tile_path_layout,
+    ) as tile_writer:
+        (
+            tiles_in_single_raster,
+            tiles_in_multiple_raster,
+        ) = _perform_image_or_label_tiling_with_workers(
+            args,
+            raster_fp_to_tiles,
+            tile_to_raster_fps,
+            total_tile_number,
+            args.create_aux_files,
+            # NB: The polygon files are computed batch-wise below
+            False,
+            log,
+            tile_writer,
+        )
+
+    if args.create_polygon_files:
+        tile_ext = ".png" if args.write_labels else ".jpg"
+        write_tile_footprints_as_polygon_files(
+            args.out,
+            tiles_in_single_raster + tiles_in_multiple_raster,
+            tile_ext,
+            tile_path_layout=args.tile_path_layout,
+        )
+
+    # NB: The layout descriptor must be written before reading the tiles
+    args.tile_path_layout.write_as_json(args.out)
 
     tile_overview_ofp = TilePathManager.get_tiling_overview_txt_fp_from_dir(
         args.out
@@ -994,10 +1173,13 @@ def main(args):
 
     if args.panoptic_json_ifp is not None:
         from eot.tiles.tile_panoptic import split_panoptic_json
-        json_ofp = TilePathManager.get_tiling_panoptic_json_fp_from_dir(args.out)
+
+        json_ofp = TilePathManager.get_tiling_panoptic_json_fp_from_dir(
+            args.out
+        )
         split_panoptic_json(
             raster_tiling_results,
-            TilePathManager.get_relative_tile_fp,
+            args.tile_path_layout.get_relative_tile_fp,
             json_ifp=args.panoptic_json_ifp,
             json_ofp=json_ofp,
         )
@@ -5,6 +5,7 @@ import os
 import sys
 from importlib import import_module
 
+from eot.geojson_ext.geojson_writing import get_geojson_ext
 from eot.utility.log import Logs
 
 from eot.tools.aggregate import main as aggregate_main
@@ -48,6 +49,14 @@ def run_tile_images(
     no_data_threshold=100,
     clear_split_data=True,
     debug_max_number_tiles_per_image=None,
+    tile_path_layout="default",
+    max_tiles_per_dir=4096,
+    io_workers=4,
+    io_max_in_flight_mb=256,
+    io_fadvise=False,
+    normalized_raster_cache_dp=None,
+    normalized_raster_cache_max_mb=None,
+    plan_only=False,
     lazy=False,
 ):
     if lazy and os.path.isdir(tile_odp):
@@ -131,6 +140,24 @@ def run_tile_images(
     if create_polygon_files:
         tool_param_list += ["--create_polygon_files"]
     tool_param_list += ["--out", tile_odp]
+    tool_param_list += ["--tile_path_layout", tile_path_layout]
+    tool_param_list += ["--max_tiles_per_dir", str(max_tiles_per_dir)]
+    tool_param_list += ["--io_workers", str(io_workers)]
+    tool_param_list += ["--io_max_in_flight_mb", str(io_max_in_flight_mb)]
+    if io_fadvise:
+        tool_param_list += ["--io_fadvise"]
+    if normalized_raster_cache_dp is not None:
+        tool_param_list += [
+            "--normalized_raster_cache_dp",
+            normalized_raster_cache_dp,
+        ]
+    if normalized_raster_cache_max_mb is not None:
+        tool_param_list += [
+            "--normalized_raster_cache_max_mb",
+            str(normalized_raster_cache_max_mb),
+        ]
+    if plan_only:
+        tool_param_list += ["--plan_only"]
     if compute_tiling_statistic:
         tool_param_list += ["--compute_tiling_statistic"]
 
@@ -227,6 +254,8 @@ def run_rasterize(
     raster_idp=None,
     raster_search_regex=None,
     raster_ignore_regex=None,
+    workers=None,
+    polygon_index_dp=None,
     lazy=False,
 ):
     # NB: Parameter raster_search_regex and raster_ignore_regex is only
@@ -273,6 +302,10 @@ def run_rasterize(
         tool_param_list += ["--output_tile_size_pixel", tile_size_string]
 
     tool_param_list += ["--odp", label_odp]
+    if workers is not None:
+        tool_param_list += ["--workers", str(workers)]
+    if polygon_index_dp is not None:
+        tool_param_list += ["--polygon_index_dp", polygon_index_dp]
 
     rasterize_args = create_args(
         tool_name="rasterize",
@@ -288,6 +321,9 @@ def run_aggregate(
     masks_raster_name=None,
     geojson_odp=None,
     geojson_grid_ofn=None,
+    dissolve_polygons=False,
+    geojson_ndjson=False,
+    geojson_precision=None,
     mask_gray_png_ofp=None,
     mask_color_png_ofp=None,
     mask_overlay_png_ofp=None,
@@ -295,10 +331,19 @@ def run_aggregate(
     original_raster_ifp=None,
     normalized_raster_fp=None,
     save_normalized_raster=False,
+    use_normalized_raster_cache=False,
+    normalized_raster_cache_dp=None,
+    normalized_raster_cache_max_mb=None,
     use_pixel_projection=True,
     use_contours=False,  # or filled shapes otherwise
     overlay_weight=192,  # Between 0 an 255
     tile_boundary_color=(128, 255, 0),
+    block_size=None,
+    preview_max_size=None,
+    write_cog=False,
+    workers=None,
+    memory_budget_mb=None,
+    timings=False,
     lazy=False,
 ):
 
@@ -314,7 +359,10 @@ def run_aggregate(
         geojson_ofps_exists = True
         for category in categories:
             cagerory_geojson_fp_list = glob.glob(
-                os.path.join(geojson_odp, f"*{category.name}.json")
+                os.path.join(
+                    geojson_odp,
+                    f"*{category.name}{get_geojson_ext(geojson_ndjson)}",
+                )
             )
             if len(cagerory_geojson_fp_list) == 0:
                 geojson_ofps_exists = False
@@ -343,6 +391,12 @@ def run_aggregate(
         tool_param_list += ["--geojson_odp", geojson_odp]
     if geojson_grid_ofn is not None:
         tool_param_list += ["--geojson_grid_ofn", geojson_grid_ofn]
+    if dissolve_polygons:
+        tool_param_list += ["--dissolve_polygons", str(dissolve_polygons)]
+    if geojson_ndjson:
+        tool_param_list += ["--geojson_ndjson", str(geojson_ndjson)]
+    if geojson_precision is not None:
+        tool_param_list += ["--geojson_precision", str(geojson_precision)]
     if mask_gray_png_ofp is not None:
         tool_param_list += ["--gray_mask_png_ofp", mask_gray_png_ofp]
     if mask_color_png_ofp is not None:
@@ -362,6 +416,20 @@ def run_aggregate(
         "--save_normalized_raster",
         str(save_normalized_raster),
     ]
+    tool_param_list += [
+        "--use_normalized_raster_cache",
+        str(use_normalized_raster_cache),
+    ]
+    if normalized_raster_cache_dp is not None:
+        tool_param_list += [
+            "--normalized_raster_cache_dp",
+            normalized_raster_cache_dp,
+        ]
+    if normalized_raster_cache_max_mb is not None:
+        tool_param_list += [
+            "--normalized_raster_cache_max_mb",
+            str(normalized_raster_cache_max_mb),
+        ]
     tool_param_list += ["--use_pixel_projection", str(use_pixel_projection)]
 
     tool_param_list += ["--use_contours", str(use_contours)]
@@ -371,6 +439,18 @@ def run_aggregate(
         str(value) for value in tile_boundary_color
     )
     tool_param_list += ["--tile_boundary_color", tile_boundary_color_string]
+    if block_size is not None:
+        tool_param_list += ["--block_size", str(block_size)]
+    if preview_max_size is not None:
+        tool_param_list += ["--preview_max_size", str(preview_max_size)]
+    if write_cog:
+        tool_param_list += ["--write_cog", str(write_cog)]
+    if workers is not None:
+        tool_param_list += ["--workers", str(workers)]
+    if memory_budget_mb is not None:
+        tool_param_list += ["--memory_budget_mb", str(memory_budget_mb)]
+    if timings:
+        tool_param_list += ["--timings"]
     Logs.sinfo(tool_param_list)
     aggregate_args = create_args(
         tool_name="aggregate",
@@ -1,4 +1,5 @@
 import glob
+import hashlib
 import os
 import shutil
 from functools import reduce
@@ -214,6 +215,7 @@ def get_corresponding_files_in_directories(
     sort_result=True,
 ):
     if get_correspondence_callback is None:
+
         def get_correspondence_callback(fn_1):
             return fn_1 + suffix_2
 
@@ -366,3 +368,12 @@ def are_dirs_equal(idp_1, idp_2):
     fp_2_list = get_file_paths_in_dir(idp_2, base_name_only=True)
 
     return fp_1_list == fp_2_list
+
+
+def compute_file_hash(ifp, chunk_size=16 * 1024**2):
+    """Return the SHA-256 hash of the file content (read chunk by chunk)."""
+    file_hash = hashlib.sha256()
+    with open(ifp, "rb") as ifile:
+        for chunk in iter(lambda: ifile.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
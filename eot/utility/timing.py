@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+
+from eot.utility.log import Logs
+
+
+class StageTimer:
+    """Accumulate the (wall clock) durations of named processing stages."""
+
+    def __init__(self):
+        self.stage_to_duration = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stage_to_duration[name] = (
+                self.stage_to_duration.get(name, 0.0) + duration
+            )
+
+    def log_durations(self, prefix=""):
+        for name, duration in self.stage_to_duration.items():
+            Logs.sinfo(f"{prefix}{name}: {duration:.3f}s")
+
+
+@contextmanager
+def optional_stage(timer, name):
+    """Time the stage, if a timer is given."""
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from eot.crs.crs import EPSG_3857
+from eot.rasters.raster import Raster
+from eot.rasters.raster_reprojection import (
+    reproject_raster_to_tiled_geotiff_with_default_transform,
+)
+
+# Compares the in-memory normalization of a raster (which reprojects band by
+#  band into a destination of the full size) with the reprojection to a
+#  tiled GeoTIFF. Each method runs in a separate process,
+#  i.e. the peak resident set sizes are not influenced by each other.
+#
+# Usage:
+#  python reprojection_benchmark.py --raster_ifp /path/to/raster.tif
+
+METHODS = ["in_memory", "tiled_geotiff"]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raster_ifp", type=str, required=True)
+    parser.add_argument("--dst_crs", type=str, default=EPSG_3857)
+    parser.add_argument("--num_threads", type=int, default=os.cpu_count())
+    parser.add_argument("--repetitions", type=int, default=1)
+    parser.add_argument("--method", choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument("--raster_ofp", type=str, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def _get_peak_rss_mb():
+    # NB: ru_maxrss is given in kilobytes (on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_method(args):
+    start = time.perf_counter()
+    if args.method == "in_memory":
+        with Raster.get_from_file(args.raster_ifp) as raster:
+            raster.write_as_normalized_raster_to_file(
+                args.raster_ofp, args.dst_crs
+            )
+    elif args.method == "tiled_geotiff":
+        reproject_raster_to_tiled_geotiff_with_default_transform(
+            args.raster_ifp,
+            args.raster_ofp,
+            dst_crs=args.dst_crs,
+            num_threads=args.num_threads,
+        )
+    else:
+        assert False
+    wall_time = time.perf_counter() - start
+    result = {"wall_time_s": wall_time, "peak_rss_mb": _get_peak_rss_mb()}
+    print(json.dumps(result))
+
+
+def _run_method_in_subprocess(args, method, raster_ofp):
+    cmd = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--raster_ifp",
+        args.raster_ifp,
+        "--dst_crs",
+        args.dst_crs,
+        "--num_threads",
+        str(args.num_threads),
+        "--method",
+        method,
+        "--raster_ofp",
+        raster_ofp,
+    ]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = _parse_args()
+    if args.method is not None:
+        _run_method(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dp:
+        for method in METHODS:
+            raster_ofp = os.path.join(tmp_dp, f"{method}.tif")
+            for repetition in range(args.repetitions):
+                result = _run_method_in_subprocess(args, method, raster_ofp)
+                print(
+                    f"{method} ({repetition + 1}/{args.repetitions}): "
+                    + f"wall time {result['wall_time_s']:.3f}s, "
+                    + f"peak RSS {result['peak_rss_mb']:.1f}MB"
+                )
+            os.remove(raster_ofp)
+
+
+if __name__ == "__main__":
+    main()